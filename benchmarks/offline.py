@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Benchmarks de despliegue y borrado sin cuenta de AWS.
+
+Ejecuta los scripts reales contra el sustituto local de EC2
+(comun/standin.py: moto + latencia por llamada + retardos de estado) y mide
+cada escenario en un proceso aparte:
+
+    plantilla-1-region     plantilla_final con una sola región
+    plantilla-2-regiones   plantilla_final con la topología por defecto
+    plantilla-n-regiones   plantilla_final con --regiones regiones (peering con la primera)
+    version6               version6_completo_con_ec2.main()
+    teardown-n-vpcs        eliminar_infraestructura.main() tras crear --vpcs VPCs con version6
+    peering-malla          comun.peering.build_mesh() entre --malla VPCs de regiones distintas
+    tgw-hub                comun.tgw.build_hub() con --spokes VPCs de una región
+    deshacer-plantilla     comun.rollback: deshacer la topología por defecto de
+                           plantilla_final (desplegada con --transaccional)
+    teardown-plantilla     eliminar_plantilla_final.main() tras desplegar la
+                           topología por defecto (con un TGW en cada región)
+    preflight-n-regiones   comprobación de cuotas de plantilla_final con --regiones
+                           regiones (sin desplegar)
+
+Por escenario se informa del tiempo total, las llamadas a la API (totales y
+por operación) y la longitud del camino crítico. Los resultados se añaden a
+benchmarks/resultados.jsonl con el commit actual y se comparan con la última
+medición del mismo escenario en otro commit, para ver regresiones.
+
+Requisitos:
+    pip install boto3 "moto[ec2]"
+
+Uso:
+    py benchmarks/offline.py
+    py benchmarks/offline.py --escenarios plantilla-2-regiones,teardown-n-vpcs --vpcs 10
+    py benchmarks/offline.py --latencia 0.05 --retardo nat_gateway=10 --retardo instance=3
+"""
+
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'examenes'))
+sys.path.insert(0, os.path.join(RAIZ, 'redes'))
+
+RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados.jsonl')
+
+ESCENARIOS = ['plantilla-1-region', 'plantilla-2-regiones', 'plantilla-n-regiones', 'version6', 'teardown-n-vpcs',
+              'peering-malla', 'tgw-hub', 'deshacer-plantilla',
+              'teardown-plantilla', 'preflight-n-regiones']
+
+# Regiones para el escenario de N regiones (cada una con su 10.i.0.0/16)
+REGIONES = ['us-west-2', 'us-east-1', 'eu-west-1', 'ap-northeast-1', 'eu-central-1',
+            'us-east-2', 'ap-southeast-2', 'sa-east-1', 'ca-central-1', 'eu-north-1']
+
+# Entorno para que boto3 no busque credenciales reales
+ENTORNO_FALSO = {'AWS_ACCESS_KEY_ID': 'testing', 'AWS_SECRET_ACCESS_KEY': 'testing',
+                 'AWS_DEFAULT_REGION': 'us-east-1'}
+
+# ============================================================================
+# ESCENARIOS (se ejecutan dentro del proceso hijo)
+# ============================================================================
+
+def topologia_n(n):
+    regiones = []
+    for i, region in enumerate(REGIONES[:n]):
+        regiones.append({
+            'name': f"R{i}", 'region': region, 'vpc_cidr': f"10.{i}.0.0/16",
+            'public_subnet_cidr': f"10.{i}.1.0/24", 'private_subnet_cidr': f"10.{i}.2.0/24",
+            'ami': None,
+        })
+    return {'regions': regiones, 'peerings': [('R0', f"R{i}") for i in range(1, n)], 'tgw': 'R0'}
+
+
+def ami_local(region=None):
+    """Una AMI que exista en moto en la región (las reales no)."""
+    from comun import clients
+    return clients.client('ec2', region).describe_images(Owners=['amazon'])['Images'][0]['ImageId']
+
+
+def con_amis(topologia):
+    """La topología con AMIs que existan en moto."""
+    for entrada in topologia['regions']:
+        entrada['ami'] = ami_local(entrada['region'])
+    return topologia
+
+
+def escenario_malla(n):
+    """N VPCs (una por región, con dos route tables) y la malla completa entre ellas."""
+    from comun import clients, peering
+    vpcs = []
+    for i, region in enumerate(REGIONES[:n]):
+        ec2 = clients.client('ec2', region)
+        vpc_id = ec2.create_vpc(CidrBlock=f"10.{i}.0.0/16")['Vpc']['VpcId']
+        tablas = [ec2.create_route_table(VpcId=vpc_id)['RouteTable']['RouteTableId'] for _ in range(2)]
+        vpcs.append(peering.MeshVpc(f"R{i}", region, vpc_id, f"10.{i}.0.0/16", tablas))
+    return lambda: peering.build_mesh(vpcs) and 0
+
+
+def escenario_hub(n):
+    """N VPCs en una región (subnet y route table) conectadas a un TGW nuevo."""
+    from comun import clients, tgw
+    ec2 = clients.client('ec2', REGIONES[0])
+    spokes = []
+    for i in range(n):
+        vpc_id = ec2.create_vpc(CidrBlock=f"10.{i}.0.0/16")['Vpc']['VpcId']
+        subnet_id = ec2.create_subnet(VpcId=vpc_id, CidrBlock=f"10.{i}.0.0/24")['Subnet']['SubnetId']
+        tabla = ec2.create_route_table(VpcId=vpc_id)['RouteTable']['RouteTableId']
+        spokes.append(tgw.Spoke(f"S{i}", vpc_id, [subnet_id], f"10.{i}.0.0/16", [tabla]))
+    return lambda: tgw.build_hub(ec2, spokes) and 0
+
+
+def escenario_plantilla(topologia, *opciones):
+    import plantilla_final
+    plantilla_final.TOPOLOGIA = con_amis(topologia)
+    return lambda: plantilla_final.main(['--sin-estado', *opciones])
+
+
+def escenario_deshacer(topologia):
+    """Despliega con --transaccional (sin medir) y devuelve el rollback de todo."""
+    from comun import rollback
+    # Activado aquí, main() no lo desactiva al salir: el registro sigue para deshacer()
+    log = rollback.enable()
+    escenario_plantilla(topologia, '--transaccional')()
+
+    def deshacer():
+        try:
+            resultado = log.unwind()
+        finally:
+            rollback.disable()
+        return 1 if resultado['failed'] or resultado['skipped'] else 0
+    return deshacer
+
+
+def preparar(nombre, params):
+    """Prepara el escenario (sin medir) y devuelve la función a medir."""
+    import copy
+    if nombre == 'plantilla-1-region':
+        import plantilla_final
+        topologia = copy.deepcopy(plantilla_final.TOPOLOGIA)
+        topologia['regions'] = topologia['regions'][:1]
+        topologia['peerings'] = []
+        return escenario_plantilla(topologia)
+    if nombre == 'plantilla-2-regiones':
+        import plantilla_final
+        return escenario_plantilla(copy.deepcopy(plantilla_final.TOPOLOGIA))
+    if nombre == 'plantilla-n-regiones':
+        return escenario_plantilla(topologia_n(params['regiones']))
+    if nombre == 'version6':
+        import version6_completo_con_ec2
+        version6_completo_con_ec2.AMI = ami_local()
+        return version6_completo_con_ec2.main
+    if nombre == 'teardown-n-vpcs':
+        import eliminar_infraestructura
+        import version6_completo_con_ec2
+        version6_completo_con_ec2.AMI = ami_local()
+        for _ in range(params['vpcs']):
+            version6_completo_con_ec2.main()
+        builtins.input = lambda *a: 'SI'
+        return eliminar_infraestructura.main
+    if nombre == 'peering-malla':
+        return escenario_malla(params['malla'])
+    if nombre == 'tgw-hub':
+        return escenario_hub(params['spokes'])
+    if nombre == 'teardown-plantilla':
+        import eliminar_plantilla_final
+        import plantilla_final
+        topologia = copy.deepcopy(plantilla_final.TOPOLOGIA)
+        topologia['tgw'] = [r['name'] for r in topologia['regions']]
+        escenario_plantilla(topologia)()
+        return lambda: eliminar_plantilla_final.main(['--si'])
+    if nombre == 'preflight-n-regiones':
+        import plantilla_final
+        from comun import clients
+        topologia = plantilla_final.assign_cidrs(plantilla_final.expand_peerings(topologia_n(params['regiones'])))
+        configs = {cfg['name']: cfg for cfg in plantilla_final.region_configs(topologia)}
+        # moto crea cada región en su primera llamada: que no cuente en la medida
+        for cfg in configs.values():
+            clients.client('ec2', cfg['region']).describe_vpcs()
+        return lambda: 0 if plantilla_final.check_quotas(configs) else 1
+    if nombre == 'deshacer-plantilla':
+        import plantilla_final
+        return escenario_deshacer(copy.deepcopy(plantilla_final.TOPOLOGIA))
+    raise ValueError(f"Escenario desconocido: {nombre}")
+
+
+def camino_critico(informe, wall):
+    """Camino crítico del escenario a partir de la traza.
+
+    Los grafos de pasos que se solapan en el tiempo (las regiones) forman
+    una fase y cuenta el de camino más largo; las fases (regiones, malla de
+    peering) van una detrás de otra. Lo que se ejecuta fuera de un grafo
+    (TGW) va después, en serie. Sin grafos (version6, secuencial) el camino
+    crítico es todo el tiempo.
+    """
+    runs = [r for r in informe['runs'] if r['steps']]
+    if not runs:
+        return wall, []
+    ventanas = []
+    for run in runs:
+        inicio = min(p['start'] for p in run['steps'].values())
+        fin = max(p['end'] or p['start'] for p in run['steps'].values())
+        ventanas.append((inicio, fin, run))
+    fases = []
+    for inicio, fin, run in sorted(ventanas, key=lambda v: v[0]):
+        if fases and inicio < fases[-1]['end']:
+            fases[-1]['runs'].append(run)
+            fases[-1]['end'] = max(fases[-1]['end'], fin)
+        else:
+            fases.append({'start': inicio, 'end': fin, 'runs': [run]})
+    segundos, camino = 0.0, []
+    for fase in fases:
+        peor = max(fase['runs'], key=lambda r: r['critical_seconds'])
+        segundos += peor['critical_seconds']
+        camino += [f"{peor['name']}/{paso}" for paso in peor['critical_path']]
+    # Pasos medidos con trace.step fuera de cualquier grafo
+    margen = 1e-3
+    fuera = {}
+    for paso in informe['step_log']:
+        dentro = any(f['start'] - margen <= paso['start'] and paso['start'] + paso['duration'] <= f['end'] + margen
+                     for f in fases)
+        if not dentro:
+            fuera[paso['step']] = fuera.get(paso['step'], 0.0) + paso['duration']
+    return segundos + sum(fuera.values()), camino + sorted(fuera)
+
+
+def medir(nombre, params):
+    """Ejecuta un escenario en este proceso y devuelve sus métricas."""
+    from comun import trace
+    from comun.standin import StandIn
+
+    os.environ.update(ENTORNO_FALSO)
+    with StandIn(latency=params['latencia'], delays=params['retardos']):
+        with contextlib.redirect_stdout(io.StringIO()):
+            func = preparar(nombre, params)
+            trace.enable()
+            try:
+                inicio = time.perf_counter()
+                codigo = func()
+                wall = time.perf_counter() - inicio
+                informe = trace.report()
+            finally:
+                trace.disable()
+
+    critico, camino = camino_critico(informe, wall)
+    return {
+        'exit_code': codigo,
+        'wall_s': round(wall, 3),
+        'calls': informe['calls'],
+        'retries': informe['retries'],
+        'throttles': informe['throttles'],
+        'critical_path_s': round(critico, 3),
+        'critical_path': camino,
+        'calls_by_operation': {op: datos['calls'] for op, datos in informe['by_operation'].items()},
+    }
+
+# ============================================================================
+# RESULTADOS
+# ============================================================================
+
+def commit_actual():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        sucio = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=RAIZ,
+                               capture_output=True, text=True).stdout.strip()
+        return f"{commit}-dirty" if sucio else commit
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconocido'
+
+
+def leer_resultados(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def anterior(resultados, registro):
+    """Última medición del mismo escenario y parámetros en otro commit."""
+    for previo in reversed(resultados):
+        if (previo['scenario'] == registro['scenario'] and previo['params'] == registro['params']
+                and previo['commit'] != registro['commit']):
+            return previo
+    return None
+
+
+def delta(actual, previo):
+    if not previo:
+        return ''
+    return f" ({(actual - previo) / previo * 100:+.0f}%)"
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks offline de despliegue y borrado')
+    parser.add_argument('--escenarios', default=','.join(ESCENARIOS),
+                        help=f"Lista separada por comas (por defecto todos: {', '.join(ESCENARIOS)})")
+    parser.add_argument('--regiones', type=int, default=4, help='Regiones de plantilla-n-regiones')
+    parser.add_argument('--vpcs', type=int, default=5, help='VPCs a borrar en teardown-n-vpcs')
+    parser.add_argument('--malla', type=int, default=6, help='VPCs de peering-malla (N·(N-1)/2 peerings)')
+    parser.add_argument('--spokes', type=int, default=20, help='VPCs conectadas al TGW en tgw-hub')
+    parser.add_argument('--latencia', type=float, default=0.02, help='Segundos por llamada a la API')
+    parser.add_argument('--retardo', action='append', default=[], metavar='TIPO=SEGUNDOS',
+                        help='Retardo de transición (nat_gateway, instance, transit_gateway...)')
+    parser.add_argument('--resultados', default=RESULTADOS, help='Fichero JSONL de resultados')
+    parser.add_argument('--sin-guardar', action='store_true', help='No añadir los resultados al fichero')
+    parser.add_argument('--umbral', type=float, default=0.2,
+                        help='Aviso de regresión si el tiempo o las llamadas crecen más de esta fracción')
+    parser.add_argument('--interno', help=argparse.SUPPRESS)
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = parser.parse_args(argv)
+
+    params = {
+        'latencia': args.latencia,
+        'retardos': dict(r.split('=', 1) for r in args.retardo),
+        'regiones': args.regiones,
+        'vpcs': args.vpcs,
+        'malla': args.malla,
+        'spokes': args.spokes,
+    }
+    params['retardos'] = {k: float(v) for k, v in params['retardos'].items()}
+
+    if args.interno:
+        # Proceso hijo: medir un escenario y devolver el resultado en la última línea
+        print(json.dumps(medir(args.interno, params)))
+        return 0
+
+    escenarios = [e.strip() for e in args.escenarios.split(',') if e.strip()]
+    desconocidos = [e for e in escenarios if e not in ESCENARIOS]
+    if desconocidos:
+        parser.error(f"Escenarios desconocidos: {', '.join(desconocidos)}")
+
+    commit = commit_actual()
+    historico = leer_resultados(args.resultados)
+    regresiones = []
+    print(f"Benchmarks offline (commit {commit}, latencia {args.latencia}s por llamada)\n")
+    print(f"{'Escenario':<24}{'Tiempo':>16}{'Llamadas':>16}{'Camino crítico':>20}")
+    for escenario in escenarios:
+        # Cada escenario en su propio proceso: clientes, poller y moto limpios
+        hijo = subprocess.run([sys.executable, os.path.abspath(__file__), '--interno', escenario] + argv,
+                              capture_output=True, text=True, cwd=RAIZ,
+                              env=dict(os.environ, **ENTORNO_FALSO))
+        if hijo.returncode != 0 or not hijo.stdout.strip():
+            print(f"{escenario:<24}❌ falló\n{hijo.stderr[-2000:]}")
+            regresiones.append(escenario)
+            continue
+        metricas = json.loads(hijo.stdout.strip().splitlines()[-1])
+        registro = {
+            'scenario': escenario, 'commit': commit, 'date': datetime.now().isoformat(timespec='seconds'),
+            'params': {k: params[k] for k in ('latencia', 'retardos')} | (
+                {'regiones': args.regiones} if escenario in ('plantilla-n-regiones', 'preflight-n-regiones') else
+                {'vpcs': args.vpcs} if escenario == 'teardown-n-vpcs' else
+                {'malla': args.malla} if escenario == 'peering-malla' else
+                {'spokes': args.spokes} if escenario == 'tgw-hub' else {}),
+            **metricas,
+        }
+        previo = anterior(historico, registro)
+        print(f"{escenario:<24}"
+              f"{metricas['wall_s']:>8.2f}s{delta(metricas['wall_s'], previo and previo['wall_s']):>8}"
+              f"{metricas['calls']:>8}{delta(metricas['calls'], previo and previo['calls']):>8}"
+              f"{metricas['critical_path_s']:>12.2f}s{delta(metricas['critical_path_s'], previo and previo['critical_path_s']):>8}")
+        if metricas['exit_code']:
+            print(f"   ⚠ El script terminó con código {metricas['exit_code']}")
+        if previo and (metricas['wall_s'] > previo['wall_s'] * (1 + args.umbral)
+                       or metricas['calls'] > previo['calls'] * (1 + args.umbral)):
+            print(f"   ⚠ Regresión respecto a {previo['commit']}")
+            regresiones.append(escenario)
+        if not args.sin_guardar:
+            with open(args.resultados, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(registro) + '\n')
+
+    if not args.sin_guardar:
+        print(f"\nResultados añadidos a {os.path.relpath(args.resultados, RAIZ)}")
+    return 1 if regresiones else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,7 @@
+"""
+Utilidades compartidas por los scripts de despliegue y limpieza.
+
+Los scripts de `examenes/` y `redes/` se ejecutan directamente
+(`py plantilla_final.py`), así que añaden la raíz del repositorio a
+`sys.path` antes de importar este paquete.
+"""
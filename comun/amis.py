@@ -0,0 +1,178 @@
+"""
+AMIs por familia de sistema operativo, resueltas con los parámetros públicos de SSM.
+
+Los IDs de AMI escritos a mano caducan (AWS publica imágenes nuevas y retira
+las viejas) y un run_instances con una AMI retirada rompe el despliegue. En
+vez de un ID, los scripts piden una familia ('al2023', 'ubuntu-24.04'...) y
+resolve() busca la última imagen de cada región en los parámetros públicos
+de SSM (/aws/service/...): una get_parameters por región con todas sus
+familias, y todas las regiones a la vez.
+
+Lo resuelto se guarda en una caché en disco (CACHE_FILE) con una entrada por
+familia y región y validez TTL: dentro de esa hora una segunda ejecución no
+hace ninguna llamada. Con offline=True no se consulta SSM y se usa lo último
+que se resolvió bien aunque haya caducado; si SSM falla también se recurre a
+ese último valor conocido.
+
+Ejemplo:
+    amis = resolve([('us-west-2', 'al2023'), ('us-east-1', 'al2023')])
+    ami = amis[('us-west-2', 'al2023')]
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from comun import clients
+
+# Familia: parámetro público de SSM con el ID de la última AMI
+FAMILIES = {
+    'al2023': '/aws/service/ami-amazon-linux-latest/al2023-ami-kernel-default-x86_64',
+    'al2023-arm64': '/aws/service/ami-amazon-linux-latest/al2023-ami-kernel-default-arm64',
+    'al2': '/aws/service/ami-amazon-linux-latest/amzn2-ami-hvm-x86_64-gp2',
+    'ubuntu-24.04': '/aws/service/canonical/ubuntu/server/24.04/stable/current/amd64/hvm/ebs-gp3/ami-id',
+    'ubuntu-22.04': '/aws/service/canonical/ubuntu/server/22.04/stable/current/amd64/hvm/ebs-gp2/ami-id',
+    'debian-12': '/aws/service/debian/release/12/latest/amd64',
+    'windows-2022': '/aws/service/ami-windows-latest/Windows_Server-2022-English-Full-Base',
+}
+
+# Segundos que una AMI resuelta se da por buena sin volver a consultar SSM
+TTL = 3600
+
+CACHE_FILE = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+                          'scriptsaws', 'amis.json')
+
+# get_parameters admite como mucho 10 nombres por llamada
+SSM_BATCH = 10
+
+
+class AmiNotFound(Exception):
+    """No hay AMI para la familia y región, ni en SSM ni en la caché."""
+
+
+def is_ami_id(valor):
+    return isinstance(valor, str) and valor.startswith('ami-')
+
+
+def check_family(valor):
+    """Lanza ValueError si `valor` no es ni un ID de AMI ni una familia conocida."""
+    if not is_ami_id(valor) and valor not in FAMILIES:
+        raise ValueError(f"AMI desconocida: {valor!r} (un ID 'ami-...' o una familia: {', '.join(FAMILIES)})")
+
+
+class AmiCache:
+    """Fichero JSON {familia: {región: {'ami': id, 'resolved': epoch}}} (seguro entre hilos)."""
+
+    def __init__(self, path=None, ttl=TTL, clock=time.time):
+        self.path = path or CACHE_FILE
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._data = {}
+        self._dirty = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._data = json.load(f)
+            except ValueError:
+                # Caché corrupta: se resuelve todo de nuevo y se reescribe
+                self._data = {}
+
+    def get(self, family, region, fresh=True):
+        """ID guardado, o None si no hay (o si ha caducado y fresh=True)."""
+        with self._lock:
+            entrada = self._data.get(family, {}).get(region)
+        if not entrada or fresh and self.clock() - entrada['resolved'] > self.ttl:
+            return None
+        return entrada['ami']
+
+    def put(self, family, region, ami):
+        with self._lock:
+            self._data.setdefault(family, {})[region] = {'ami': ami, 'resolved': self.clock()}
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Escritura atómica, como comun/state.py
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._data, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+def lookup(region, families, profile=None):
+    """{familia: AMI} de una región leyendo sus parámetros de SSM (una llamada por 10 familias).
+
+    Las familias cuyo parámetro no existe en la región no aparecen.
+    """
+    ssm = clients.client('ssm', region, profile)
+    familias = sorted(families)
+    encontradas = {}
+    for i in range(0, len(familias), SSM_BATCH):
+        lote = {FAMILIES[f]: f for f in familias[i:i + SSM_BATCH]}
+        resp = ssm.get_parameters(Names=list(lote))
+        encontradas.update({lote[p['Name']]: p['Value'] for p in resp['Parameters']})
+    return encontradas
+
+
+def resolve(wanted, profiles=None, cache=None, offline=False, workers=16):
+    """{(región, familia): AMI} para cada par (región, familia) de `wanted`.
+
+    Un ID 'ami-...' en lugar de familia se devuelve tal cual. Solo se consulta
+    SSM para lo que no está en caché o ha caducado, todas las regiones a la
+    vez; `profiles` ({región: perfil}) indica el perfil de cada región.
+    Lanza AmiNotFound si alguna no se puede resolver.
+    """
+    cache = cache or AmiCache()
+    profiles = profiles or {}
+    resultado, pendientes = {}, {}
+    for region, family in set(wanted):
+        if is_ami_id(family):
+            resultado[(region, family)] = family
+            continue
+        check_family(family)
+        ami = cache.get(family, region, fresh=not offline)
+        if ami:
+            resultado[(region, family)] = ami
+        elif offline:
+            raise AmiNotFound(f"{family} en {region}: no está en la caché ({cache.path})")
+        else:
+            pendientes.setdefault(region, set()).add(family)
+
+    if pendientes:
+        with ThreadPoolExecutor(max_workers=min(workers, len(pendientes))) as pool:
+            futuros = {region: pool.submit(contextvars.copy_context().run, lookup, region, familias,
+                                           profiles.get(region))
+                       for region, familias in pendientes.items()}
+        for region, futuro in futuros.items():
+            try:
+                encontradas, error = futuro.result(), 'parámetro de SSM no disponible en la región'
+            except (ClientError, BotoCoreError) as e:
+                encontradas, error = {}, e
+            for family in pendientes[region]:
+                ami = encontradas.get(family)
+                if ami:
+                    cache.put(family, region, ami)
+                else:
+                    # Último valor conocido, aunque haya caducado
+                    ami = cache.get(family, region, fresh=False)
+                    if not ami:
+                        raise AmiNotFound(f"{family} en {region}: {error}")
+                    print(f"   ⚠ {family} en {region}: {error}; se usa la última AMI conocida {ami}")
+                resultado[(region, family)] = ami
+        cache.save()
+    return resultado
+
+
+def resolve_one(family, region, profile=None, **kwargs):
+    """AMI de una familia (o el propio ID) en una región."""
+    return resolve([(region, family)], profiles={region: profile}, **kwargs)[(region, family)]
@@ -0,0 +1,341 @@
+"""
+Grabación y reproducción del tráfico con AWS ("cassettes").
+
+Record(path) guarda cada llamada de los clientes de comun.clients (servicio,
+región, operación, parámetros, código HTTP, respuesta y latencia) y al salir
+la escribe en un fichero JSON compacto (gzip si acaba en .gz). Antes de
+guardar se redacta:
+
+- IDs de recursos (vpc-..., nat-..., i-...): se sustituyen por IDs ficticios
+  de la misma forma, de manera consistente en todo el cassette,
+- IDs de cuenta, access keys e IPs públicas,
+- valores de campos sensibles (KeyMaterial, UserData, ClientToken...).
+
+Replay(path) sirve esas respuestas sin red ni credenciales: cada llamada se
+empareja con la siguiente grabada de la misma operación y región (y, si hay
+varias, la de parámetros equivalentes). Con time_scale=0 (por defecto) las
+esperas no duermen y las consultas repetidas de una espera se comprimen en
+la última: un despliegue multi-región se reproduce en menos de un segundo.
+time_scale=1 reproduce también la latencia de cada llamada y las pausas.
+
+Ejemplo:
+    with Record('despliegue.json.gz'):
+        plantilla_final.main([])
+    with Replay('despliegue.json.gz'):
+        plantilla_final.main(['--sin-estado'])
+
+Desde la línea de comandos, con cualquier script:
+    py -m comun.cassette grabar despliegue.json.gz examenes/plantilla_final.py
+    py -m comun.cassette reproducir despliegue.json.gz examenes/plantilla_final.py --traza t
+"""
+
+import base64
+import gzip
+import ipaddress
+import json
+import re
+import threading
+import time
+from datetime import datetime
+
+from comun import clients, poller
+
+VERSION = 1
+
+# Campos cuyo valor nunca se guarda
+SENSITIVE_KEYS = {
+    'KeyMaterial', 'KeyFingerprint', 'UserData', 'PasswordData', 'Password',
+    'SecretAccessKey', 'SessionToken', 'AccessKeyId', 'ClientToken', 'NextToken',
+}
+REDACTED = '***'
+
+_ID = re.compile(r'\b([a-z][a-z0-9]*(?:-[a-z]+)*)-([0-9a-f]{8}|[0-9a-f]{17})\b')
+_CUENTA = re.compile(r'(?<!\d)\d{12}(?!\d)')
+_ACCESS_KEY = re.compile(r'\b(?:AKIA|ASIA)[A-Z0-9]{16}\b')
+_IPV4 = re.compile(r'(?<![\d.])(?:\d{1,3}\.){3}\d{1,3}(?![\d.])')
+
+
+class CassetteMiss(Exception):
+    """La llamada no está en el cassette."""
+
+
+class Redactor:
+    """Sustituye IDs, cuentas e IPs públicas por valores ficticios consistentes."""
+
+    def __init__(self):
+        self._mapa = {}
+        self._lock = threading.Lock()
+
+    def _ficticio(self, real, crear):
+        with self._lock:
+            if real not in self._mapa:
+                self._mapa[real] = crear(len(self._mapa) + 1)
+            return self._mapa[real]
+
+    def _id(self, m):
+        prefijo, hexa = m.groups()
+        return self._ficticio(m.group(0), lambda n: f"{prefijo}-{n:0{len(hexa)}x}")
+
+    def _ip(self, m):
+        try:
+            publica = ipaddress.ip_address(m.group(0)).is_global
+        except ValueError:
+            return m.group(0)
+        # TEST-NET-3 (203.0.113.0/24): reservada para documentación
+        return self._ficticio(m.group(0), lambda n: f"203.0.113.{n % 254 + 1}") if publica else m.group(0)
+
+    def text(self, valor):
+        valor = _ID.sub(self._id, valor)
+        valor = _ACCESS_KEY.sub('AKIA' + 'X' * 16, valor)
+        valor = _CUENTA.sub(lambda m: self._ficticio(m.group(0), lambda n: f"{n:012d}"), valor)
+        return _IPV4.sub(self._ip, valor)
+
+    def __call__(self, datos):
+        if isinstance(datos, dict):
+            return {k: REDACTED if k in SENSITIVE_KEYS else self(v) for k, v in datos.items()}
+        if isinstance(datos, (list, tuple)):
+            return [self(v) for v in datos]
+        if isinstance(datos, str):
+            return self.text(datos)
+        return datos
+
+
+def shape(params, ids=False):
+    """Forma de unos parámetros para emparejar llamadas, sin valores sensibles.
+
+    Con ids=False también sin IDs concretos (vpc-0a1b... → vpc-).
+    """
+    if isinstance(params, dict):
+        return {k: REDACTED if k in SENSITIVE_KEYS else shape(v, ids) for k, v in sorted(params.items())}
+    if isinstance(params, (list, tuple)):
+        formas = [shape(v, ids) for v in params]
+        # Una lista de IDs vale lo mismo en cualquier orden (y sin IDs, con uno que con diez)
+        if all(isinstance(f, str) for f in formas):
+            return sorted(formas) if ids else sorted(set(formas))
+        return formas
+    if isinstance(params, str) and not ids:
+        return _ID.sub(lambda m: m.group(1) + '-', params)
+    return params
+
+
+# Serialización --------------------------------------------------------------
+
+def _encode(valor):
+    if isinstance(valor, datetime):
+        return {'$dt': valor.isoformat()}
+    if isinstance(valor, (bytes, bytearray)):
+        return {'$b64': base64.b64encode(valor).decode()}
+    raise TypeError(f"No serializable: {type(valor).__name__}")
+
+
+def _decode(obj):
+    if '$dt' in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj['$dt'])
+    if '$b64' in obj and len(obj) == 1:
+        return base64.b64decode(obj['$b64'])
+    return obj
+
+
+def _open(path, modo):
+    return gzip.open(path, modo + 't', encoding='utf-8') if path.endswith('.gz') else open(path, modo, encoding='utf-8')
+
+
+def save(path, interactions):
+    with _open(path, 'w') as f:
+        json.dump({'version': VERSION, 'interactions': interactions}, f,
+                  default=_encode, separators=(',', ':'))
+
+
+def load(path):
+    with _open(path, 'r') as f:
+        datos = json.load(f, object_hook=_decode)
+    if datos.get('version') != VERSION:
+        raise ValueError(f"{path}: versión de cassette no soportada ({datos.get('version')})")
+    return datos['interactions']
+
+
+# Grabación ------------------------------------------------------------------
+
+class Record:
+    """Graba las llamadas de todos los clientes compartidos mientras está activo."""
+
+    def __init__(self, path):
+        self.path = path
+        self.interactions = []
+        self.redact = Redactor()
+        self._lock = threading.Lock()
+        self._activo = False
+        self._origen = None
+
+    def __enter__(self):
+        self._activo = True
+        self._origen = time.perf_counter()
+        clients.on_create(self.attach)
+        return self
+
+    def __exit__(self, *exc):
+        self._activo = False
+        clients.off_create(self.attach)
+        with self._lock:
+            interacciones = list(self.interactions)
+        save(self.path, interacciones)
+
+    def attach(self, client):
+        region = client.meta.region_name
+        eventos = client.meta.events
+
+        def params(params, context, **kwargs):
+            if self._activo:
+                context['_cassette'] = {'params': self.redact(params), 'start': time.perf_counter()}
+
+        def after(http_response, parsed, model, context, **kwargs):
+            grabado = context.get('_cassette')
+            if not self._activo or grabado is None:
+                return
+            respuesta = {k: v for k, v in parsed.items() if k != 'ResponseMetadata'}
+            interaccion = {
+                'service': model.service_model.service_name,
+                'region': region,
+                'operation': model.name,
+                'params': grabado['params'],
+                'status': http_response.status_code,
+                'response': self.redact(respuesta),
+                'start': round(grabado['start'] - self._origen, 4),
+                'duration': round(time.perf_counter() - grabado['start'], 4),
+            }
+            with self._lock:
+                self.interactions.append(interaccion)
+
+        eventos.register('before-parameter-build', params, unique_id='comun.cassette.params')
+        # Al final, para grabar la respuesta tal como la ven los scripts
+        eventos.register_last('after-call', after, unique_id='comun.cassette.after')
+
+
+# Reproducción ---------------------------------------------------------------
+
+class _Response:
+    """Lo mínimo de una respuesta HTTP que usan botocore y los manejadores."""
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+        self.content = b''
+
+
+class Replay:
+    """Sirve las respuestas de un cassette a todos los clientes compartidos."""
+
+    def __init__(self, path, time_scale=0.0, collapse_polls=None):
+        self.time_scale = time_scale
+        self.collapse_polls = time_scale == 0 if collapse_polls is None else collapse_polls
+        self.served = 0
+        self._colas = {}
+        self._ultimas = {}
+        self._lock = threading.Lock()
+        self._activo = False
+        self._poller_anterior = None
+        for interaccion in load(path):
+            clave = (interaccion['service'], interaccion['region'], interaccion['operation'])
+            interaccion['exact'] = shape(interaccion['params'], ids=True)
+            interaccion['shape'] = shape(interaccion['params'])
+            self._colas.setdefault(clave, []).append(interaccion)
+
+    def __enter__(self):
+        self._activo = True
+        clients.reset()
+        clients.on_create(self.attach)
+        self._poller_anterior = poller.set_default(poller.Poller(time_scale=self.time_scale))
+        return self
+
+    def __exit__(self, *exc):
+        self._activo = False
+        poller.set_default(self._poller_anterior)
+        # Los clientes que se creen después vuelven a hablar con AWS
+        clients.off_create(self.attach)
+        clients.reset()
+
+    def attach(self, client):
+        region = client.meta.region_name
+
+        def params(params, context, **kwargs):
+            context['_cassette_params'] = (shape(params, ids=True), shape(params))
+
+        def responder(model, context, **kwargs):
+            if not self._activo:
+                return None
+            exacta, forma = context['_cassette_params']
+            interaccion = self.next((model.service_model.service_name, region, model.name), exacta, forma)
+            if self.time_scale:
+                time.sleep(interaccion['duration'] * self.time_scale)
+            respuesta = dict(interaccion['response'])
+            respuesta['ResponseMetadata'] = {'HTTPStatusCode': interaccion['status'], 'RetryAttempts': 0}
+            return _Response(interaccion['status']), respuesta
+
+        client.meta.events.register('before-parameter-build', params, unique_id='comun.cassette.shape')
+        # Los demás manejadores de before-call (trace, stand-in) van antes
+        client.meta.events.register_last('before-call', responder, unique_id='comun.cassette.replay')
+
+    def next(self, clave, exacta, forma):
+        """Siguiente interacción grabada para (servicio, región, operación).
+
+        Preferencia: mismos parámetros (los IDs que devuelve el cassette son
+        los grabados), luego misma forma (p. ej. una AMI real frente a la
+        redactada) y por último la primera que quede.
+        """
+        with self._lock:
+            cola = self._colas.get(clave, [])
+            indice = next((i for i, x in enumerate(cola) if x['exact'] == exacta), None)
+            if indice is None:
+                indice = next((i for i, x in enumerate(cola) if x['shape'] == forma), 0 if cola else None)
+            if indice is None:
+                ultima = self._ultimas.get((clave, json.dumps(forma, sort_keys=True)))
+                if ultima is not None:
+                    # Una espera que sigue consultando tras lo grabado: repetir la última
+                    return ultima
+                raise CassetteMiss(f"{clave[0]}.{clave[2]} en {clave[1]}: no quedan respuestas grabadas")
+            if self.collapse_polls and clave[2].startswith('Describe'):
+                # La misma consulta repetida (una espera): saltar a la última respuesta
+                while indice + 1 < len(cola) and cola[indice + 1]['exact'] == cola[indice]['exact']:
+                    del cola[indice]
+            interaccion = cola.pop(indice)
+            self._ultimas[(clave, json.dumps(forma, sort_keys=True))] = interaccion
+            self.served += 1
+            return interaccion
+
+
+# Línea de comandos ----------------------------------------------------------
+
+def main(argv=None):
+    import argparse
+    import runpy
+    import sys
+
+    parser = argparse.ArgumentParser(prog='py -m comun.cassette',
+                                     description='Graba o reproduce las llamadas a AWS de un script')
+    parser.add_argument('modo', choices=['grabar', 'reproducir'])
+    parser.add_argument('cassette', help='Fichero del cassette (.json o .json.gz)')
+    parser.add_argument('script', help='Script a ejecutar')
+    parser.add_argument('--escala', type=float, default=0.0,
+                        help='Al reproducir: fracción de las latencias y pausas reales (0 = sin esperas)')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help='Argumentos del script')
+    args = parser.parse_args(argv)
+
+    contexto = Record(args.cassette) if args.modo == 'grabar' else Replay(args.cassette, time_scale=args.escala)
+    sys.argv = [args.script] + args.args
+    inicio = time.perf_counter()
+    codigo = 0
+    with contexto:
+        try:
+            runpy.run_path(args.script, run_name='__main__')
+        except SystemExit as e:
+            codigo = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    segundos = time.perf_counter() - inicio
+    if args.modo == 'grabar':
+        print(f"\n✓ {len(contexto.interactions)} llamadas grabadas en {args.cassette} ({segundos:.1f}s)")
+    else:
+        print(f"\n✓ {contexto.served} respuestas reproducidas de {args.cassette} ({segundos:.2f}s)")
+    return codigo
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
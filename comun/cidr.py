@@ -0,0 +1,196 @@
+"""
+Reparto automático de CIDRs para VPCs y subnets.
+
+CidrPool reparte bloques de un supernet sin que se solapen. Por dentro es un
+árbol binario (radix) sobre los bits de la dirección: cada nodo es un bloque
+libre, ocupado o partido en sus dos mitades, y guarda el bloque libre más
+grande de su subárbol. Pedir, reservar o liberar un bloque baja por el árbol
+como mucho tantos niveles como bits tiene la dirección (32 en IPv4), así que
+cada operación es O(log n) del espacio de direcciones y no depende de cuántos
+bloques haya repartidos: planificar cientos de VPCs es instantáneo.
+
+Se asigna el primer hueco (la dirección más baja) donde cabe el bloque, y al
+liberar se vuelven a unir las dos mitades libres.
+
+Ejemplo:
+    pool = CidrPool('10.0.0.0/8', reserved=in_use(ec2))   # una describe_vpcs
+    vpc = pool.allocate(16)                               # '10.0.0.0/16' si está libre
+    subnets = carve_subnets(vpc, {'public': 24, 'private': 22}, ['a', 'b'])
+    # {'public': {'a': '10.0.8.0/24', 'b': '10.0.9.0/24'},
+    #  'private': {'a': '10.0.0.0/22', 'b': '10.0.4.0/22'}}
+"""
+
+import ipaddress
+
+FREE, USED, SPLIT = 'free', 'used', 'split'
+
+
+class PoolExhausted(ValueError):
+    """No queda en el supernet un hueco libre del tamaño pedido."""
+
+
+class _Node:
+    __slots__ = ('state', 'left', 'right', 'largest')
+
+    def __init__(self, state, prefix):
+        self.state = state
+        self.left = self.right = None
+        # Prefijo del bloque libre más grande del subárbol (None si no hay)
+        self.largest = prefix if state == FREE else None
+
+
+class CidrPool:
+    """Bloques sin solapar dentro de `supernet`.
+
+    reserved: CIDRs que ya están en uso (p. ej. in_use(ec2)); los que caen
+    fuera del supernet se ignoran.
+    """
+
+    def __init__(self, supernet, reserved=()):
+        self.supernet = ipaddress.ip_network(supernet)
+        self._bits = self.supernet.max_prefixlen
+        self._root = _Node(FREE, self.supernet.prefixlen)
+        self.allocated = []
+        for cidr in reserved:
+            self.reserve(cidr)
+
+    def allocate(self, prefix):
+        """Primer bloque libre /prefix. Lanza PoolExhausted si no cabe."""
+        if prefix < self.supernet.prefixlen or prefix > self._bits:
+            raise ValueError(f"/{prefix} no cabe en {self.supernet}")
+        if self._root.largest is None or self._root.largest > prefix:
+            raise PoolExhausted(f"No queda un /{prefix} libre en {self.supernet}")
+        nodo, direccion, longitud, camino = self._root, int(self.supernet.network_address), self.supernet.prefixlen, []
+        while longitud < prefix:
+            self._split(nodo, longitud)
+            camino.append((nodo, longitud))
+            izquierda = nodo.left.largest
+            if izquierda is not None and izquierda <= prefix:
+                nodo = nodo.left
+            else:
+                nodo = nodo.right
+                direccion |= 1 << (self._bits - longitud - 1)
+            longitud += 1
+        self._fill(nodo)
+        self._update(camino)
+        cidr = str(ipaddress.ip_network((direccion, prefix)))
+        self.allocated.append(cidr)
+        return cidr
+
+    def reserve(self, cidr):
+        """Marca `cidr` como ocupado. Devuelve False si ya lo estaba (entero o en parte)."""
+        red = ipaddress.ip_network(cidr, strict=False)
+        if red.version != self.supernet.version or not red.overlaps(self.supernet):
+            return True
+        if self.supernet.subnet_of(red):
+            libre = self._root.state == FREE
+            self._fill(self._root)
+            return libre
+        nodo, camino = self._descend(red, split=True)
+        if nodo is None:
+            return False
+        libre = nodo.state == FREE
+        self._fill(nodo)
+        self._update(camino)
+        return libre
+
+    def release(self, cidr):
+        """Devuelve `cidr` al pool (se une con su mitad si también está libre)."""
+        red = ipaddress.ip_network(cidr)
+        if not red.subnet_of(self.supernet):
+            raise ValueError(f"{cidr} no está dentro de {self.supernet}")
+        nodo, camino = self._descend(red, split=True, split_used=True)
+        nodo.state, nodo.left, nodo.right, nodo.largest = FREE, None, None, red.prefixlen
+        self._update(camino)
+        if cidr in self.allocated:
+            self.allocated.remove(cidr)
+
+    def is_free(self, cidr):
+        """True si ninguna dirección de `cidr` está ocupada."""
+        red = ipaddress.ip_network(cidr)
+        if not red.subnet_of(self.supernet):
+            return False
+        nodo, _ = self._descend(red, split=False)
+        return nodo is not None and nodo.state == FREE
+
+    def largest_free(self):
+        """Prefijo del bloque libre más grande (None si el pool está lleno)."""
+        return self._root.largest
+
+    # Árbol ----------------------------------------------------------------
+
+    def _descend(self, red, split, split_used=False):
+        """Nodo de `red` y el camino hasta él: [(nodo, prefijo)].
+
+        Si por el camino hay un bloque ocupado entero devuelve (None, camino),
+        salvo con split_used, que lo parte en dos mitades ocupadas (para
+        liberar una parte). Sin split, un bloque libre que contiene a `red` se
+        devuelve tal cual.
+        """
+        nodo, longitud, camino = self._root, self.supernet.prefixlen, []
+        direccion = int(red.network_address)
+        while longitud < red.prefixlen:
+            if nodo.state == USED:
+                if not split_used:
+                    return None, camino
+                self._split(nodo, longitud)
+            elif nodo.state == FREE:
+                if not split:
+                    return nodo, camino
+                self._split(nodo, longitud)
+            camino.append((nodo, longitud))
+            bit = (direccion >> (self._bits - longitud - 1)) & 1
+            nodo = nodo.right if bit else nodo.left
+            longitud += 1
+        return nodo, camino
+
+    @staticmethod
+    def _split(nodo, longitud):
+        """Parte un bloque entero (libre u ocupado) en dos mitades iguales."""
+        if nodo.state != SPLIT:
+            mitad = nodo.state
+            nodo.state = SPLIT
+            nodo.left, nodo.right = _Node(mitad, longitud + 1), _Node(mitad, longitud + 1)
+
+    @staticmethod
+    def _fill(nodo):
+        nodo.state, nodo.left, nodo.right, nodo.largest = USED, None, None, None
+
+    @staticmethod
+    def _update(camino):
+        """Recalcula los nodos del camino de abajo arriba, uniendo mitades iguales."""
+        for nodo, longitud in reversed(camino):
+            izquierda, derecha = nodo.left, nodo.right
+            if izquierda.state == derecha.state == FREE:
+                nodo.state, nodo.left, nodo.right, nodo.largest = FREE, None, None, longitud
+            elif izquierda.state == derecha.state == USED:
+                CidrPool._fill(nodo)
+            else:
+                tamanos = [n.largest for n in (izquierda, derecha) if n.largest is not None]
+                nodo.largest = min(tamanos) if tamanos else None
+
+
+def carve_subnets(vpc_cidr, tiers, azs):
+    """Subnets sin solapar de `vpc_cidr`: una por capa y zona.
+
+    tiers: {capa: prefijo} (p. ej. {'public': 24, 'private': 22}); azs: lista de
+    zonas. Los bloques grandes se reparten primero para no fragmentar.
+    Devuelve {capa: {zona: cidr}} en el orden de `tiers` y `azs`.
+    """
+    pool = CidrPool(vpc_cidr)
+    subnets = {capa: {} for capa in tiers}
+    for capa, prefijo in sorted(tiers.items(), key=lambda t: t[1]):
+        for az in azs:
+            subnets[capa][az] = pool.allocate(prefijo)
+    return subnets
+
+
+def in_use(ec2):
+    """CIDRs de todas las VPCs de la región (una describe_vpcs, paginada)."""
+    cidrs = []
+    for pagina in ec2.get_paginator('describe_vpcs').paginate():
+        for vpc in pagina['Vpcs']:
+            for asociacion in vpc.get('CidrBlockAssociationSet', [{'CidrBlock': vpc['CidrBlock']}]):
+                if asociacion.get('CidrBlockState', {}).get('State', 'associated') in ('associated', 'associating'):
+                    cidrs.append(asociacion['CidrBlock'])
+    return cidrs
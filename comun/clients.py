@@ -0,0 +1,118 @@
+"""
+Clientes boto3 compartidos.
+
+Cada boto3.client() nuevo carga de nuevo los modelos del servicio y abre sus
+propias conexiones TLS. Este registro crea cada cliente una sola vez por
+(servicio, región, perfil), a partir de una sesión compartida por perfil
+(que cachea los modelos ya cargados), y lo reutiliza desde cualquier hilo:
+los clientes de botocore son seguros entre hilos, las sesiones no, así que
+la creación va bajo un lock.
+
+El pool de conexiones de cada cliente se dimensiona con el número de hilos
+que lo van a usar (configure(workers=...)) y los reintentos usan el modo
+adaptativo de botocore, que además de reintentar limita el ritmo cuando AWS
+responde con throttling (con comun.ratelimit activado pasan a 'standard' y
+el ritmo lo limita un único limitador para todos los clientes).
+
+Ejemplo:
+    clients.configure(workers=8)
+    ec2 = clients.client('ec2', 'us-west-2')
+"""
+
+import threading
+import weakref
+
+import boto3
+from botocore.config import Config
+
+# Conexiones extra para los hilos que no son workers (poller, hilo principal)
+EXTRA_CONNECTIONS = 2
+
+_lock = threading.Lock()
+_sessions = {}
+_clients = {}
+_hooks = []
+_profiles = weakref.WeakKeyDictionary()
+_settings = {'workers': 10, 'retry_mode': 'adaptive', 'max_attempts': 10}
+
+
+def configure(workers=None, retry_mode=None, max_attempts=None):
+    """Ajusta cómo se crean los clientes. Los ya creados con otra config se descartan."""
+    nuevos = {'workers': workers, 'retry_mode': retry_mode, 'max_attempts': max_attempts}
+    with _lock:
+        cambios = {k: v for k, v in nuevos.items() if v is not None and _settings[k] != v}
+        if cambios:
+            _settings.update(cambios)
+            _clients.clear()
+
+
+def config():
+    """botocore Config con el pool y los reintentos configurados."""
+    return Config(
+        max_pool_connections=_settings['workers'] + EXTRA_CONNECTIONS,
+        retries={'mode': _settings['retry_mode'], 'max_attempts': _settings['max_attempts']},
+    )
+
+
+def session(profile=None):
+    """Sesión boto3 compartida para el perfil (None = credenciales por defecto)."""
+    with _lock:
+        return _session(profile)
+
+
+def _session(profile):
+    if profile not in _sessions:
+        _sessions[profile] = boto3.session.Session(profile_name=profile)
+    return _sessions[profile]
+
+
+def client(service, region=None, profile=None):
+    """Cliente compartido para (servicio, región, perfil); se crea la primera vez."""
+    clave = (service, region, profile)
+    cliente = _clients.get(clave)
+    if cliente is None:
+        with _lock:
+            cliente = _clients.get(clave)
+            if cliente is None:
+                cliente = _session(profile).client(service, region_name=region, config=config())
+                _profiles[cliente] = profile
+                for hook in _hooks:
+                    hook(cliente)
+                _clients[clave] = cliente
+    return cliente
+
+
+def profile_of(cliente):
+    """Perfil con el que se creó un cliente del registro (None = credenciales por defecto)."""
+    return _profiles.get(cliente)
+
+
+def on_create(func):
+    """Llama a func(cliente) con los clientes ya creados y con cada uno nuevo."""
+    with _lock:
+        _hooks.append(func)
+        existentes = list(_clients.values())
+    for cliente in existentes:
+        func(cliente)
+
+
+def off_create(func, undo=None):
+    """Deja de llamar a func con los clientes nuevos.
+
+    Los ya creados conservan lo que registró func salvo que se pase
+    undo(cliente), que se llama con cada uno para quitárselo.
+    """
+    with _lock:
+        if func in _hooks:
+            _hooks.remove(func)
+        existentes = list(_clients.values())
+    if undo is not None:
+        for cliente in existentes:
+            undo(cliente)
+
+
+def reset():
+    """Olvida sesiones y clientes (p. ej. al cambiar de credenciales)."""
+    with _lock:
+        _sessions.clear()
+        _clients.clear()
@@ -0,0 +1,153 @@
+"""
+Análisis del camino crítico de un despliegue.
+
+A partir del informe de comun.trace (report() o el PREFIJO.json de --traza),
+cada paso tiene inicio, fin, los IDs que consume, los que produce y los que
+ha esperado hasta estar listos (waiters.wait_for). Un paso depende de:
+
+- los pasos declarados en su grafo (comun.scheduler: inputs/after),
+- por cada ID que consume, el último paso que lo produjo o esperó a que
+  estuviese listo antes de que él empezara.
+
+Con esas dependencias se calcula:
+
+    min_seconds      tiempo mínimo con paralelismo ilimitado (el camino más
+                     largo sumando solo duraciones)
+    critical_path    los pasos de ese camino
+    slack            cuánto podría retrasarse cada paso sin alargar el mínimo
+    wait             cuánto tardó en empezar desde que sus dependencias
+                     terminaron (colas, barreras entre fases...)
+
+Un paso largo sin holgura es candidato a cachear o acelerar; una espera
+grande indica paralelismo sin aprovechar.
+
+Ejemplo:
+    py plantilla_final.py --traza traza
+    py -m comun.critical traza.json
+"""
+
+import json
+
+# Margen para considerar que un paso terminó antes de que otro empezara
+EPSILON = 1e-3
+
+
+def _dependencias(pasos, explicitas):
+    """Para cada paso, los índices de los pasos de los que depende."""
+    por_nombre, tocados = {}, {}
+    for i, paso in enumerate(pasos):
+        por_nombre.setdefault(paso['step'], []).append(i)
+        for resource_id in paso.get('produces', []) + paso.get('ready', []):
+            tocados.setdefault(resource_id, []).append(i)
+
+    def ultimo(candidatos, i):
+        # El más reciente de los que terminaron antes de que empezara el paso i
+        previos = [j for j in candidatos if j != i and pasos[j]['end'] <= pasos[i]['start'] + EPSILON]
+        return max(previos, key=lambda j: pasos[j]['end']) if previos else None
+
+    deps = []
+    for i, paso in enumerate(pasos):
+        propias = set()
+        for nombre in explicitas.get(paso['step'], ()):
+            j = ultimo(por_nombre.get(nombre, []), i)
+            if j is not None:
+                propias.add(j)
+        for resource_id in paso.get('consumes', []):
+            j = ultimo(tocados.get(resource_id, []), i)
+            if j is not None:
+                propias.add(j)
+        deps.append(propias)
+    return deps
+
+
+def analyze(informe):
+    """Camino crítico, holguras y tiempo mínimo a partir de un informe de comun.trace."""
+    pasos = [dict(p, end=p['start'] + p['duration']) for p in sorted(informe['step_log'], key=lambda p: p['start'])]
+    if not pasos:
+        return {'wall_seconds': 0, 'min_seconds': 0, 'critical_path': [], 'steps': []}
+    explicitas = {}
+    for run in informe.get('runs', []):
+        for nombre, datos in run['steps'].items():
+            explicitas[f"{run['name']}/{nombre}"] = [f"{run['name']}/{d}" for d in datos['after']]
+    deps = _dependencias(pasos, explicitas)
+    sucesores = [set() for _ in pasos]
+    for i, propias in enumerate(deps):
+        for j in propias:
+            sucesores[j].add(i)
+
+    # Las dependencias terminan antes de que empiece el paso: el orden por inicio es topológico
+    fin_temprano = []
+    for i, paso in enumerate(pasos):
+        fin_temprano.append(paso['duration'] + max((fin_temprano[j] for j in deps[i]), default=0))
+    minimo = max(fin_temprano)
+    fin_tardio = [0.0] * len(pasos)
+    for i in reversed(range(len(pasos))):
+        fin_tardio[i] = min((fin_tardio[s] - pasos[s]['duration'] for s in sucesores[i]), default=minimo)
+
+    camino = [max(range(len(pasos)), key=lambda i: fin_temprano[i])]
+    while deps[camino[-1]]:
+        camino.append(max(deps[camino[-1]], key=lambda j: fin_temprano[j]))
+    camino.reverse()
+
+    origen = pasos[0]['start']
+    resultado = []
+    for i, paso in enumerate(pasos):
+        listo = max((pasos[j]['end'] for j in deps[i]), default=origen)
+        resultado.append({
+            'step': paso['step'],
+            'start': round(paso['start'], 3),
+            'end': round(paso['end'], 3),
+            'duration': round(paso['duration'], 3),
+            'slack': round(max(0.0, fin_tardio[i] - fin_temprano[i]), 3),
+            'wait': round(max(0.0, paso['start'] - listo), 3),
+            'critical': i in camino,
+            'after': sorted(pasos[j]['step'] for j in deps[i]),
+        })
+    return {
+        'wall_seconds': round(max(p['end'] for p in pasos) - origen, 3),
+        'min_seconds': round(minimo, 3),
+        'critical_path': [pasos[i]['step'] for i in camino],
+        'steps': sorted(resultado, key=lambda p: (-p['duration'], p['step'])),
+    }
+
+
+def print_report(analisis, top=15):
+    """Informe ordenado: pasos más largos, su holgura y cuánto esperaron a empezar."""
+    if not analisis['steps']:
+        return
+    real, minimo = analisis['wall_seconds'], analisis['min_seconds']
+    print(f"\n⏱  Camino crítico: {real:.1f}s reales, {minimo:.1f}s como mínimo con paralelismo ilimitado"
+          f" ({max(0.0, real - minimo):.1f}s de margen)")
+    print(f"   {' → '.join(analisis['critical_path'])}")
+    print(f"\n   {'Paso':<42}{'Duración':>10}{'Holgura':>10}{'Espera':>10}")
+    for paso in analisis['steps'][:top]:
+        marca = '★' if paso['critical'] else ' '
+        print(f" {marca} {paso['step']:<42}{paso['duration']:>9.1f}s{paso['slack']:>9.1f}s{paso['wait']:>9.1f}s")
+    esperas = sorted((p for p in analisis['steps'] if p['wait'] >= 0.5), key=lambda p: -p['wait'])[:5]
+    if esperas:
+        print("\n   Pasos que pudieron empezar antes:")
+        for paso in esperas:
+            desde = f"que terminaron {', '.join(paso['after'])}" if paso['after'] else 'el inicio'
+            print(f"   ⚠ {paso['step']}: {paso['wait']:.1f}s desde {desde}")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='py -m comun.critical',
+                                     description='Camino crítico de un despliegue a partir de su traza')
+    parser.add_argument('traza', help='Informe JSON escrito por --traza (PREFIJO.json)')
+    parser.add_argument('--top', type=int, default=15, help='Pasos a mostrar')
+    parser.add_argument('--json', action='store_true', help='Imprimir el análisis en JSON')
+    args = parser.parse_args(argv)
+    with open(args.traza, encoding='utf-8') as f:
+        analisis = analyze(json.load(f))
+    if args.json:
+        print(json.dumps(analisis, indent=2))
+    else:
+        print_report(analisis, args.top)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,123 @@
+"""
+Lanzamiento de instancias EC2 en bloque.
+
+En lugar de un run_instances(MinCount=1, MaxCount=1) por instancia, cada
+grupo (una subnet con su número de instancias) se lanza con una sola llamada
+MinCount=MaxCount=count, y todo el fleet se espera con una única espera
+multi-ID (el poller agrupa las consultas). Lanzar 50 instancias en dos
+subnets son 2 run_instances y unas pocas describe_instances.
+
+Cada grupo lleva un ClientToken estable: si la llamada se repite (reintento,
+--resume tras un fallo antes de guardar el estado) AWS devuelve las mismas
+instancias en lugar de lanzar otras. Si entre tanto se terminaron algunas, se
+conservan las vivas y solo se lanzan las que faltan.
+
+Ejemplo:
+    ids = launch_fleet(ec2, [
+        FleetGroup('Oregon-Public-Instance', subnet_id, 20, [sg_id], public=True),
+        FleetGroup('Oregon-Private-Instance', private_subnet_id, 30, [sg_id]),
+    ], ami='ami-...', token_seed='plantilla-final')
+    # {'Oregon-Public-Instance': ['i-...', ...], 'Oregon-Private-Instance': [...]}
+"""
+
+import contextvars
+import hashlib
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from comun import waiters
+
+FleetGroup = namedtuple('FleetGroup', ['name', 'subnet_id', 'count', 'security_groups', 'public'])
+FleetGroup.__new__.__defaults__ = ((), False)
+
+# Estados de instancias de un lanzamiento anterior ya descartado
+GONE = ('shutting-down', 'terminated')
+
+
+def client_token(*parts):
+    """ClientToken determinista (máx. 64 caracteres) a partir de las partes dadas."""
+    return hashlib.sha256('|'.join(str(p) for p in parts).encode()).hexdigest()[:64]
+
+
+def launch_group(ec2, group, ami, instance_type='t2.micro', key_name=None, token=None, tags=()):
+    """Lanza un grupo con un solo run_instances. Devuelve los IDs ordenados por índice.
+
+    Todas las instancias llevan Name=group.name, Fleet=group.name y las
+    etiquetas extra de `tags` ([(clave, valor)]). Si el token ya se usó en un
+    lanzamiento del que se terminaron instancias, se conservan las vivas y las
+    que faltan se lanzan con otro token, derivado de las terminadas: repetir la
+    llamada devuelve las mismas de reemplazo.
+    """
+    kwargs = {
+        'ImageId': ami, 'InstanceType': instance_type,
+        'MinCount': group.count, 'MaxCount': group.count,
+        'NetworkInterfaces': [{'DeviceIndex': 0, 'SubnetId': group.subnet_id,
+                               'Groups': list(group.security_groups),
+                               'AssociatePublicIpAddress': group.public}],
+        'TagSpecifications': [{'ResourceType': 'instance', 'Tags': [
+            {'Key': 'Name', 'Value': group.name}, {'Key': 'Fleet', 'Value': group.name},
+        ] + [{'Key': k, 'Value': v} for k, v in tags]}],
+    }
+    if key_name:
+        kwargs['KeyName'] = key_name
+    if token:
+        kwargs['ClientToken'] = token
+
+    resp = ec2.run_instances(**kwargs)
+    instancias = sorted(resp['Instances'], key=lambda i: i.get('AmiLaunchIndex', 0))
+    vivas = [i['InstanceId'] for i in instancias if i['State']['Name'] not in GONE]
+    if not token or len(vivas) == len(instancias):
+        return vivas
+    if not vivas:
+        # El token pertenece a un fleet anterior ya terminado: lanzar uno nuevo
+        kwargs['ClientToken'] = client_token(token, time.time())
+        return [i['InstanceId'] for i in sorted(ec2.run_instances(**kwargs)['Instances'],
+                                                key=lambda i: i.get('AmiLaunchIndex', 0))]
+    # Reserva a medias: solo las que faltan, con un token propio de este hueco
+    terminadas = sorted(i['InstanceId'] for i in instancias if i['State']['Name'] in GONE)
+    faltan = group._replace(count=len(terminadas))
+    return vivas + launch_group(ec2, faltan, ami, instance_type, key_name, client_token(token, *terminadas), tags)
+
+
+def name_by_index(ec2, name, instance_ids, workers=8):
+    """Renombra cada instancia a '{name}-{índice}' (una create_tags por instancia)."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda par: ec2.create_tags(Resources=[par[1]], Tags=[
+            {'Key': 'Name', 'Value': f"{name}-{par[0]:02d}"}]), enumerate(instance_ids, 1)))
+
+
+def launch_fleet(ec2, groups, ami, instance_type='t2.micro', key_name=None, token_seed=None,
+                 wait=True, timeout=600, index_names=False, workers=4):
+    """Lanza varios grupos (en paralelo, un run_instances por grupo) y espera a todo el fleet.
+
+    token_seed: si se da, cada grupo usa client_token(token_seed, grupo, subnet,
+    count, ami) como ClientToken. index_names=True añade el índice al Name de
+    cada instancia de los grupos con más de una (cuesta una llamada por instancia).
+    Devuelve {nombre_grupo: [instance_id, ...]}.
+    """
+    grupos = [g for g in groups if g.count > 0]
+
+    def lanzar(grupo):
+        token = client_token(token_seed, grupo.name, grupo.subnet_id, grupo.count, ami) if token_seed else None
+        return launch_group(ec2, grupo, ami, instance_type, key_name, token)
+
+    resultado = {}
+    if grupos:
+        with ThreadPoolExecutor(max_workers=min(workers, len(grupos))) as pool:
+            futuros = [pool.submit(contextvars.copy_context().run, lanzar, g) for g in grupos]
+            for grupo, futuro in zip(grupos, futuros):
+                resultado[grupo.name] = futuro.result()
+    if index_names:
+        for nombre, ids in resultado.items():
+            if len(ids) > 1:
+                name_by_index(ec2, nombre, ids)
+    if wait:
+        wait_fleet(ec2, [i for ids in resultado.values() for i in ids], timeout)
+    return resultado
+
+
+def wait_fleet(ec2, instance_ids, timeout=600):
+    """Espera a que todas las instancias estén running (una espera multi-ID)."""
+    if instance_ids:
+        waiters.wait_for(ec2, 'instance_running', instance_ids, timeout=timeout)
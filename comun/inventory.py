@@ -0,0 +1,337 @@
+"""
+Inventario de recursos EC2 de una región.
+
+`Inventory.scan()` recorre cada tipo de recurso una sola vez con los
+paginadores de botocore (un hilo por tipo) y construye índices en memoria:
+por tipo, por tag (clave/valor), por VPC y las aristas de dependencia
+(qué recurso usa a cuál). Los scripts de borrado, informes y comprobaciones
+consultan el índice en vez de repetir llamadas describe_*.
+
+Para no disparar la memoria en cuentas grandes, de cada recurso solo se
+guarda un registro reducido (Resource) y las páginas se procesan según
+llegan; `types` y `filters` permiten limitar el escaneo a lo necesario.
+
+Ejemplo:
+    inv = Inventory(ec2).scan(types=['vpc', 'subnet'])
+    for vpc in inv.find('vpc', tags={'Name': 'MyVpc'}):
+        print(vpc.id, [s.id for s in inv.find('subnet', vpc_id=vpc.id)])
+"""
+
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+
+class Resource:
+    """Registro reducido de un recurso: lo justo para indexar y borrar."""
+
+    __slots__ = ('id', 'type', 'vpc_id', 'tags', 'state', 'uses', 'attrs')
+
+    def __init__(self, id, type, vpc_id=None, tags=None, state=None, uses=(), attrs=None):
+        self.id = id
+        self.type = type
+        self.vpc_id = vpc_id
+        self.tags = tags or {}
+        self.state = state
+        self.uses = tuple(u for u in uses if u)
+        self.attrs = attrs or {}
+
+    @property
+    def name(self):
+        return self.tags.get('Name')
+
+    def __repr__(self):
+        return f"Resource({self.type}, {self.id})"
+
+
+def _tags(item):
+    return {t['Key']: t['Value'] for t in item.get('Tags') or []}
+
+
+def _instances(pagina):
+    for reservation in pagina['Reservations']:
+        for i in reservation['Instances']:
+            sgs = [g['GroupId'] for g in i.get('SecurityGroups', [])]
+            yield Resource(i['InstanceId'], 'instance', i.get('VpcId'), _tags(i), i['State']['Name'],
+                           uses=[i.get('SubnetId')] + sgs, attrs={'subnet_id': i.get('SubnetId')})
+
+
+def _security_groups(pagina):
+    for g in pagina['SecurityGroups']:
+        yield Resource(g['GroupId'], 'security_group', g.get('VpcId'), _tags(g),
+                       uses=[g.get('VpcId')], attrs={'group_name': g['GroupName']})
+
+
+def _route_tables(pagina):
+    for rt in pagina['RouteTables']:
+        asociaciones = [a['RouteTableAssociationId'] for a in rt['Associations'] if not a.get('Main')]
+        subnets = [a['SubnetId'] for a in rt['Associations'] if a.get('SubnetId')]
+        yield Resource(rt['RouteTableId'], 'route_table', rt['VpcId'], _tags(rt), uses=[rt['VpcId']],
+                       attrs={'associations': asociaciones, 'subnets': subnets,
+                              'main': any(a.get('Main') for a in rt['Associations'])})
+
+
+def _internet_gateways(pagina):
+    for igw in pagina['InternetGateways']:
+        vpcs = [a['VpcId'] for a in igw['Attachments']]
+        yield Resource(igw['InternetGatewayId'], 'internet_gateway', vpcs[0] if vpcs else None, _tags(igw),
+                       uses=vpcs, attrs={'vpcs': vpcs})
+
+
+def _subnets(pagina):
+    for s in pagina['Subnets']:
+        yield Resource(s['SubnetId'], 'subnet', s['VpcId'], _tags(s), s.get('State'), uses=[s['VpcId']],
+                       attrs={'cidr': s['CidrBlock'], 'az': s['AvailabilityZone']})
+
+
+def _vpcs(pagina):
+    for v in pagina['Vpcs']:
+        yield Resource(v['VpcId'], 'vpc', v['VpcId'], _tags(v), v.get('State'),
+                       attrs={'cidr': v['CidrBlock'], 'default': v.get('IsDefault', False)})
+
+
+def _nat_gateways(pagina):
+    for n in pagina['NatGateways']:
+        eips = [a['AllocationId'] for a in n.get('NatGatewayAddresses', []) if a.get('AllocationId')]
+        yield Resource(n['NatGatewayId'], 'nat_gateway', n.get('VpcId'), _tags(n), n['State'],
+                       uses=[n.get('SubnetId')] + eips, attrs={'allocation_ids': eips})
+
+
+def _addresses(pagina):
+    for a in pagina['Addresses']:
+        yield Resource(a['AllocationId'], 'address', None, _tags(a),
+                       attrs={'association_id': a.get('AssociationId'), 'public_ip': a.get('PublicIp')})
+
+
+def _network_acls(pagina):
+    for acl in pagina['NetworkAcls']:
+        yield Resource(acl['NetworkAclId'], 'network_acl', acl['VpcId'], _tags(acl), uses=[acl['VpcId']],
+                       attrs={'default': acl.get('IsDefault', False),
+                              'subnets': [a['SubnetId'] for a in acl['Associations']],
+                              'associations': [a['NetworkAclAssociationId'] for a in acl['Associations']]})
+
+
+def _network_interfaces(pagina):
+    for eni in pagina['NetworkInterfaces']:
+        sgs = [g['GroupId'] for g in eni.get('Groups', [])]
+        yield Resource(eni['NetworkInterfaceId'], 'network_interface', eni.get('VpcId'), _tags({'Tags': eni.get('TagSet')}),
+                       eni.get('Status'), uses=[eni.get('SubnetId')] + sgs,
+                       attrs={'instance_id': (eni.get('Attachment') or {}).get('InstanceId')})
+
+
+def _peerings(pagina):
+    for p in pagina['VpcPeeringConnections']:
+        vpcs = [p['RequesterVpcInfo'].get('VpcId'), p['AccepterVpcInfo'].get('VpcId')]
+        yield Resource(p['VpcPeeringConnectionId'], 'vpc_peering_connection', vpcs[0], _tags(p), p['Status']['Code'],
+                       uses=vpcs, attrs={'vpcs': vpcs})
+
+
+def _transit_gateways(pagina):
+    for t in pagina['TransitGateways']:
+        yield Resource(t['TransitGatewayId'], 'transit_gateway', None, _tags(t), t['State'])
+
+
+def _tgw_attachments(pagina):
+    for a in pagina['TransitGatewayVpcAttachments']:
+        if not a.get('VpcId'):
+            # moto devuelve aquí también los de peering (ver _tgw_peerings)
+            continue
+        yield Resource(a['TransitGatewayAttachmentId'], 'transit_gateway_attachment', a['VpcId'], _tags(a), a['State'],
+                       uses=[a['TransitGatewayId'], a['VpcId']] + a.get('SubnetIds', []),
+                       attrs={'transit_gateway_id': a['TransitGatewayId']})
+
+
+def _tgw_peerings(pagina):
+    for a in pagina['TransitGatewayPeeringAttachments']:
+        if 'RequesterTgwInfo' not in a:
+            # y aquí los de VPC (ver _tgw_attachments)
+            continue
+        tgws = [a['RequesterTgwInfo']['TransitGatewayId'], a['AccepterTgwInfo']['TransitGatewayId']]
+        yield Resource(a['TransitGatewayAttachmentId'], 'transit_gateway_peering', None, _tags(a), a['State'],
+                       uses=tgws, attrs={'transit_gateway_id': tgws[0], 'peer_transit_gateway_id': tgws[1],
+                                         'peer_region': a['AccepterTgwInfo'].get('Region')})
+
+
+# tipo: (operación describe, extractor, paginable)
+TYPES = {
+    'instance': ('describe_instances', _instances, True),
+    'security_group': ('describe_security_groups', _security_groups, True),
+    'route_table': ('describe_route_tables', _route_tables, True),
+    'internet_gateway': ('describe_internet_gateways', _internet_gateways, True),
+    'subnet': ('describe_subnets', _subnets, True),
+    'vpc': ('describe_vpcs', _vpcs, True),
+    'nat_gateway': ('describe_nat_gateways', _nat_gateways, True),
+    'address': ('describe_addresses', _addresses, False),
+    'network_acl': ('describe_network_acls', _network_acls, True),
+    'network_interface': ('describe_network_interfaces', _network_interfaces, True),
+    'vpc_peering_connection': ('describe_vpc_peering_connections', _peerings, True),
+    'transit_gateway': ('describe_transit_gateways', _transit_gateways, True),
+    'transit_gateway_attachment': ('describe_transit_gateway_vpc_attachments', _tgw_attachments, True),
+    'transit_gateway_peering': ('describe_transit_gateway_peering_attachments', _tgw_peerings, True),
+}
+
+
+# Parámetro de IDs de cada describe y prefijo de los IDs de cada tipo
+ID_PARAMS = {
+    'instance': 'InstanceIds',
+    'security_group': 'GroupIds',
+    'route_table': 'RouteTableIds',
+    'internet_gateway': 'InternetGatewayIds',
+    'subnet': 'SubnetIds',
+    'vpc': 'VpcIds',
+    'nat_gateway': 'NatGatewayIds',
+    'address': 'AllocationIds',
+    'network_acl': 'NetworkAclIds',
+    'network_interface': 'NetworkInterfaceIds',
+    'vpc_peering_connection': 'VpcPeeringConnectionIds',
+    'transit_gateway': 'TransitGatewayIds',
+    'transit_gateway_attachment': 'TransitGatewayAttachmentIds',
+    'transit_gateway_peering': 'TransitGatewayAttachmentIds',
+}
+
+PREFIXES = [
+    ('tgw-attach-', 'transit_gateway_attachment'), ('tgw-', 'transit_gateway'),
+    ('eipalloc-', 'address'), ('subnet-', 'subnet'), ('vpc-', 'vpc'), ('igw-', 'internet_gateway'),
+    ('nat-', 'nat_gateway'), ('rtb-', 'route_table'), ('sg-', 'security_group'), ('acl-', 'network_acl'),
+    ('eni-', 'network_interface'), ('pcx-', 'vpc_peering_connection'), ('i-', 'instance'),
+]
+
+
+def resource_type(resource_id):
+    """Tipo de recurso a partir del prefijo del ID (None si no se reconoce)."""
+    for prefijo, tipo in PREFIXES:
+        if resource_id.startswith(prefijo):
+            return tipo
+    return None
+
+
+class Inventory:
+    """Índice en memoria de los recursos de una región."""
+
+    def __init__(self, ec2, workers=6, page_size=None):
+        self.ec2 = ec2
+        self.region = ec2.meta.region_name
+        self.workers = workers
+        self.page_size = page_size
+        self.calls = 0
+        self.by_id = {}
+        self.by_type = defaultdict(dict)
+        self.by_tag = defaultdict(set)
+        self.by_vpc = defaultdict(set)
+        self.used_by = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def scan(self, types=None, filters=None):
+        """Escanea la región (un hilo por tipo). filters: {tipo: [Filters de describe]}.
+
+        Devuelve self para encadenar.
+        """
+        tipos = list(types or TYPES)
+        filters = filters or {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(tipos)) or 1) as pool:
+            list(pool.map(lambda t: self._scan_type(t, filters.get(t)), tipos))
+        return self
+
+    def _scan_type(self, tipo, filtros, kwargs=None):
+        """Recorre las páginas de un tipo e indexa cada una según llega."""
+        operacion, extraer, paginable = TYPES[tipo]
+        kwargs = dict(kwargs or {})
+        if filtros:
+            # describe_nat_gateways usa 'Filter' en singular
+            kwargs['Filter' if tipo == 'nat_gateway' else 'Filters'] = filtros
+        if paginable:
+            config = {'PageSize': self.page_size} if self.page_size else {}
+            paginas = self.ec2.get_paginator(operacion).paginate(PaginationConfig=config, **kwargs)
+        else:
+            paginas = [getattr(self.ec2, operacion)(**kwargs)]
+        for pagina in paginas:
+            recursos = list(extraer(pagina))
+            with self._lock:
+                self.calls += 1
+                for recurso in recursos:
+                    self.add(recurso)
+
+    def lookup(self, resource_ids):
+        """Carga solo los IDs indicados: una describe por tipo, en paralelo.
+
+        Si algún ID ya no existe AWS rechaza la llamada entera (*NotFound);
+        entonces se parte la lista en dos y se reintenta cada mitad, así que
+        k IDs perdidos cuestan O(k log n) llamadas extra, no una por ID.
+        Los IDs de tipo desconocido se ignoran. Los tgw-attach- que no son
+        de una VPC se buscan después entre los de TGW peering (mismo prefijo).
+        Devuelve self.
+        """
+        por_tipo = defaultdict(list)
+        for resource_id in resource_ids:
+            tipo = resource_type(resource_id)
+            if tipo:
+                por_tipo[tipo].append(resource_id)
+        if por_tipo:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(por_tipo))) as pool:
+                list(pool.map(lambda item: self._lookup_type(*item), por_tipo.items()))
+        return self
+
+    def _lookup_type(self, tipo, ids):
+        self._lookup_ids(tipo, ids)
+        if tipo == 'transit_gateway_attachment':
+            otros = [i for i in ids if i not in self.by_id]
+            if otros:
+                self._lookup_ids('transit_gateway_peering', otros)
+
+    def _lookup_ids(self, tipo, ids):
+        try:
+            self._scan_type(tipo, None, {ID_PARAMS[tipo]: sorted(ids)})
+        except ClientError as e:
+            if 'NotFound' not in e.response['Error']['Code']:
+                raise
+            if len(ids) > 1:
+                mitad = len(ids) // 2
+                self._lookup_ids(tipo, ids[:mitad])
+                self._lookup_ids(tipo, ids[mitad:])
+
+    def add(self, recurso):
+        self.by_id[recurso.id] = recurso
+        self.by_type[recurso.type][recurso.id] = recurso
+        for clave, valor in recurso.tags.items():
+            self.by_tag[(clave, valor)].add(recurso.id)
+        if recurso.vpc_id:
+            self.by_vpc[recurso.vpc_id].add(recurso.id)
+        for usado in recurso.uses:
+            self.used_by[usado].add(recurso.id)
+
+    def get(self, resource_id):
+        return self.by_id.get(resource_id)
+
+    def find(self, type=None, tags=None, vpc_id=None, states=None):
+        """Recursos que cumplen todos los criterios (tags: {clave: valor o lista de valores})."""
+        candidatos = None
+        for clave, valores in (tags or {}).items():
+            valores = valores if isinstance(valores, (list, tuple, set)) else [valores]
+            ids = set().union(*(self.by_tag.get((clave, v), set()) for v in valores))
+            candidatos = ids if candidatos is None else candidatos & ids
+        if vpc_id is not None:
+            ids = self.by_vpc.get(vpc_id, set())
+            candidatos = ids if candidatos is None else candidatos & ids
+        if candidatos is None:
+            candidatos = self.by_type[type] if type else self.by_id
+        resultado = [self.by_id[i] for i in candidatos]
+        if type:
+            resultado = [r for r in resultado if r.type == type]
+        if states:
+            resultado = [r for r in resultado if r.state in states]
+        return sorted(resultado, key=lambda r: r.id)
+
+    def dependents(self, resource_id):
+        """Recursos que usan a `resource_id` (deben borrarse antes que él)."""
+        return [self.by_id[i] for i in sorted(self.used_by.get(resource_id, ())) if i in self.by_id]
+
+    def missing(self, resource_ids):
+        """IDs que no aparecen en el inventario (o que ya están borrados)."""
+        borrado = ('deleted', 'terminated', 'deleting', 'shutting-down', 'failed', 'rejected', 'expired')
+        return [i for i in resource_ids if i not in self.by_id or self.by_id[i].state in borrado]
+
+    def summary(self):
+        """Número de recursos por tipo."""
+        return {tipo: len(recursos) for tipo, recursos in self.by_type.items()}
@@ -0,0 +1,153 @@
+"""
+Network ACLs declarativas.
+
+Un conjunto de reglas es una lista de NaclEntry. `apply_nacls()` lee en una
+sola llamada las entradas actuales de todas las NACLs, calcula el diff mínimo
+(crear / reemplazar / borrar) y aplica los cambios en paralelo. Volver a
+aplicar un conjunto sin cambios cuesta una lectura y ninguna escritura.
+
+Ejemplo:
+    reglas = [
+        tcp(100, 80),
+        tcp(130, (1024, 65535)),
+        icmp(140),
+        all_traffic(100, egress=True),
+    ]
+    apply_nacl(ec2, nacl_id, reglas)
+"""
+
+import contextvars
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+PROTOCOLS = {'tcp': '6', 'udp': '17', 'icmp': '1', 'all': '-1'}
+
+# Reglas que pone AWS y no se pueden tocar (deny final de cada sentido)
+DEFAULT_RULE_NUMBER = 32767
+
+NaclEntry = namedtuple('NaclEntry', [
+    'rule_number', 'protocol', 'cidr', 'egress', 'action', 'ports', 'icmp',
+])
+NaclEntry.__new__.__defaults__ = (False, 'allow', None, None)
+
+
+def tcp(rule_number, ports, cidr='0.0.0.0/0', egress=False, action='allow'):
+    """Regla TCP. ports: un puerto o una tupla (desde, hasta)."""
+    desde, hasta = ports if isinstance(ports, tuple) else (ports, ports)
+    return NaclEntry(rule_number, '6', cidr, egress, action, (desde, hasta))
+
+
+def udp(rule_number, ports, cidr='0.0.0.0/0', egress=False, action='allow'):
+    desde, hasta = ports if isinstance(ports, tuple) else (ports, ports)
+    return NaclEntry(rule_number, '17', cidr, egress, action, (desde, hasta))
+
+
+def icmp(rule_number, cidr='0.0.0.0/0', egress=False, action='allow', type_code=(-1, -1)):
+    return NaclEntry(rule_number, '1', cidr, egress, action, None, type_code)
+
+
+def all_traffic(rule_number, cidr='0.0.0.0/0', egress=False, action='allow'):
+    return NaclEntry(rule_number, '-1', cidr, egress, action)
+
+
+def from_api(entry):
+    """Convierte una entrada de describe_network_acls en NaclEntry."""
+    rango = entry.get('PortRange')
+    tipo = entry.get('IcmpTypeCode')
+    protocolo = PROTOCOLS.get(entry['Protocol'], entry['Protocol'])
+    return NaclEntry(
+        entry['RuleNumber'], protocolo, entry.get('CidrBlock'), entry['Egress'], entry['RuleAction'],
+        (rango['From'], rango['To']) if rango and protocolo in ('6', '17') else None,
+        ((tipo['Type'], tipo['Code']) if tipo else (-1, -1)) if protocolo == '1' else None,
+    )
+
+
+def to_api(nacl_id, entry):
+    """Argumentos de create/replace_network_acl_entry para una NaclEntry."""
+    kwargs = {
+        'NetworkAclId': nacl_id, 'RuleNumber': entry.rule_number, 'Protocol': entry.protocol,
+        'RuleAction': entry.action, 'Egress': entry.egress, 'CidrBlock': entry.cidr,
+    }
+    if entry.ports:
+        kwargs['PortRange'] = {'From': entry.ports[0], 'To': entry.ports[1]}
+    if entry.icmp:
+        kwargs['IcmpTypeCode'] = {'Type': entry.icmp[0], 'Code': entry.icmp[1]}
+    return kwargs
+
+
+def read_entries(ec2, nacl_ids, batch=200):
+    """Entradas actuales de varias NACLs con una llamada por lote de IDs.
+
+    Devuelve {nacl_id: {(egress, rule_number): NaclEntry}} sin las reglas por defecto.
+    """
+    actuales = {nacl_id: {} for nacl_id in nacl_ids}
+    ids = list(nacl_ids)
+    for n in range(0, len(ids), batch):
+        paginator = ec2.get_paginator('describe_network_acls')
+        for pagina in paginator.paginate(NetworkAclIds=ids[n:n + batch]):
+            for acl in pagina['NetworkAcls']:
+                for entry in acl['Entries']:
+                    if entry['RuleNumber'] != DEFAULT_RULE_NUMBER:
+                        actuales[acl['NetworkAclId']][(entry['Egress'], entry['RuleNumber'])] = from_api(entry)
+    return actuales
+
+
+def diff(actuales, deseadas):
+    """Cambios mínimos para pasar de `actuales` a `deseadas`.
+
+    actuales: {(egress, rule_number): NaclEntry}; deseadas: lista de NaclEntry.
+    Devuelve (crear, reemplazar, borrar).
+    """
+    objetivo = {}
+    for entry in deseadas:
+        clave = (entry.egress, entry.rule_number)
+        if clave in objetivo:
+            raise ValueError(f"Regla duplicada: {'egress' if entry.egress else 'ingress'} {entry.rule_number}")
+        objetivo[clave] = entry
+    crear = [e for k, e in objetivo.items() if k not in actuales]
+    reemplazar = [e for k, e in objetivo.items() if k in actuales and actuales[k] != e]
+    borrar = [k for k in actuales if k not in objetivo]
+    return crear, reemplazar, borrar
+
+
+def apply_nacls(ec2, rule_sets, workers=4):
+    """Sincroniza varias NACLs: {nacl_id: [NaclEntry, ...]}.
+
+    Una lectura para todas, y las escrituras necesarias repartidas entre
+    `workers` hilos. Devuelve {'created': n, 'replaced': n, 'deleted': n}.
+    """
+    actuales = read_entries(ec2, rule_sets)
+    llamadas = []
+    for nacl_id, reglas in rule_sets.items():
+        crear, reemplazar, borrar = diff(actuales[nacl_id], reglas)
+        llamadas += [('created', ec2.create_network_acl_entry, to_api(nacl_id, e)) for e in crear]
+        llamadas += [('replaced', ec2.replace_network_acl_entry, to_api(nacl_id, e)) for e in reemplazar]
+        llamadas += [('deleted', ec2.delete_network_acl_entry, {'NetworkAclId': nacl_id, 'Egress': egress, 'RuleNumber': numero})
+                     for egress, numero in borrar]
+    if llamadas:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futuros = [pool.submit(contextvars.copy_context().run, func, **kwargs) for _, func, kwargs in llamadas]
+            for futuro in futuros:
+                futuro.result()
+    resumen = {'created': 0, 'replaced': 0, 'deleted': 0}
+    for tipo, _, _ in llamadas:
+        resumen[tipo] += 1
+    return resumen
+
+
+def apply_nacl(ec2, nacl_id, reglas, workers=4):
+    return apply_nacls(ec2, {nacl_id: reglas}, workers)
+
+
+def associate_nacls(ec2, subnet_to_nacl):
+    """Asocia cada subnet a su NACL ({subnet_id: nacl_id}).
+
+    Una sola describe para todas las subnets; solo se reemplazan las
+    asociaciones que no apuntan ya a la NACL deseada.
+    """
+    resp = ec2.describe_network_acls(Filters=[{'Name': 'association.subnet-id', 'Values': list(subnet_to_nacl)}])
+    for acl in resp['NetworkAcls']:
+        for assoc in acl['Associations']:
+            destino = subnet_to_nacl.get(assoc['SubnetId'])
+            if destino and acl['NetworkAclId'] != destino:
+                ec2.replace_network_acl_association(AssociationId=assoc['NetworkAclAssociationId'], NetworkAclId=destino)
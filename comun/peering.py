@@ -0,0 +1,170 @@
+"""
+Malla de VPC peering entre varias VPCs y regiones.
+
+build_mesh() conecta los pares de VPCs pedidos (por defecto todos con todos)
+con un grafo de pasos (comun.scheduler) de tres pasos por par: solicitar,
+aceptar y crear las rutas. Todos los pares avanzan a la vez:
+
+- las solicitudes salen en paralelo desde la región de cada VPC,
+- las esperas a 'pending-acceptance' las agrupa el poller compartido en una
+  describe por región y vuelta, vengan del par que vengan,
+- cada aceptación se hace en la región del peer en cuanto su conexión está
+  lista, sin esperar a las demás,
+- las rutas hacia el peer se crean a la vez en todas las route tables de las
+  dos VPCs.
+
+Una malla de 6 VPCs (15 peerings) tarda más o menos lo que uno solo.
+
+Ejemplo:
+    vpcs = [MeshVpc('Oregon', 'us-west-2', vpc_id, '10.0.0.0/16', [rt_pub, rt_priv]), ...]
+    peerings = build_mesh(vpcs)     # {('Oregon', 'Virginia'): 'pcx-...', ...}
+"""
+
+import contextvars
+import itertools
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from comun import clients, salida, waiters
+from comun.scheduler import Step, run_steps
+
+# Pares conectándose a la vez (cada uno ocupa un hilo mientras espera)
+MAX_WORKERS = 32
+
+# route_tables: todas las route tables de la VPC que deben llegar a los peers
+MeshVpc = namedtuple('MeshVpc', ['name', 'region', 'vpc_id', 'cidr', 'route_tables', 'profile'])
+MeshVpc.__new__.__defaults__ = (None,)
+
+
+def full_mesh(names):
+    """Todos los pares sin repetir: [('A', 'B'), ('A', 'C'), ('B', 'C')]."""
+    return list(itertools.combinations(names, 2))
+
+
+def _ec2(vpc):
+    return clients.client('ec2', vpc.region, vpc.profile)
+
+
+def request(vpc, peer):
+    """Solicita el peering desde `vpc` hacia `peer`. Devuelve el ID de la conexión."""
+    respuesta = _ec2(vpc).create_vpc_peering_connection(
+        VpcId=vpc.vpc_id, PeerVpcId=peer.vpc_id, PeerRegion=peer.region,
+        TagSpecifications=[{'ResourceType': 'vpc-peering-connection',
+                            'Tags': [{'Key': 'Name', 'Value': f"{vpc.name}-{peer.name}-Peering"}]}])
+    return respuesta['VpcPeeringConnection']['VpcPeeringConnectionId']
+
+
+def accept(peer, peering_id):
+    """Espera a 'pending-acceptance' y acepta en la región del peer (si no estaba ya activo)."""
+    ec2 = _ec2(peer)
+    waiters.wait_for(ec2, 'vpc_peering_connection_pending_acceptance', [peering_id], timeout=120, delay=1)
+    estado = waiters.WAITERS['vpc_peering_connection_pending_acceptance'].states(ec2, [peering_id])
+    # Si se aceptó pero no llegó a guardarse, no volver a aceptar
+    if estado.get(peering_id) != 'active':
+        ec2.accept_vpc_peering_connection(VpcPeeringConnectionId=peering_id)
+
+
+def _route(ec2, route_table_id, destino, peering_id):
+    """create_route que reemplaza la ruta si ya existe (p. ej. al retomar)."""
+    kwargs = {'RouteTableId': route_table_id, 'DestinationCidrBlock': destino,
+              'VpcPeeringConnectionId': peering_id}
+    try:
+        ec2.create_route(**kwargs)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'RouteAlreadyExists':
+            raise
+        ec2.replace_route(**kwargs)
+
+
+def add_routes(vpc, peer, peering_id):
+    """Rutas en las dos direcciones por `peering_id`, todas las route tables a la vez."""
+    llamadas = [(_ec2(vpc), rt, peer.cidr) for rt in vpc.route_tables]
+    llamadas += [(_ec2(peer), rt, vpc.cidr) for rt in peer.route_tables]
+    with ThreadPoolExecutor(max_workers=len(llamadas) or 1) as pool:
+        futuros = [pool.submit(contextvars.copy_context().run, _route, ec2, rt, destino, peering_id)
+                   for ec2, rt, destino in llamadas]
+        for futuro in futuros:
+            futuro.result()
+    return len(llamadas)
+
+
+def _sin_estado(vpc, peer, paso, entradas, func):
+    return func()
+
+
+def mesh_steps(vpcs, pairs, checkpoint=_sin_estado):
+    """Pasos del grafo para los pares: peering, peering_accept y peering_routes por par.
+
+    checkpoint(vpc, peer, paso, entradas, func) ejecuta cada paso y devuelve
+    sus salidas; permite guardarlos en un estado y reutilizarlos al retomar.
+    Los nombres de paso y las entradas son los mismos en cada ejecución.
+    """
+    por_nombre = {v.name: v for v in vpcs}
+    steps = []
+    for a, b in pairs:
+        vpc, peer = por_nombre[a], por_nombre[b]
+        clave = f"peering_id:{a}-{b}"
+
+        def solicitar(r, vpc=vpc, peer=peer, clave=clave):
+            def crear():
+                peering_id = request(vpc, peer)
+                print(f"   ✓ Solicitud: {peering_id}")
+                return {'peering_id': peering_id}
+            entradas = {'vpc_id': vpc.vpc_id, 'peer_vpc_id': peer.vpc_id}
+            return {clave: checkpoint(vpc, peer, 'peering', entradas, crear)['peering_id']}
+
+        def aceptar(r, vpc=vpc, peer=peer, clave=clave):
+            def hacer():
+                accept(peer, r[clave])
+                print(f"   ✓ Aceptado en {peer.name}")
+                return {}
+            return checkpoint(vpc, peer, 'peering_accept', {'peering_id': r[clave]}, hacer)
+
+        def rutas(r, vpc=vpc, peer=peer, clave=clave):
+            def hacer():
+                print(f"   ✓ {add_routes(vpc, peer, r[clave])} rutas configuradas")
+                return {}
+            entradas = {'peering_id': r[clave], 'route_tables': list(vpc.route_tables) + list(peer.route_tables)}
+            return checkpoint(vpc, peer, 'peering_routes', entradas, hacer)
+
+        steps += [
+            Step(f"peering:{a}-{b}", solicitar, outputs=(clave,), label=f"{a} ↔ {b}: solicitud"),
+            Step(f"peering_accept:{a}-{b}", aceptar, inputs=(clave,), label=f"{a} ↔ {b}: aceptación en {b}"),
+            Step(f"peering_routes:{a}-{b}", rutas, inputs=(clave,), after=(f"peering_accept:{a}-{b}",),
+                 label=f"{a} ↔ {b}: rutas"),
+        ]
+    return steps
+
+
+def build_mesh(vpcs, pairs=None, checkpoint=_sin_estado, workers=None):
+    """Conecta los pares (por defecto full_mesh) a la vez. Devuelve {(a, b): peering_id}.
+
+    La salida de cada paso se imprime en bloque al terminar, numerada por
+    orden de finalización. Si un paso falla se lanza StepError (con los IDs
+    ya creados en su `state`) cuando terminan los que estaban en marcha.
+    """
+    pares = [tuple(p) for p in (pairs if pairs is not None else full_mesh([v.name for v in vpcs]))]
+    if not pares:
+        return {}
+    steps = mesh_steps(vpcs, pares, checkpoint)
+    hechos = []
+
+    def con_log(step):
+        func = step.func
+
+        def cabecera():
+            hechos.append(step.name)
+            return f"\n[{len(hechos)}/{len(steps)}] {step.label}\n"
+
+        def run(r):
+            with salida.capturar(cabecera):
+                return func(r)
+        return run
+
+    for step in steps:
+        step.func = con_log(step)
+    with salida.por_contexto():
+        estado = run_steps(steps, max_workers=workers or min(MAX_WORKERS, len(pares)), name='peering')
+    return {(a, b): estado[f"peering_id:{a}-{b}"] for a, b in pares}
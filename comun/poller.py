@@ -0,0 +1,221 @@
+"""
+Poller compartido que agrupa las consultas de estado.
+
+Cada espera registra sus IDs; en cada vuelta el poller agrupa los IDs
+pendientes por waiter y cliente (región y perfil) y hace una sola
+llamada por grupo (en lotes de `batch` IDs). Con diez NAT Gateways en dos
+regiones son dos llamadas por vuelta, no diez. IDs de perfiles (cuentas)
+distintos van en llamadas distintas: cada uno se consulta con sus credenciales.
+
+El intervalo entre vueltas sigue las mismas reglas que waiters.poll():
+backoff exponencial con jitter mientras nada cambia y vuelta al mínimo cuando
+algún recurso cambia de estado o entra en un estado "casi listo". `time_scale`
+multiplica las pausas (0 = sin pausas, p. ej. al reproducir un cassette).
+
+Un error pasajero de la describe (throttling que sobrevive a los reintentos
+de botocore, un NotFound por consistencia eventual, un 5xx) no termina las
+esperas del grupo: siguen pendientes para la vuelta siguiente y solo el plazo
+las hace fallar.
+
+Ejemplo:
+    espera = default_poller().register(ec2, 'nat_gateway_available', [nat_id])
+    ...
+    espera.result()
+"""
+
+import random
+import threading
+import time
+from collections import defaultdict
+
+from botocore.exceptions import ClientError
+
+from comun.trace import THROTTLE_CODES
+from comun.waiters import WAITERS, WaitFailed, WaitTimeout
+
+# Errores de servidor tras los que basta con volver a consultar
+TRANSIENT_CODES = {'InternalError', 'InternalFailure', 'ServiceUnavailable', 'Unavailable'}
+
+
+def _transient(error):
+    codigo = error.response.get('Error', {}).get('Code', '')
+    return codigo in THROTTLE_CODES or codigo in TRANSIENT_CODES or 'NotFound' in codigo
+
+
+class Wait:
+    """Una espera registrada en el poller."""
+
+    def __init__(self, client, name, ids, deadline, delay, max_delay, on_progress, clock=time.monotonic):
+        self.client = client
+        self.name = name
+        self.spec = WAITERS[name]
+        self.ids = list(ids)
+        self.pending = set(ids)
+        self.deadline = deadline
+        self.delay = delay
+        self.max_delay = max_delay
+        self.on_progress = on_progress
+        self.clock = clock
+        self.started = clock()
+        self.expected_reached = self.spec.expected is None
+        self.error = None
+        self._done = threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self):
+        """Bloquea hasta terminar. Devuelve los segundos esperados o lanza el error."""
+        self._done.wait()
+        if self.error:
+            raise self.error
+        return self.elapsed
+
+    def _finish(self, error=None):
+        self.error = error
+        self.elapsed = self.clock() - self.started
+        self._done.set()
+
+
+class Poller:
+    """Hilo único que consulta en bloque el estado de todas las esperas."""
+
+    def __init__(self, batch=200, factor=1.5, jitter=0.2, clock=time.monotonic, time_scale=1.0):
+        self.batch = batch
+        self.factor = factor
+        self.jitter = jitter
+        self.time_scale = time_scale
+        self.clock = clock
+        self.calls = 0
+        self._waits = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def register(self, client, name, ids, timeout=600, delay=2, max_delay=30, on_progress=None):
+        espera = Wait(client, name, ids, self.clock() + timeout, delay, max_delay, on_progress, self.clock)
+        with self._cond:
+            self._waits.append(espera)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='poller', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return espera
+
+    def wait(self, client, name, ids, **kwargs):
+        timeout = kwargs.get('timeout', 600)
+        try:
+            return self.register(client, name, ids, **kwargs).result()
+        except WaitTimeout:
+            raise WaitTimeout(f"{name}: {sorted(ids)} no listos tras {timeout}s") from None
+
+    def _run(self):
+        intervalo = ultimo = None
+        while True:
+            with self._cond:
+                while not self._waits:
+                    intervalo = None
+                    self._cond.wait()
+                if ultimo is not None:
+                    # Aunque lleguen esperas nuevas, no consultar más a menudo que `delay`
+                    pausa = ultimo + min(e.delay for e in self._waits) * self.time_scale - self.clock()
+                    if pausa > 0:
+                        self._cond.wait(pausa)
+                        continue
+                esperas = list(self._waits)
+            ultimo = self.clock()
+            cambios = self.tick(esperas)
+            with self._cond:
+                self._waits = [e for e in self._waits if not e.done()]
+                if not self._waits:
+                    continue
+                minimo = min(e.delay for e in self._waits)
+                maximo = min(e.max_delay for e in self._waits)
+                if intervalo is None or cambios:
+                    intervalo = minimo
+                else:
+                    intervalo = min(intervalo * self.factor, maximo)
+                hasta_plazo = min(e.deadline for e in self._waits) - self.clock()
+                # Con jitter, regiones y procesos distintos no consultan al compás
+                pausa = intervalo * random.uniform(1 - self.jitter, 1 + self.jitter)
+                self._cond.wait(max(0, min(pausa * self.time_scale, hasta_plazo)))
+
+    def tick(self, esperas):
+        """Una vuelta: una describe por (waiter, cliente). Devuelve True si hubo cambios."""
+        grupos = defaultdict(list)
+        for espera in esperas:
+            if not espera.done():
+                # comun.clients da un cliente por (servicio, región, perfil).
+                # Waiters de la misma describe tratan NotFound de forma distinta
+                # (p. ej. *_available y *_deleted): no comparten lote
+                clave = (espera.name, espera.client)
+                grupos[clave].append(espera)
+
+        cambios = False
+        for grupo in grupos.values():
+            spec, client = grupo[0].spec, grupo[0].client
+            ids = sorted({i for e in grupo for i in e.pending})
+            estados = {}
+            try:
+                for n in range(0, len(ids), self.batch):
+                    self.calls += 1
+                    estados.update(spec.states(client, ids[n:n + self.batch]))
+            except ClientError as e:
+                for espera in grupo:
+                    if not _transient(e):
+                        espera._finish(e)
+                    elif self.clock() >= espera.deadline:
+                        espera._finish(WaitTimeout(f"{espera.name}: {sorted(espera.pending)} no listos ({e})"))
+                continue
+            except Exception as e:
+                for espera in grupo:
+                    espera._finish(e)
+                continue
+            for espera in grupo:
+                try:
+                    cambios |= self._update(espera, estados)
+                except Exception as e:
+                    # Un on_progress que falla termina su espera, no el hilo del poller
+                    espera._finish(e)
+                    cambios = True
+        return cambios
+
+    def _update(self, espera, estados):
+        propios = {i: estados.get(i) for i in espera.pending}
+        if espera.on_progress:
+            espera.on_progress(propios)
+        fallidos = {i: s for i, s in propios.items() if s in espera.spec.failure}
+        if fallidos:
+            espera._finish(WaitFailed(f"{espera.name}: {fallidos}"))
+            return True
+        listos = {i for i, s in propios.items() if s in espera.spec.success}
+        espera.pending -= listos
+        if not espera.pending:
+            espera._finish()
+        elif self.clock() >= espera.deadline:
+            espera._finish(WaitTimeout(f"{espera.name}: {sorted(espera.pending)} no listos"))
+        # Al llegar al tiempo típico de aprovisionamiento, volver al intervalo mínimo
+        if not espera.expected_reached and self.clock() - espera.started >= espera.spec.expected:
+            espera.expected_reached = True
+            return True
+        return bool(listos) or any(s in espera.spec.near for s in propios.values())
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_poller():
+    """Poller compartido por todo el proceso (se crea la primera vez)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Poller()
+        return _default
+
+
+def set_default(poller):
+    """Sustituye el poller compartido (p. ej. uno sin pausas). Devuelve el anterior."""
+    global _default
+    with _default_lock:
+        anterior, _default = _default, poller
+        return anterior
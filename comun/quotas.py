@@ -0,0 +1,179 @@
+"""
+Comprobación previa de cuotas antes de un despliegue largo.
+
+Un despliegue que se queda sin cuota de VPCs, Elastic IPs, NAT Gateways o
+vCPUs lo descubre a mitad, con los NAT ya aprovisionándose. preflight()
+lo comprueba antes de crear nada: para cada región lee a la vez el uso
+actual (describe_vpcs, describe_addresses, describe_nat_gateways,
+describe_instances) y el valor de cada cuota en Service Quotas, y compara
+uso + lo que el plan va a crear con el límite. Todas las regiones y todas
+las consultas van en paralelo, así que tarda lo que la llamada más lenta.
+
+Si Service Quotas no tiene valor aplicado para una cuota
+(NoSuchResourceException) se usa el valor por defecto de AWS; si no hay
+permiso para leerla, la cuota se marca como no comprobada en lugar de fallar.
+
+Ejemplo:
+    filas = preflight({'us-west-2': (None, Need(vpcs=1, elastic_ips=1, nat_gateways=1,
+                                                 instances=2, az='us-west-2a'))})
+    if not print_report(filas):
+        sys.exit(2)
+"""
+
+import contextvars
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from comun import clients
+
+# clave: (descripción, servicio, código de cuota, valor por defecto de AWS)
+QUOTAS = {
+    'vpcs': ('VPCs por región', 'vpc', 'L-F678F1CE', 5),
+    'elastic_ips': ('Elastic IPs', 'ec2', 'L-0263D0A3', 5),
+    'nat_gateways': ('NAT Gateways por AZ', 'vpc', 'L-FE5A380F', 5),
+    'vcpus': ('vCPUs On-Demand estándar', 'ec2', 'L-1216C47A', 5),
+}
+
+# Familias que cuentan para la cuota 'Running On-Demand Standard instances'
+STANDARD_FAMILIES = tuple('acdhimrtz')
+
+# Lo que el plan va a crear en una región. az: zona de los NAT Gateways.
+Need = namedtuple('Need', ['vpcs', 'elastic_ips', 'nat_gateways', 'instances', 'az', 'instance_type'])
+Need.__new__.__defaults__ = (0, None, 't2.micro')
+
+# Una cuota de una región. limit es None si no se pudo leer; source: 'aplicada',
+# 'por defecto' o el código de error.
+Row = namedtuple('Row', ['region', 'key', 'label', 'used', 'need', 'limit', 'source'])
+
+
+def shortfall(fila):
+    """Cuánto falta para que quepa el plan (0 si cabe o si no se conoce el límite)."""
+    if fila.limit is None:
+        return 0
+    return max(0, fila.used + fila.need - fila.limit)
+
+
+def quota_value(client, key):
+    """(valor, origen) de una cuota; valor None si no se puede leer."""
+    _, servicio, codigo, defecto = QUOTAS[key]
+    try:
+        return client.get_service_quota(ServiceCode=servicio, QuotaCode=codigo)['Quota']['Value'], 'aplicada'
+    except ClientError as e:
+        error = e.response.get('Error', {}).get('Code', '')
+        if error == 'NoSuchResourceException':
+            return defecto, 'por defecto'
+        if error in ('AccessDeniedException', 'AccessDenied', 'UnauthorizedOperation'):
+            return None, error
+        raise
+
+# Uso actual (una función por cuota) -----------------------------------------
+
+def _count(ec2, operation, key, **kwargs):
+    return sum(len(pagina[key]) for pagina in ec2.get_paginator(operation).paginate(**kwargs))
+
+
+def vpcs_used(ec2, need):
+    return _count(ec2, 'describe_vpcs', 'Vpcs')
+
+
+def elastic_ips_used(ec2, need):
+    return len(ec2.describe_addresses(Filters=[{'Name': 'domain', 'Values': ['vpc']}])['Addresses'])
+
+
+def nat_gateways_used(ec2, need):
+    """NAT Gateways vivos en la AZ del plan (la cuota es por AZ)."""
+    subnets = [n['SubnetId'] for pagina in ec2.get_paginator('describe_nat_gateways').paginate(
+        Filter=[{'Name': 'state', 'Values': ['pending', 'available']}]) for n in pagina['NatGateways']]
+    if not subnets:
+        return 0
+    zonas = {s['SubnetId']: s['AvailabilityZone']
+             for s in ec2.describe_subnets(SubnetIds=sorted(set(subnets)))['Subnets']}
+    return sum(1 for s in subnets if zonas.get(s) == need.az)
+
+
+def vcpus_used(ec2, need):
+    """vCPUs de las instancias pending/running de familias estándar."""
+    tipos = [i['InstanceType'] for pagina in ec2.get_paginator('describe_instances').paginate(
+        Filters=[{'Name': 'instance-state-name', 'Values': ['pending', 'running']}])
+        for r in pagina['Reservations'] for i in r['Instances']]
+    tipos = [t for t in tipos if t.startswith(STANDARD_FAMILIES)]
+    vcpus = instance_vcpus(ec2, set(tipos))
+    return sum(vcpus[t] for t in tipos)
+
+
+def instance_vcpus(ec2, instance_types):
+    """{tipo: vCPUs} con una sola describe_instance_types."""
+    if not instance_types:
+        return {}
+    resp = ec2.describe_instance_types(InstanceTypes=sorted(instance_types))
+    return {t['InstanceType']: t['VCpuInfo']['DefaultVCpus'] for t in resp['InstanceTypes']}
+
+
+USAGE = {'vpcs': vpcs_used, 'elastic_ips': elastic_ips_used, 'nat_gateways': nat_gateways_used,
+         'vcpus': vcpus_used}
+
+
+def _needed(ec2, need):
+    """{clave: cantidad} que el plan necesita en la región."""
+    vcpus = 0
+    if need.instances and need.instance_type.startswith(STANDARD_FAMILIES):
+        vcpus = need.instances * instance_vcpus(ec2, {need.instance_type})[need.instance_type]
+    return {'vpcs': need.vpcs, 'elastic_ips': need.elastic_ips, 'nat_gateways': need.nat_gateways,
+            'vcpus': vcpus}
+
+
+def preflight(regions, workers=16):
+    """Comprueba las cuotas de todas las regiones a la vez.
+
+    regions: {región: (perfil, Need)}. Devuelve una lista de Row ordenada
+    por región y cuota. Solo se consultan las cuotas que el plan usa.
+    """
+    tareas = []
+    for region, (perfil, need) in regions.items():
+        ec2 = clients.client('ec2', region, perfil)
+        sq = clients.client('service-quotas', region, perfil)
+        tareas.append((region, None, _needed, ec2, need))
+        for key in QUOTAS:
+            if key != 'vcpus' and not getattr(need, key) or key == 'vcpus' and not need.instances:
+                continue
+            tareas.append((region, key, USAGE[key], ec2, need))
+            tareas.append((region, key, quota_value, sq, key))
+
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(tareas)) or 1) as pool:
+        futuros = [(region, key, func, pool.submit(contextvars.copy_context().run, func, client, arg))
+                   for region, key, func, client, arg in tareas]
+        for region, key, func, futuro in futuros:
+            resultados[(region, key, func)] = futuro.result()
+
+    filas = []
+    for region in regions:
+        necesario = resultados[(region, None, _needed)]
+        for key, (label, _, _, _) in QUOTAS.items():
+            if (region, key, USAGE[key]) not in resultados:
+                continue
+            limite, origen = resultados[(region, key, quota_value)]
+            filas.append(Row(region, key, label, resultados[(region, key, USAGE[key])],
+                             necesario[key], None if limite is None else int(limite), origen))
+    return filas
+
+
+def print_report(filas):
+    """Imprime uso / necesario / límite por región. Devuelve True si todo cabe."""
+    ok = True
+    region = None
+    for fila in filas:
+        if fila.region != region:
+            region = fila.region
+            print(f"\n   {region}")
+        falta = shortfall(fila)
+        ok &= not falta
+        limite = '?' if fila.limit is None else fila.limit
+        marca = '❌' if falta else ('⚠' if fila.limit is None else '✓')
+        nota = f"  faltan {falta}" if falta else ('  (no comprobada: ' + fila.source + ')' if fila.limit is None else '')
+        origen = '' if fila.source == 'aplicada' or fila.limit is None else f" ({fila.source})"
+        print(f"   {marca} {fila.label:<26} en uso {fila.used:>4} + {fila.need:>3} nuevas"
+              f" / límite {limite}{origen}{nota}")
+    return ok
@@ -0,0 +1,238 @@
+"""
+Limitador de ritmo compartido por todos los clientes de AWS.
+
+EC2 limita las peticiones por cuenta y región con un token bucket por
+categoría de API (consultas, mutaciones, operaciones costosas como
+RunInstances). Los reintentos de botocore son por cliente y no se coordinan
+entre hilos: con despliegues en paralelo, cada hilo reintenta por su cuenta
+y el throttling se convierte en una tormenta de reintentos.
+
+Con enable() cada intento de llamada (también los reintentos) pide un token
+al bucket de su (servicio, región, perfil, categoría), compartido por todos
+los clientes de comun.clients con esas credenciales: AWS limita cada cuenta
+por separado. Si AWS responde con throttling el ritmo del bucket baja un
+escalón fijo (hasta un mínimo) y se recupera poco a poco con cada respuesta
+correcta. Los contadores de stats() dicen cuánto se ha esperado
+por tokens (sumando todos los hilos) y cuánto tiempo ha estado cada bucket
+por debajo de su ritmo.
+
+Ejemplo:
+    ratelimit.enable()
+    ...
+    ratelimit.print_summary()
+"""
+
+import threading
+import time
+
+from comun import clients
+from comun.trace import THROTTLE_CODES
+
+# Operaciones que EC2 cuenta en el bucket de recursos
+RESOURCE_INTENSIVE = {'RunInstances', 'TerminateInstances', 'StartInstances', 'StopInstances'}
+
+# Categoría → (capacidad, tokens por segundo): los límites por defecto de EC2
+DEFAULT_LIMITS = {
+    'describe': (100, 20.0),
+    'mutating': (200, 5.0),
+    'resource': (50, 5.0),
+}
+
+# Tras un throttle el ritmo baja BACKOFF × ritmo base (como mucho una vez cada
+# COOLDOWN segundos: los throttles de una misma ráfaga cuentan como uno) y
+# cada respuesta correcta lo sube RECOVER × ritmo base
+BACKOFF = 0.2
+COOLDOWN = 1.0
+RECOVER = 0.05
+MIN_RATE = 0.1
+
+_limiter = None
+
+
+def category(operation):
+    """Categoría de límite de una operación de la API."""
+    if operation in RESOURCE_INTENSIVE:
+        return 'resource'
+    if operation.startswith(('Describe', 'Get', 'List')):
+        return 'describe'
+    return 'mutating'
+
+
+class TokenBucket:
+    """Token bucket con ritmo adaptable, seguro entre hilos.
+
+    Cada acquire() reserva un token aunque no quede ninguno (el saldo queda
+    en negativo) y duerme lo que tarde en recargarse: los hilos que esperan
+    salen en orden de llegada y al ritmo del bucket.
+    """
+
+    def __init__(self, capacity, rate, clock=time.monotonic, sleep=time.sleep):
+        self.capacity = capacity
+        self.base_rate = rate
+        self.rate = rate
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(capacity)
+        self.updated = clock()
+        self.calls = 0
+        self.throttles = 0
+        self.waited = 0.0
+        self.throttled = 0.0
+        self._degradado_desde = None
+        self._ultimo_recorte = None
+        self._lock = threading.Lock()
+
+    def _recargar(self, ahora):
+        self.tokens = min(self.capacity, self.tokens + (ahora - self.updated) * self.rate)
+        self.updated = ahora
+
+    def acquire(self):
+        """Toma un token, esperando si hace falta. Devuelve los segundos esperados."""
+        with self._lock:
+            self._recargar(self.clock())
+            self.tokens -= 1
+            self.calls += 1
+            espera = -self.tokens / self.rate if self.tokens < 0 else 0
+            self.waited += espera
+        if espera:
+            self.sleep(espera)
+        return espera
+
+    def on_throttle(self):
+        """AWS ha limitado una llamada: bajar el ritmo un escalón y no dejar ráfagas."""
+        with self._lock:
+            ahora = self.clock()
+            self._recargar(ahora)
+            self.throttles += 1
+            self.tokens = min(self.tokens, 0)
+            if self._ultimo_recorte is not None and ahora - self._ultimo_recorte < COOLDOWN:
+                return
+            self._ultimo_recorte = ahora
+            self.rate = max(self.base_rate * MIN_RATE, self.rate - self.base_rate * BACKOFF)
+            if self._degradado_desde is None:
+                self._degradado_desde = ahora
+
+    def on_success(self):
+        with self._lock:
+            if self.rate >= self.base_rate:
+                return
+            ahora = self.clock()
+            self._recargar(ahora)
+            self.rate = min(self.base_rate, self.rate + self.base_rate * RECOVER)
+            if self.rate >= self.base_rate:
+                self.throttled += ahora - self._degradado_desde
+                self._degradado_desde = None
+
+    def stats(self):
+        with self._lock:
+            throttled = self.throttled
+            if self._degradado_desde is not None:
+                throttled += self.clock() - self._degradado_desde
+            return {
+                'calls': self.calls,
+                'throttles': self.throttles,
+                'waited_seconds': round(self.waited, 3),
+                'throttled_seconds': round(throttled, 3),
+                'rate': round(self.rate, 3),
+                'base_rate': self.base_rate,
+            }
+
+
+class Limiter:
+    """Un TokenBucket por (servicio, región, perfil, categoría), creado al primer uso."""
+
+    def __init__(self, limits=None):
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, service, region, operation, profile=None):
+        clave = (service, region, profile, category(operation))
+        bucket = self.buckets.get(clave)
+        if bucket is None:
+            with self._lock:
+                bucket = self.buckets.get(clave)
+                if bucket is None:
+                    bucket = self.buckets[clave] = TokenBucket(*self.limits[clave[3]])
+        return bucket
+
+    def attach(self, client):
+        servicio = client.meta.service_model.service_name
+        region = client.meta.region_name
+        perfil = clients.profile_of(client)
+
+        def before_send(event_name, **kwargs):
+            # before-send.<servicio>.<Operación>: se emite en cada intento
+            self.bucket(servicio, region, event_name.rsplit('.', 1)[-1], perfil).acquire()
+
+        def needs_retry(response, operation, **kwargs):
+            if response is None:
+                return
+            bucket = self.bucket(servicio, region, operation.name, perfil)
+            if (response[1] or {}).get('Error', {}).get('Code') in THROTTLE_CODES:
+                bucket.on_throttle()
+            elif response[0].status_code < 300:
+                bucket.on_success()
+
+        client.meta.events.register('before-send', before_send, unique_id='comun.ratelimit.send')
+        client.meta.events.register('needs-retry', needs_retry, unique_id='comun.ratelimit.retry')
+
+    def detach(self, client):
+        client.meta.events.unregister('before-send', unique_id='comun.ratelimit.send')
+        client.meta.events.unregister('needs-retry', unique_id='comun.ratelimit.retry')
+
+    def stats(self):
+        with self._lock:
+            buckets = dict(self.buckets)
+        # Sin perfil (credenciales por defecto) la clave queda servicio/región/categoría
+        return {'/'.join(str(p) for p in clave if p is not None): b.stats()
+                for clave, b in sorted(buckets.items(), key=str)}
+
+
+# API del módulo -------------------------------------------------------------
+
+def enable(limits=None):
+    """Activa el limitador compartido en todos los clientes de comun.clients.
+
+    limits: {categoría: (capacidad, tokens por segundo)} para sustituir los
+    valores por defecto (p. ej. si la cuenta tiene límites ampliados). Los
+    reintentos pasan al modo 'standard' de botocore: el modo 'adaptive' ya
+    limita por su cuenta, cliente a cliente.
+    """
+    global _limiter
+    if _limiter is None:
+        _limiter = Limiter(limits)
+        clients.configure(retry_mode='standard')
+        clients.on_create(_limiter.attach)
+    return _limiter
+
+
+def disable():
+    """Quita el limitador de todos los clientes.
+
+    Los reintentos siguen en modo 'standard': cambiarlos descartaría los
+    clientes ya creados, que otros (poller, comun.rollback) aún pueden usar.
+    """
+    global _limiter
+    if _limiter is not None:
+        clients.off_create(_limiter.attach, _limiter.detach)
+        _limiter = None
+
+
+def enabled():
+    return _limiter is not None
+
+
+def stats():
+    return _limiter.stats() if _limiter is not None else {}
+
+
+def print_summary(min_seconds=0.5):
+    """Imprime los buckets que han tenido throttling o esperas apreciables."""
+    afectados = {k: s for k, s in stats().items() if s['throttles'] or s['waited_seconds'] >= min_seconds}
+    if not afectados:
+        return
+    print(f"\n🚦 Limitador de ritmo: {sum(s['throttles'] for s in afectados.values())} throttles")
+    for clave, s in afectados.items():
+        print(f"   {clave:<35} {s['calls']:>5} llamadas  {s['throttles']:>3} throttles  "
+              f"{s['waited_seconds']:>6.1f}s esperando  {s['throttled_seconds']:>6.1f}s por debajo del ritmo")
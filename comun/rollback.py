@@ -0,0 +1,250 @@
+"""
+Registro de lo creado para deshacer un despliegue que falla a medias.
+
+Con enable() cada llamada de creación que termina bien (create_vpc,
+create_nat_gateway, run_instances, allocate_address, attach_internet_gateway,
+create_transit_gateway...) de cualquier cliente de comun.clients anota en el
+registro el recurso creado, su borrado compensatorio y de qué recursos
+depende según los parámetros de la llamada (la subnet y la EIP de un NAT, la
+VPC de una subnet...). No hace falta tocar el código que crea.
+
+unwind() deshace todo con comun.teardown: cada recurso se borra en cuanto ya
+no queda nada creado que dependa de él, todas las regiones a la vez. Los NAT
+Gateways de las dos regiones se borran juntos, las instancias juntas, las EIP
+se liberan cuando su NAT ha desaparecido y las esperas (NAT borrado,
+instancias terminadas, attachments...) pasan por el poller compartido, que
+las agrupa en una describe por tipo y región.
+
+Solo se deshace lo creado en esta ejecución: lo reutilizado de un despliegue
+anterior no pasa por ninguna llamada de creación.
+
+Ejemplo:
+    log = rollback.enable()
+    try:
+        desplegar()
+    except Exception:
+        log.unwind()
+        raise
+"""
+
+import threading
+from collections import namedtuple
+
+import jmespath
+
+from comun import clients, waiters
+from comun.inventory import resource_type
+from comun.teardown import Teardown
+
+# Operación: (tipo, IDs creados en la respuesta, parámetros con los recursos de
+# los que depende). Las rutas son expresiones JMESPath.
+CREATES = {
+    'CreateVpc': ('vpc', 'Vpc.VpcId', ()),
+    'CreateSubnet': ('subnet', 'Subnet.SubnetId', ('VpcId',)),
+    'CreateInternetGateway': ('internet_gateway', 'InternetGateway.InternetGatewayId', ()),
+    'AttachInternetGateway': ('igw_attachment', None, ('InternetGatewayId', 'VpcId')),
+    'AllocateAddress': ('address', 'AllocationId', ()),
+    'CreateNatGateway': ('nat_gateway', 'NatGateway.NatGatewayId', ('SubnetId', 'AllocationId')),
+    'CreateRouteTable': ('route_table', 'RouteTable.RouteTableId', ('VpcId',)),
+    'AssociateRouteTable': ('route_table_association', 'AssociationId', ('RouteTableId', 'SubnetId')),
+    'CreateSecurityGroup': ('security_group', 'GroupId', ('VpcId',)),
+    'CreateNetworkAcl': ('network_acl', 'NetworkAcl.NetworkAclId', ('VpcId',)),
+    'ReplaceNetworkAclAssociation': ('network_acl_association', 'NewAssociationId', ('NetworkAclId',)),
+    'RunInstances': ('instances', 'Instances[].InstanceId',
+                     ('SubnetId', 'SecurityGroupIds[]', 'NetworkInterfaces[].SubnetId',
+                      'NetworkInterfaces[].Groups[]')),
+    'CreateVpcPeeringConnection': ('vpc_peering_connection', 'VpcPeeringConnection.VpcPeeringConnectionId',
+                                   ('VpcId', 'PeerVpcId')),
+    'CreateTransitGateway': ('transit_gateway', 'TransitGateway.TransitGatewayId', ()),
+    'CreateTransitGatewayVpcAttachment': ('transit_gateway_attachment',
+                                          'TransitGatewayVpcAttachment.TransitGatewayAttachmentId',
+                                          ('TransitGatewayId', 'VpcId', 'SubnetIds[]')),
+    'CreateTransitGatewayPeeringAttachment': ('transit_gateway_peering',
+                                              'TransitGatewayPeeringAttachment.TransitGatewayAttachmentId',
+                                              ('TransitGatewayId', 'PeerTransitGatewayId')),
+}
+
+# Tipos que dentro de la misma VPC deben desaparecer antes, aunque los
+# parámetros no los relacionen: el IGW no se desadjunta mientras haya IPs
+# públicas (NAT, instancias)
+AFTER_KINDS = {
+    'igw_attachment': ('nat_gateway', 'instances'),
+}
+
+LABELS = {
+    'vpc': 'VPC', 'subnet': 'Subnet', 'internet_gateway': 'Internet Gateway',
+    'igw_attachment': 'IGW adjunto', 'address': 'Elastic IP', 'nat_gateway': 'NAT Gateway',
+    'route_table': 'Route Table', 'route_table_association': 'Asociación de Route Table',
+    'security_group': 'Security Group', 'network_acl': 'Network ACL',
+    'network_acl_association': 'Asociación de Network ACL', 'instances': 'Instancias EC2',
+    'vpc_peering_connection': 'VPC Peering', 'transit_gateway': 'Transit Gateway',
+    'transit_gateway_attachment': 'TGW attachment', 'transit_gateway_peering': 'TGW peering',
+}
+
+# ids: IDs creados por la llamada; parents: recursos de los que depende (se
+# borran después); vpc_id: VPC del recurso si se conoce
+Entry = namedtuple('Entry', ['node', 'kind', 'ids', 'parents', 'vpc_id', 'client'])
+
+_log = None
+
+
+def _undo(entry):
+    """Borrado compensatorio de una entrada (espera a que el borrado termine)."""
+    ec2, ids = entry.client, entry.ids
+    if entry.kind == 'vpc':
+        ec2.delete_vpc(VpcId=ids[0])
+    elif entry.kind == 'subnet':
+        ec2.delete_subnet(SubnetId=ids[0])
+    elif entry.kind == 'internet_gateway':
+        ec2.delete_internet_gateway(InternetGatewayId=ids[0])
+    elif entry.kind == 'igw_attachment':
+        ec2.detach_internet_gateway(InternetGatewayId=entry.parents[0], VpcId=entry.parents[1])
+    elif entry.kind == 'address':
+        ec2.release_address(AllocationId=ids[0])
+    elif entry.kind == 'nat_gateway':
+        ec2.delete_nat_gateway(NatGatewayId=ids[0])
+        waiters.wait_for(ec2, 'nat_gateway_deleted', ids)
+    elif entry.kind == 'route_table':
+        ec2.delete_route_table(RouteTableId=ids[0])
+    elif entry.kind == 'route_table_association':
+        ec2.disassociate_route_table(AssociationId=ids[0])
+    elif entry.kind == 'security_group':
+        ec2.delete_security_group(GroupId=ids[0])
+    elif entry.kind == 'network_acl':
+        ec2.delete_network_acl(NetworkAclId=ids[0])
+    elif entry.kind == 'network_acl_association':
+        # La subnet vuelve a la NACL por defecto de su VPC; sin esto la NACL
+        # no se puede borrar si la subnet no se creó en esta ejecución
+        vpc_id = entry.vpc_id or ec2.describe_network_acls(
+            NetworkAclIds=entry.parents)['NetworkAcls'][0]['VpcId']
+        defecto = ec2.describe_network_acls(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]},
+                                                     {'Name': 'default', 'Values': ['true']}])
+        ec2.replace_network_acl_association(AssociationId=ids[0],
+                                            NetworkAclId=defecto['NetworkAcls'][0]['NetworkAclId'])
+    elif entry.kind == 'instances':
+        ec2.terminate_instances(InstanceIds=ids)
+        waiters.wait_for(ec2, 'instance_terminated', ids)
+    elif entry.kind == 'vpc_peering_connection':
+        ec2.delete_vpc_peering_connection(VpcPeeringConnectionId=ids[0])
+    elif entry.kind == 'transit_gateway':
+        ec2.delete_transit_gateway(TransitGatewayId=ids[0])
+        waiters.wait_for(ec2, 'transit_gateway_deleted', ids, timeout=900)
+    elif entry.kind == 'transit_gateway_attachment':
+        ec2.delete_transit_gateway_vpc_attachment(TransitGatewayAttachmentId=ids[0])
+        waiters.wait_for(ec2, 'transit_gateway_attachment_deleted', ids, timeout=900)
+    elif entry.kind == 'transit_gateway_peering':
+        ec2.delete_transit_gateway_peering_attachment(TransitGatewayAttachmentId=ids[0])
+        waiters.wait_for(ec2, 'transit_gateway_peering_deleted', ids, timeout=900)
+
+
+class RollbackLog:
+    """Recursos creados (en orden) y cómo borrarlos. Seguro entre hilos."""
+
+    def __init__(self):
+        self.entries = []
+        self.recording = True
+        self._nodes = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def attach(self, client):
+        if client.meta.service_model.service_name != 'ec2':
+            return
+
+        def before(model, params, context, **kwargs):
+            # Los parámetros de la llamada no llegan a after-call
+            if model.name in CREATES:
+                context['_rollback'] = dict(params)
+
+        def after(model, parsed, http_response, context, **kwargs):
+            if self.recording and http_response.status_code < 300 and '_rollback' in context:
+                self.record(client, model.name, context['_rollback'], parsed)
+
+        client.meta.events.register('before-parameter-build', before, unique_id='comun.rollback.before')
+        client.meta.events.register('after-call', after, unique_id='comun.rollback.after')
+
+    def detach(self, client):
+        client.meta.events.unregister('before-parameter-build', unique_id='comun.rollback.before')
+        client.meta.events.unregister('after-call', unique_id='comun.rollback.after')
+
+    def record(self, client, operation, params, response):
+        """Anota lo creado por una llamada `operation` que ha terminado bien."""
+        kind, creados, dependencias = CREATES[operation]
+        parents = [p for ruta in dependencias for p in _list(jmespath.search(ruta, params))]
+        ids = _list(jmespath.search(creados, response)) if creados else []
+        node = ids[0] if ids else f"{kind}:{':'.join(parents)}"
+        with self._lock:
+            if node in self._nodes:
+                return
+            por_id = {i: e for e in self.entries for i in e.ids}
+            vpc_id = next((p for p in parents if resource_type(p) == 'vpc'), None)
+            vpc_id = vpc_id or next((por_id[p].vpc_id for p in parents if p in por_id), None)
+            if kind == 'vpc':
+                vpc_id = ids[0]
+            self._nodes.add(node)
+            self.entries.append(Entry(node, kind, ids, parents, vpc_id, client))
+
+    def plan(self):
+        """Teardown con cada entrada borrada antes que los recursos de los que depende."""
+        with self._lock:
+            entradas = list(self.entries)
+        por_id = {i: e.node for e in entradas for i in e.ids}
+        plan = Teardown()
+        for e in entradas:
+            region = e.client.meta.region_name
+            plan.add(e.node, e.kind, lambda e=e: _undo(e),
+                     label=f"{LABELS[e.kind]} {', '.join(e.ids) or ' → '.join(e.parents)} ({region})")
+        for e in entradas:
+            for parent in e.parents:
+                if parent in por_id:
+                    plan.block(por_id[parent], e.node)
+            for otro in entradas:
+                if otro.kind in AFTER_KINDS.get(e.kind, ()) and otro.vpc_id == e.vpc_id:
+                    plan.block(e.node, otro.node)
+        return plan
+
+    def unwind(self, workers=16):
+        """Borra todo lo registrado. Devuelve el resultado de Teardown.run().
+
+        Mientras dura no se registra nada (devolver una subnet a la NACL por
+        defecto también es un ReplaceNetworkAclAssociation).
+        """
+        self.recording = False
+        try:
+            return self.plan().run(workers=workers, timeout=600)
+        finally:
+            self.recording = True
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self._nodes.clear()
+
+
+def _list(valor):
+    if valor is None:
+        return []
+    return [v for v in (valor if isinstance(valor, list) else [valor]) if v]
+
+
+def enable():
+    """Empieza a registrar las creaciones de todos los clientes de comun.clients."""
+    global _log
+    if _log is None:
+        _log = RollbackLog()
+        clients.on_create(_log.attach)
+    return _log
+
+
+def disable():
+    """Deja de registrar creaciones y olvida el registro."""
+    global _log
+    if _log is not None:
+        clients.off_create(_log.attach, _log.detach)
+        _log = None
+
+
+def enabled():
+    return _log is not None
@@ -0,0 +1,69 @@
+"""
+Salida por contexto para código concurrente.
+
+`print()` escribe en `sys.stdout`, que es global. Con `por_contexto()`
+instalamos un sustituto que decide el destino según una ContextVar, y con
+`capturar()` cada hilo/paso acumula su texto en un buffer propio que se vuelca
+de una sola vez al terminar. Así los logs de hilos distintos no se mezclan.
+
+Los pools que quieran heredar el destino deben ejecutar sus tareas con
+`contextvars.copy_context().run(...)`.
+"""
+
+import contextvars
+import io
+import sys
+import threading
+from contextlib import contextmanager
+
+_destino = contextvars.ContextVar('destino_salida', default=None)
+_lock = threading.Lock()
+
+
+class SalidaPorContexto:
+    """Sustituto de sys.stdout que escribe en el buffer del contexto actual."""
+
+    def __init__(self, original):
+        self.original = original
+
+    def write(self, texto):
+        return (_destino.get() or self.original).write(texto)
+
+    def flush(self):
+        self.original.flush()
+
+
+@contextmanager
+def por_contexto():
+    """Instala SalidaPorContexto como sys.stdout mientras dure el bloque."""
+    if isinstance(sys.stdout, SalidaPorContexto):
+        yield
+        return
+    original = sys.stdout
+    sys.stdout = SalidaPorContexto(original)
+    try:
+        yield
+    finally:
+        sys.stdout = original
+
+
+@contextmanager
+def capturar(cabecera=None):
+    """Acumula la salida del contexto actual y la vuelca al salir del bloque.
+
+    cabecera: función opcional que se llama al salir y cuyo texto se antepone
+    al bloque (útil para numerar pasos por orden de finalización).
+    """
+    anterior = _destino.get()
+    buf = io.StringIO()
+    token = _destino.set(buf)
+    try:
+        yield buf
+    finally:
+        _destino.reset(token)
+        texto = (cabecera() if cabecera else '') + buf.getvalue()
+        if texto:
+            with _lock:
+                destino = anterior or getattr(sys.stdout, 'original', sys.stdout)
+                destino.write(texto)
+                destino.flush()
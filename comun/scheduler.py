@@ -0,0 +1,182 @@
+"""
+Planificador de pasos con dependencias (DAG).
+
+Cada paso declara qué claves necesita (`inputs`) y cuáles produce
+(`outputs`). `run_steps()` arranca cada paso en cuanto todas sus entradas
+existen en el estado compartido, de modo que el tiempo total se acerca al
+camino crítico en lugar de a la suma de todos los pasos.
+
+Ejemplo:
+    steps = [
+        Step('vpc', crear_vpc, outputs=('vpc_id',)),
+        Step('subnet', crear_subnet, inputs=('vpc_id',), outputs=('subnet_id',)),
+    ]
+    estado = run_steps(steps)
+
+Cada ejecución mide el inicio y el fin de cada paso; los observadores
+registrados en `observers` (p. ej. comun.trace) reciben el grafo y los
+tiempos al terminar, y `critical_path()` calcula con ellos el camino crítico.
+"""
+
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Funciones observer(name, steps, tiempos) llamadas al terminar cada run_steps
+# (también si falla). tiempos: {paso: (inicio, fin)} con time.perf_counter().
+observers = []
+
+
+class Step:
+    """Paso del grafo.
+
+    func recibe el estado (dict) y devuelve un dict con, al menos, las claves
+    de `outputs`. `after` permite depender de otros pasos que no producen
+    ninguna clave (por ejemplo, crear una ruta).
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), after=(), label=None):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.after = tuple(after)
+        self.label = label or name
+
+    def __repr__(self):
+        return f"Step({self.name!r})"
+
+
+class StepError(Exception):
+    """Un paso ha fallado. `state` contiene lo creado hasta ese momento.
+
+    Con keep_going, `errors` tiene todos los fallos ({nombre: excepción}) y
+    `skipped` los pasos que no se ejecutaron porque dependían de uno fallido.
+    """
+
+    def __init__(self, step, error, state):
+        super().__init__(f"Paso '{step.name}' falló: {error}")
+        self.step = step
+        self.error = error
+        self.state = state
+        self.errors = {step.name: error}
+        self.skipped = []
+
+
+def validate_steps(steps, initial=()):
+    """Comprueba nombres/salidas duplicadas y entradas que nadie produce."""
+    nombres, producidas = set(), set(initial)
+    for step in steps:
+        if step.name in nombres:
+            raise ValueError(f"Paso duplicado: {step.name}")
+        nombres.add(step.name)
+        for clave in step.outputs:
+            if clave in producidas:
+                raise ValueError(f"La clave '{clave}' la produce más de un paso")
+            producidas.add(clave)
+    for step in steps:
+        faltan = [k for k in step.inputs if k not in producidas]
+        faltan += [n for n in step.after if n not in nombres]
+        if faltan:
+            raise ValueError(f"Paso '{step.name}': dependencias desconocidas {faltan}")
+
+
+def dependencies(steps):
+    """{paso: {pasos de los que depende}} según entradas/salidas y `after`."""
+    productor = {clave: step.name for step in steps for clave in step.outputs}
+    return {step.name: {productor[k] for k in step.inputs if k in productor} | set(step.after)
+            for step in steps}
+
+
+def critical_path(steps, tiempos):
+    """Camino crítico de una ejecución: (segundos, [pasos]).
+
+    Parte del paso que terminó el último y va hacia atrás por la dependencia
+    que terminó más tarde. Los segundos son la suma de las duraciones de los
+    pasos del camino (sin las esperas del planificador).
+    """
+    deps = dependencies(steps)
+    hechos = {n: t for n, t in tiempos.items() if t[1] is not None}
+    if not hechos:
+        return 0.0, []
+    actual = max(hechos, key=lambda n: hechos[n][1])
+    camino = []
+    while actual is not None:
+        camino.append(actual)
+        previos = [d for d in deps.get(actual, ()) if d in hechos]
+        actual = max(previos, key=lambda n: hechos[n][1]) if previos else None
+    camino.reverse()
+    return sum(hechos[n][1] - hechos[n][0] for n in camino), camino
+
+
+def run_steps(steps, state=None, max_workers=8, on_done=None, keep_going=False, name=None):
+    """Ejecuta los pasos respetando dependencias, en paralelo cuando se puede.
+
+    state: estado inicial (se actualiza in situ y se devuelve).
+    on_done(step, outputs): callback opcional al terminar cada paso.
+    Si un paso falla no se lanzan más, se espera a los que están en marcha y
+    se lanza StepError con el estado parcial. Con keep_going=True se siguen
+    ejecutando los pasos que no dependen del fallido (útil para borrados) y
+    el StepError final los recoge todos. `name` identifica la ejecución ante
+    los observadores.
+    """
+    state = {} if state is None else state
+    validate_steps(steps, state)
+    tiempos = {}
+    try:
+        return _run(steps, state, max_workers, on_done, keep_going, tiempos)
+    finally:
+        for observer in list(observers):
+            observer(name, steps, tiempos)
+
+
+def _run(steps, state, max_workers, on_done, keep_going, tiempos):
+    pendientes = list(steps)
+    hechos = set()
+    en_marcha = {}
+    error = None
+
+    def listo(step):
+        return all(k in state for k in step.inputs) and all(n in hechos for n in step.after)
+
+    def cronometrado(step, estado):
+        tiempos[step.name] = (time.perf_counter(), None)
+        try:
+            return step.func(estado)
+        finally:
+            tiempos[step.name] = (tiempos[step.name][0], time.perf_counter())
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pendientes or en_marcha:
+            if error is None or keep_going:
+                for step in [s for s in pendientes if listo(s)]:
+                    pendientes.remove(step)
+                    ctx = contextvars.copy_context()
+                    en_marcha[pool.submit(ctx.run, cronometrado, step, dict(state))] = step
+            if not en_marcha:
+                break
+            terminados, _ = wait(en_marcha, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                step = en_marcha.pop(futuro)
+                try:
+                    salida = futuro.result() or {}
+                    faltan = [k for k in step.outputs if k not in salida]
+                    if faltan:
+                        raise ValueError(f"no devolvió {faltan}")
+                except Exception as e:
+                    if error is None:
+                        error = StepError(step, e, state)
+                        error.__cause__ = e
+                    error.errors[step.name] = e
+                    continue
+                state.update(salida)
+                hechos.add(step.name)
+                if on_done:
+                    on_done(step, salida)
+
+    if error is not None:
+        error.skipped = [s.name for s in pendientes]
+        raise error
+    if pendientes:
+        raise ValueError(f"Dependencias circulares entre: {[s.name for s in pendientes]}")
+    return state
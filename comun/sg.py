@@ -0,0 +1,247 @@
+"""
+Reglas de Security Groups declarativas.
+
+Un conjunto de reglas es una lista de SgRule (protocolo, puertos, origen).
+compile_rules() las normaliza (nombres de protocolo, CIDRs canónicos),
+quita duplicadas, une rangos de puertos contiguos o solapados del mismo
+origen, une CIDRs solapados o adyacentes con los mismos puertos y descarta
+las reglas que ya cubre una de todo el tráfico.
+
+apply_rules() lee con una sola llamada los permisos actuales de todos los
+grupos, calcula el diff y aplica cada grupo con como mucho un authorize y un
+revoke (todas las reglas van en el mismo IpPermissions). Un grupo con
+cientos de CIDRs se sincroniza con dos llamadas, y volver a aplicar un
+conjunto sin cambios cuesta solo la lectura.
+
+Ejemplo:
+    reglas = [tcp(22), tcp(80), tcp(443), icmp()] + [all_traffic(c) for c in peer_cidrs]
+    apply_rules(ec2, {sg_id: reglas})
+"""
+
+import contextvars
+import ipaddress
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+PROTOCOLS = {'6': 'tcp', '17': 'udp', '1': 'icmp', '58': 'icmpv6', 'all': '-1'}
+
+# Protocolos cuyo rango es de puertos (se pueden unir rangos contiguos)
+PORT_PROTOCOLS = ('tcp', 'udp')
+
+# source: un CIDR IPv4/IPv6 o el ID de otro security group (sg-...)
+SgRule = namedtuple('SgRule', ['protocol', 'ports', 'source', 'description'])
+SgRule.__new__.__defaults__ = (None,)
+
+
+def tcp(ports, source='0.0.0.0/0', description=None):
+    """Regla TCP. ports: un puerto o una tupla (desde, hasta)."""
+    return SgRule('tcp', ports if isinstance(ports, tuple) else (ports, ports), source, description)
+
+
+def udp(ports, source='0.0.0.0/0', description=None):
+    return SgRule('udp', ports if isinstance(ports, tuple) else (ports, ports), source, description)
+
+
+def icmp(source='0.0.0.0/0', type_code=(-1, -1), description=None):
+    return SgRule('icmp', type_code, source, description)
+
+
+def all_traffic(source='0.0.0.0/0', description=None):
+    return SgRule('-1', None, source, description)
+
+
+# Normalización y compilación ------------------------------------------------
+
+def _is_group(source):
+    return source.startswith('sg-')
+
+
+def normalize(rule):
+    """Misma regla en forma canónica: protocolo por nombre, CIDR exacto, puertos enteros.
+
+    Los protocolos sin puertos (todo el tráfico, ESP '50', GRE '47'...) llevan ports=None.
+    """
+    protocolo = PROTOCOLS.get(str(rule.protocol).lower(), str(rule.protocol).lower())
+    origen = rule.source if _is_group(rule.source) else str(ipaddress.ip_network(rule.source, strict=False))
+    sin_puertos = protocolo == '-1' or rule.ports is None or None in rule.ports
+    puertos = None if sin_puertos else tuple(int(p) for p in rule.ports)
+    return SgRule(protocolo, puertos, origen, rule.description)
+
+
+def _merge_ports(rangos):
+    """Une rangos de puertos solapados o contiguos: [(22, 22), (23, 80)] → [(22, 80)]."""
+    unidos = []
+    for desde, hasta in sorted(rangos):
+        if unidos and desde <= unidos[-1][1] + 1:
+            unidos[-1] = (unidos[-1][0], max(unidos[-1][1], hasta))
+        else:
+            unidos.append((desde, hasta))
+    return unidos
+
+
+def _merge_sources(origenes):
+    """Une CIDRs solapados o adyacentes (por familia); los grupos se dejan tal cual."""
+    grupos = sorted(o for o in origenes if _is_group(o))
+    redes = [ipaddress.ip_network(o) for o in origenes if not _is_group(o)]
+    cidrs = []
+    for version in (4, 6):
+        cidrs += [str(r) for r in ipaddress.collapse_addresses(r for r in redes if r.version == version)]
+    return cidrs + grupos
+
+
+def _covered(rule, todo_trafico):
+    """¿Hay una regla de todo el tráfico cuyo origen incluye el de `rule`?"""
+    if _is_group(rule.source):
+        return rule.source in todo_trafico
+    red = ipaddress.ip_network(rule.source)
+    return any(not _is_group(o) and ipaddress.ip_network(o).version == red.version
+               and red.subnet_of(ipaddress.ip_network(o)) for o in todo_trafico)
+
+
+def compile_rules(rules):
+    """Conjunto mínimo equivalente a `rules`, en orden estable.
+
+    La descripción de una regla unida es la primera de las que la forman.
+    """
+    reglas = [normalize(r) for r in rules]
+    descripciones = {}
+    for r in reglas:
+        descripciones.setdefault((r.protocol, r.source), r.description)
+
+    # 1. Por protocolo y origen, unir los rangos de puertos
+    rangos = defaultdict(list)
+    for r in reglas:
+        rangos[(r.protocol, r.source)].append(r.ports)
+    por_puertos = defaultdict(list)
+    for (protocolo, origen), puertos in rangos.items():
+        unidos = _merge_ports(puertos) if protocolo in PORT_PROTOCOLS else sorted(set(puertos), key=str)
+        for p in unidos:
+            por_puertos[(protocolo, p)].append(origen)
+
+    # 2. Por protocolo y puertos, unir los CIDRs
+    compiladas = []
+    for (protocolo, puertos), origenes in por_puertos.items():
+        for origen in _merge_sources(origenes):
+            descripcion = descripciones.get((protocolo, origen))
+            compiladas.append(SgRule(protocolo, puertos, origen, descripcion))
+
+    # 3. Lo que ya permite una regla de todo el tráfico sobra
+    todo_trafico = {r.source for r in compiladas if r.protocol == '-1'}
+    compiladas = [r for r in compiladas if r.protocol == '-1' or not _covered(r, todo_trafico)]
+    return sorted(compiladas, key=lambda r: (r.protocol, str(r.ports), r.source))
+
+
+# Traducción a/desde la API --------------------------------------------------
+
+def from_api(permisos):
+    """Reglas (una por origen) a partir de IpPermissions de describe_security_groups."""
+    reglas = []
+    for p in permisos:
+        protocolo = PROTOCOLS.get(p['IpProtocol'], p['IpProtocol'])
+        # Sin FromPort/ToPort (ESP, GRE...) la regla no tiene puertos, igual que '-1'
+        puertos = None if protocolo == '-1' or 'FromPort' not in p else (p['FromPort'], p.get('ToPort'))
+        for rango in p.get('IpRanges', []):
+            reglas.append(SgRule(protocolo, puertos, rango['CidrIp'], rango.get('Description')))
+        for rango in p.get('Ipv6Ranges', []):
+            reglas.append(SgRule(protocolo, puertos, rango['CidrIpv6'], rango.get('Description')))
+        for par in p.get('UserIdGroupPairs', []):
+            reglas.append(SgRule(protocolo, puertos, par['GroupId'], par.get('Description')))
+    return [normalize(r) for r in reglas]
+
+
+def to_api(rules):
+    """IpPermissions con todas las reglas: una entrada por (protocolo, puertos)."""
+    permisos = {}
+    for r in rules:
+        clave = (r.protocol, r.ports)
+        if clave not in permisos:
+            permiso = permisos[clave] = {'IpProtocol': r.protocol}
+            if r.ports is not None:
+                permiso['FromPort'], permiso['ToPort'] = r.ports
+        destino = permisos[clave]
+        if _is_group(r.source):
+            item, lista = {'GroupId': r.source}, 'UserIdGroupPairs'
+        elif ipaddress.ip_network(r.source).version == 6:
+            item, lista = {'CidrIpv6': r.source}, 'Ipv6Ranges'
+        else:
+            item, lista = {'CidrIp': r.source}, 'IpRanges'
+        if r.description:
+            item['Description'] = r.description
+        destino.setdefault(lista, []).append(item)
+    return list(permisos.values())
+
+
+def _clave(rule):
+    # Las descripciones no cuentan: AWS considera la misma regla con otra descripción
+    return (rule.protocol, rule.ports, rule.source)
+
+
+def read_rules(ec2, group_ids, egress=False, batch=200):
+    """Reglas actuales de varios grupos con una llamada por lote de IDs: {sg_id: [SgRule]}."""
+    actuales = {sg_id: [] for sg_id in group_ids}
+    ids = list(group_ids)
+    campo = 'IpPermissionsEgress' if egress else 'IpPermissions'
+    for n in range(0, len(ids), batch):
+        paginator = ec2.get_paginator('describe_security_groups')
+        for pagina in paginator.paginate(GroupIds=ids[n:n + batch]):
+            for grupo in pagina['SecurityGroups']:
+                actuales[grupo['GroupId']] = from_api(grupo.get(campo, []))
+    return actuales
+
+
+def diff(actuales, deseadas):
+    """Reglas a autorizar y a revocar para pasar de `actuales` a `deseadas` (ya compiladas)."""
+    tengo = {_clave(r) for r in actuales}
+    quiero = {_clave(r) for r in deseadas}
+    autorizar = [r for r in deseadas if _clave(r) not in tengo]
+    revocar = [r for r in actuales if _clave(r) not in quiero]
+    return autorizar, revocar
+
+
+def apply_rules(ec2, rule_sets, prune=True, egress=False, workers=4, current=None):
+    """Sincroniza varios grupos: {sg_id: [SgRule, ...]}.
+
+    Una lectura para todos y, por grupo, como mucho un authorize y un revoke
+    (los grupos se reparten entre `workers` hilos). En cada grupo el revoke va
+    después del authorize: al unir reglas (22 y 23-80 pasan a 22-80) el
+    tráfico sigue permitido en todo momento. Con prune=False solo se añaden reglas.
+    current: {sg_id: [SgRule]} si ya se conocen (p. ej. [] para un grupo recién
+    creado, que no tiene reglas de entrada) y así no hace falta leerlas.
+    Devuelve {'authorized': n, 'revoked': n} contando reglas (una por origen).
+    """
+    actuales = current if current is not None else read_rules(ec2, rule_sets, egress)
+    sentido = 'egress' if egress else 'ingress'
+    autorizar = getattr(ec2, f"authorize_security_group_{sentido}")
+    revocar = getattr(ec2, f"revoke_security_group_{sentido}")
+    grupos = []
+    resumen = {'authorized': 0, 'revoked': 0}
+    for sg_id, reglas in rule_sets.items():
+        nuevas, sobrantes = diff(actuales[sg_id], compile_rules(reglas))
+        if not prune:
+            sobrantes = []
+        llamadas = []
+        if nuevas:
+            llamadas.append((autorizar, {'GroupId': sg_id, 'IpPermissions': to_api(nuevas)}))
+        if sobrantes:
+            # Para revocar, los permisos tal como están (sin descripción)
+            llamadas.append((revocar, {'GroupId': sg_id, 'IpPermissions': to_api([r._replace(description=None) for r in sobrantes])}))
+        if llamadas:
+            grupos.append(llamadas)
+        resumen['authorized'] += len(nuevas)
+        resumen['revoked'] += len(sobrantes)
+
+    def aplicar(llamadas):
+        for func, kwargs in llamadas:
+            func(**kwargs)
+
+    if grupos:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futuros = [pool.submit(contextvars.copy_context().run, aplicar, llamadas) for llamadas in grupos]
+            for futuro in futuros:
+                futuro.result()
+    return resumen
+
+
+def apply_group(ec2, sg_id, reglas, prune=True, egress=False, new=False):
+    """Sincroniza un grupo. new=True: recién creado, sin reglas de entrada que leer."""
+    return apply_rules(ec2, {sg_id: reglas}, prune, egress, current={sg_id: []} if new and not egress else None)
@@ -0,0 +1,188 @@
+"""
+Sustituto local de EC2 para medir los scripts sin cuenta de AWS.
+
+Usa moto (dependencia opcional: pip install "moto[ec2]") para simular la API
+en el propio proceso y añade lo que moto no simula y determina el tiempo
+real de un despliegue:
+
+- latencia por llamada (igual para todas o por operación),
+- transiciones de estado con retardo: un NAT Gateway sigue 'pending' durante
+  `delays['nat_gateway']` segundos tras crearse, una instancia 'pending',
+  un TGW o un attachment 'pending', una instancia terminada 'shutting-down',
+  un NAT borrado 'deleting'...
+- cuotas de Service Quotas a elección (`quotas={'L-F678F1CE': 2}`), para
+  probar la comprobación previa de cuotas con límites ajustados.
+- idempotencia de RunInstances: repetir un ClientToken devuelve la reserva
+  original (con el estado actual de sus instancias) en lugar de lanzar otra.
+
+Se engancha a los eventos de botocore de todos los clientes de comun.clients.
+
+Ejemplo:
+    with StandIn(latency=0.02, delays={'nat_gateway': 5}):
+        plantilla_final.main(['--sin-estado'])
+"""
+
+import json
+import threading
+import time
+
+from botocore.awsrequest import AWSResponse
+
+from comun import clients
+
+# Segundos que cada tipo de recurso tarda en salir de su estado transitorio
+DEFAULT_DELAYS = {
+    'nat_gateway': 3.0,              # pending → available
+    'nat_gateway_delete': 2.0,       # deleting → deleted
+    'instance': 1.0,                 # pending → running
+    'instance_terminate': 1.0,       # shutting-down → terminated
+    'transit_gateway': 3.0,          # pending → available
+    'transit_gateway_attachment': 2.0,
+    'transit_gateway_peering': 1.0,  # initiatingRequest → pendingAcceptance
+    'vpc_peering_connection': 0.5,   # initiating-request → pending-acceptance
+}
+
+# Operación de creación/borrado → (tipo de retardo, función que extrae los IDs)
+_ORIGENES = {
+    'CreateNatGateway': ('nat_gateway', lambda r: [r['NatGateway']['NatGatewayId']]),
+    'DeleteNatGateway': ('nat_gateway_delete', lambda r: [r['NatGatewayId']]),
+    'RunInstances': ('instance', lambda r: [i['InstanceId'] for i in r['Instances']]),
+    'TerminateInstances': ('instance_terminate', lambda r: [i['InstanceId'] for i in r['TerminatingInstances']]),
+    'CreateTransitGateway': ('transit_gateway', lambda r: [r['TransitGateway']['TransitGatewayId']]),
+    'CreateTransitGatewayVpcAttachment': ('transit_gateway_attachment',
+                                          lambda r: [r['TransitGatewayVpcAttachment']['TransitGatewayAttachmentId']]),
+    'CreateTransitGatewayPeeringAttachment': ('transit_gateway_peering',
+                                              lambda r: [r['TransitGatewayPeeringAttachment']['TransitGatewayAttachmentId']]),
+    'CreateVpcPeeringConnection': ('vpc_peering_connection',
+                                   lambda r: [r['VpcPeeringConnection']['VpcPeeringConnectionId']]),
+}
+
+# Estado que se muestra mientras dura el retardo de cada tipo
+_TRANSITORIOS = {
+    'nat_gateway': 'pending', 'nat_gateway_delete': 'deleting',
+    'instance': 'pending', 'instance_terminate': 'shutting-down',
+    'transit_gateway': 'pending', 'transit_gateway_attachment': 'pending',
+    'transit_gateway_peering': 'initiatingRequest',
+    'vpc_peering_connection': 'initiating-request',
+}
+_CODIGOS_INSTANCIA = {'pending': 0, 'shutting-down': 32}
+
+
+class StandIn:
+    """moto + latencia + retardos de estado, como contexto."""
+
+    def __init__(self, latency=0.02, op_latency=None, delays=None, scale=1.0, quotas=None,
+                 clock=time.monotonic):
+        self.latency = latency
+        self.op_latency = dict(op_latency or {})
+        self.delays = {k: v * scale for k, v in dict(DEFAULT_DELAYS, **(delays or {})).items()}
+        self.quotas = dict(quotas or {})
+        self.clock = clock
+        self._hasta = {}
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self._mock = None
+
+    def __enter__(self):
+        try:
+            from moto import mock_aws
+        except ImportError:
+            raise RuntimeError('El stand-in necesita moto: pip install "moto[ec2]"') from None
+        self._mock = mock_aws()
+        self._mock.start()
+        clients.reset()
+        clients.on_create(self.attach)
+        return self
+
+    def __exit__(self, *exc):
+        self._mock.stop()
+        # Los clientes que se creen después (reales u otro StandIn) ya no pasan por aquí
+        clients.off_create(self.attach)
+        clients.reset()
+
+    def attach(self, client):
+        region = client.meta.region_name
+
+        def before(**kwargs):
+            return self._before(region=region, **kwargs)
+
+        client.meta.events.register('before-call', before, unique_id='comun.standin.before')
+        client.meta.events.register('after-call', self._after, unique_id='comun.standin.after')
+
+    def _before(self, model, params, context, region, **kwargs):
+        espera = self.op_latency.get(model.name, self.latency)
+        if espera:
+            time.sleep(espera)
+        if model.name == 'RunInstances' and isinstance(params['body'], dict) and params['body'].get('ClientToken'):
+            # moto ignora el ClientToken: con uno ya usado, la reserva original
+            clave = (region, params['body']['ClientToken'])
+            context['_standin_token'] = clave
+            with self._lock:
+                reserva = self._tokens.get(clave)
+            if reserva is not None:
+                context['_standin_replay'] = True
+                return AWSResponse(None, 200, {}, None), self._reservation(clave[0], reserva)
+        if model.name == 'GetServiceQuota' and self.quotas:
+            # Respuesta directa sin pasar por moto (que no conoce todas las cuotas)
+            peticion = json.loads(params['body'] or '{}')
+            if peticion.get('QuotaCode') in self.quotas:
+                quota = {'ServiceCode': peticion['ServiceCode'], 'QuotaCode': peticion['QuotaCode'],
+                         'Value': float(self.quotas[peticion['QuotaCode']])}
+                return AWSResponse(None, 200, {}, None), {'Quota': quota}
+
+    def _after(self, model, parsed, http_response, context, **kwargs):
+        if http_response.status_code >= 300:
+            return
+        origen = None if context.get('_standin_replay') else _ORIGENES.get(model.name)
+        if '_standin_token' in context and not context.get('_standin_replay'):
+            with self._lock:
+                self._tokens[context['_standin_token']] = (
+                    parsed['ReservationId'], [i['InstanceId'] for i in parsed['Instances']])
+        if origen:
+            tipo, ids = origen
+            hasta = self.clock() + self.delays.get(tipo, 0)
+            with self._lock:
+                for resource_id in ids(parsed):
+                    self._hasta[resource_id] = (tipo, hasta)
+        self._rewrite(model.name, parsed)
+
+    @staticmethod
+    def _reservation(region, reserva):
+        """Respuesta de RunInstances para una reserva ya lanzada, con los estados de ahora."""
+        reservation_id, ids = reserva
+        # Cliente fuera de comun.clients: sin latencia ni hooks, contra el mismo moto
+        ec2 = clients.session().client('ec2', region_name=region)
+        instancias = {i['InstanceId']: i for r in ec2.describe_instances(InstanceIds=ids)['Reservations']
+                      for i in r['Instances']}
+        return {'ReservationId': reservation_id, 'Groups': [], 'Instances': [instancias[i] for i in ids]}
+
+    def _transitorio(self, resource_id):
+        with self._lock:
+            tipo, hasta = self._hasta.get(resource_id, (None, 0))
+        return _TRANSITORIOS[tipo] if tipo and self.clock() < hasta else None
+
+    def _rewrite(self, operacion, parsed):
+        """Sustituye el estado de los recursos que siguen en transición."""
+        if operacion in ('DescribeNatGateways', 'CreateNatGateway'):
+            for nat in parsed.get('NatGateways', []) + ([parsed['NatGateway']] if 'NatGateway' in parsed else []):
+                nat['State'] = self._transitorio(nat['NatGatewayId']) or nat['State']
+        elif operacion in ('DescribeInstances', 'RunInstances'):
+            instancias = parsed.get('Instances', []) + [i for r in parsed.get('Reservations', []) for i in r['Instances']]
+            for instancia in instancias:
+                estado = self._transitorio(instancia['InstanceId'])
+                if estado:
+                    instancia['State'] = {'Name': estado, 'Code': _CODIGOS_INSTANCIA[estado]}
+        elif operacion == 'DescribeTransitGateways':
+            for tgw in parsed.get('TransitGateways', []):
+                tgw['State'] = self._transitorio(tgw['TransitGatewayId']) or tgw['State']
+        elif operacion in ('DescribeTransitGatewayVpcAttachments', 'DescribeTransitGatewayAttachments',
+                           'DescribeTransitGatewayPeeringAttachments'):
+            clave = next((k for k in ('TransitGatewayVpcAttachments', 'TransitGatewayPeeringAttachments')
+                          if k in parsed), 'TransitGatewayAttachments')
+            for att in parsed.get(clave, []):
+                att['State'] = self._transitorio(att['TransitGatewayAttachmentId']) or att['State']
+        elif operacion == 'DescribeVpcPeeringConnections':
+            for pcx in parsed.get('VpcPeeringConnections', []):
+                estado = self._transitorio(pcx['VpcPeeringConnectionId'])
+                if estado:
+                    pcx['Status'] = {'Code': estado, 'Message': estado}
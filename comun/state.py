@@ -0,0 +1,185 @@
+"""
+Estado persistente de los despliegues.
+
+Un fichero JSON guarda, por despliegue y región, qué pasos se completaron,
+con qué entradas y qué IDs produjeron:
+
+    {"plantilla-final": {"us-west-2": {"vpc": {"inputs": {}, "outputs": {"vpc_id": "vpc-..."},
+                                               "updated": "2026-10-16T10:00:00"}}}}
+
+Al volver a ejecutar, `RegionState.verify()` comprueba con una describe por
+tipo (Inventory.lookup) que los IDs guardados siguen existiendo, y
+`cached()` devuelve las salidas de un paso si sus entradas no han cambiado y
+sus recursos siguen vivos. Así un segundo despliegue sin cambios no crea
+nada y termina en segundos.
+
+Cada paso se guarda en cuanto termina (checkpoint), así que tras un fallo
+la siguiente ejecución retoma desde el primer paso sin terminar. El estado
+global del despliegue (en curso / fallido / completado y qué pasos fallaron)
+se guarda en la clave STATUS_KEY:
+
+    {"plantilla-final": {"_status": {"status": "failed",
+                                     "failed": {"us-west-2/tgw": "Throttling..."}}, ...}}
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+from comun.inventory import Inventory, resource_type
+
+STATUS_KEY = '_status'
+
+
+class StateStore:
+    """Fichero JSON con el estado de todos los despliegues (seguro entre hilos)."""
+
+    def __init__(self, path, deployment):
+        self.path = path
+        self.deployment = deployment
+        self._lock = threading.Lock()
+        self._data = {}
+        self._regions = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._data = json.load(f)
+
+    def region(self, region):
+        """Vista de una región (siempre el mismo objeto para la misma región)."""
+        with self._lock:
+            if region not in self._regions:
+                self._regions[region] = RegionState(self, region)
+            return self._regions[region]
+
+    def exists(self):
+        """True si hay algo guardado para este despliegue."""
+        with self._lock:
+            return bool(self._data.get(self.deployment))
+
+    def regions(self):
+        with self._lock:
+            return sorted(r for r in self._data.get(self.deployment, {}) if r != STATUS_KEY)
+
+    def status(self):
+        """{'status': ..., 'failed': {'región/paso': error}, 'updated': ...} o {}."""
+        with self._lock:
+            return dict(self._data.get(self.deployment, {}).get(STATUS_KEY, {}))
+
+    def mark(self, status):
+        """Marca el despliegue como 'running', 'failed' o 'complete'.
+
+        'running' borra los fallos anotados en la ejecución anterior.
+        """
+        with self._lock:
+            actual = self._data.setdefault(self.deployment, {}).setdefault(STATUS_KEY, {})
+            actual['status'] = status
+            actual['updated'] = datetime.now().isoformat(timespec='seconds')
+            if status == 'running':
+                actual['failed'] = {}
+            self._save()
+
+    def fail(self, region, step, error):
+        """Anota que un paso ha fallado (el despliegue pasa a 'failed')."""
+        with self._lock:
+            actual = self._data.setdefault(self.deployment, {}).setdefault(STATUS_KEY, {})
+            actual.setdefault('failed', {})[f"{region}/{step}"] = str(error)
+            actual['status'] = 'failed'
+            actual['updated'] = datetime.now().isoformat(timespec='seconds')
+            self._save()
+
+    def steps(self, region):
+        with self._lock:
+            return dict(self._data.get(self.deployment, {}).get(region, {}))
+
+    def record(self, region, step, inputs, outputs):
+        with self._lock:
+            pasos = self._data.setdefault(self.deployment, {}).setdefault(region, {})
+            pasos[step] = {'inputs': inputs, 'outputs': outputs,
+                           'updated': datetime.now().isoformat(timespec='seconds')}
+            self._save()
+
+    def forget(self, region, steps):
+        with self._lock:
+            pasos = self._data.get(self.deployment, {}).get(region, {})
+            for step in steps:
+                pasos.pop(step, None)
+            self._save()
+
+    def _save(self):
+        # Escritura atómica: un fallo a mitad no deja el fichero corrupto
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+class RegionState:
+    """Vista del estado de un despliegue en una región."""
+
+    def __init__(self, store, region):
+        self.store = store
+        self.region = region
+        self.alive = set()
+
+    def recorded_ids(self):
+        """IDs de recursos AWS guardados en los pasos de esta región."""
+        return {i for paso in self.store.steps(self.region).values()
+                for v in paso['outputs'].values() for i in _ids(v)}
+
+    def verify(self, ec2):
+        """Comprueba en bloque qué IDs guardados siguen existiendo.
+
+        Olvida los pasos cuyos recursos ya no existen. Devuelve los IDs perdidos.
+        """
+        ids = self.recorded_ids()
+        if not ids:
+            return []
+        inv = Inventory(ec2).lookup(ids)
+        perdidos = set(inv.missing(ids))
+        self.alive = ids - perdidos
+        caducados = [nombre for nombre, paso in self.store.steps(self.region).items()
+                     if any(i in perdidos for v in paso['outputs'].values() for i in _ids(v))]
+        if caducados:
+            self.store.forget(self.region, caducados)
+        return sorted(perdidos)
+
+    def cached(self, step, inputs):
+        """Salidas guardadas del paso si las entradas coinciden y sus recursos viven."""
+        paso = self.store.steps(self.region).get(step)
+        if not paso or paso['inputs'] != inputs:
+            return None
+        if any(i not in self.alive for v in paso['outputs'].values() for i in _ids(v)):
+            return None
+        return paso['outputs']
+
+    def record(self, step, inputs, outputs):
+        self.store.record(self.region, step, inputs, outputs)
+        self.alive.update(i for v in outputs.values() for i in _ids(v))
+
+    def checkpoint(self, step, inputs, func):
+        """Ejecuta func() salvo que el paso ya esté hecho; guarda su resultado al terminar.
+
+        Devuelve (salidas, reutilizado). Si func() falla, el fallo queda
+        anotado en el estado del despliegue y la excepción se propaga.
+        """
+        previo = self.cached(step, inputs)
+        if previo is not None:
+            return dict(previo), True
+        try:
+            salidas = func()
+        except Exception as e:
+            self.store.fail(self.region, step, e)
+            raise
+        self.record(step, inputs, salidas)
+        return salidas, False
+
+
+def _is_id(valor):
+    return isinstance(valor, str) and resource_type(valor) is not None
+
+
+def _ids(valor):
+    """IDs de AWS en una salida: un ID suelto o una lista de IDs (p. ej. instancias)."""
+    valores = valor if isinstance(valor, list) else [valor]
+    return [v for v in valores if _is_id(v)]
@@ -0,0 +1,150 @@
+"""
+Borrado de recursos respetando dependencias, en paralelo.
+
+Cada recurso descubierto es un nodo con su función de borrado y la lista de
+nodos que deben desaparecer antes (instancias antes que su SG y su subnet,
+subnets antes que su VPC...). Los nodos se borran en cuanto no queda nada
+que dependa de ellos, con un pool de hilos acotado, así que diez VPCs sin
+relación tardan lo mismo que una.
+
+Se apoya en comun.scheduler: cada nodo es un Step que depende (`after`) de
+sus bloqueadores.
+
+Ejemplo:
+    plan = Teardown()
+    plan.add(instance_id, 'instance', lambda: terminar(instance_id))
+    plan.add(sg_id, 'security-group', lambda: ec2.delete_security_group(GroupId=sg_id),
+             after=[instance_id])
+    resultado = plan.run(workers=8)
+"""
+
+from botocore.exceptions import ClientError
+
+from comun import salida
+from comun.scheduler import Step, StepError, run_steps
+from comun.waiters import WaitTimeout, poll
+
+
+# Códigos con los que AWS dice que el propio recurso ya no existe, por tipo de
+# nodo ('security-group' y 'security_group' son el mismo tipo). Solo estos
+# dan el nodo por borrado: un NotFound de otra cosa (una asociación ya
+# deshecha dentro de un borrado compuesto) no significa que el recurso se fue.
+GONE_CODES = {
+    'vpc': ('InvalidVpcID.NotFound',),
+    'subnet': ('InvalidSubnetID.NotFound',),
+    'internet_gateway': ('InvalidInternetGatewayID.NotFound',),
+    'igw_attachment': ('Gateway.NotAttached', 'InvalidInternetGatewayID.NotFound'),
+    'address': ('InvalidAllocationID.NotFound',),
+    'nat_gateway': ('NatGatewayNotFound', 'InvalidNatGatewayID.NotFound'),
+    'route_table': ('InvalidRouteTableID.NotFound',),
+    'route_table_association': ('InvalidAssociationID.NotFound',),
+    'security_group': ('InvalidGroup.NotFound',),
+    'network_acl': ('InvalidNetworkAclID.NotFound',),
+    'network_acl_association': ('InvalidAssociationID.NotFound',),
+    'instances': ('InvalidInstanceID.NotFound',),
+    'vpc_peering_connection': ('InvalidVpcPeeringConnectionID.NotFound',),
+    'transit_gateway': ('InvalidTransitGatewayID.NotFound',),
+    'transit_gateway_attachment': ('InvalidTransitGatewayAttachmentID.NotFound',),
+    'transit_gateway_peering': ('InvalidTransitGatewayAttachmentID.NotFound',),
+}
+
+
+def _codigo(error):
+    return error.response.get('Error', {}).get('Code', '')
+
+
+def ignore_missing(func, *codes, **kwargs):
+    """func(**kwargs) ignorando *NotFound y los `codes` dados.
+
+    Para los pasos intermedios de un borrado compuesto (desasociar una route
+    table, desadjuntar un IGW...): si al repetir una limpieza ya no hay nada
+    que desasociar, se sigue con el borrado principal.
+    """
+    try:
+        return func(**kwargs)
+    except ClientError as e:
+        codigo = _codigo(e)
+        if 'NotFound' in codigo or codigo in codes:
+            return None
+        raise
+
+
+def retry_dependency(func, timeout=300, delay=2, gone=()):
+    """Ejecuta func reintentando mientras AWS responda DependencyViolation.
+
+    Tras terminar una instancia, su ENI tarda unos segundos en desaparecer y
+    el borrado del SG o la subnet falla mientras tanto. Un error con uno de
+    los códigos `gone` (el NotFound del propio recurso) se da por borrado.
+    """
+    def intento():
+        try:
+            func()
+        except ClientError as e:
+            codigo = _codigo(e)
+            if codigo in gone:
+                return True, False
+            if codigo in ('DependencyViolation', 'InvalidGroup.InUse', 'ResourceInUse'):
+                return False, False
+            raise
+        return True, False
+
+    try:
+        poll(intento, timeout=timeout, delay=delay, max_delay=15)
+    except WaitTimeout:
+        raise WaitTimeout(f"Sigue habiendo dependencias tras {timeout}s") from None
+
+
+class Teardown:
+    """Grafo de borrado: nodos (recursos) y sus bloqueadores."""
+
+    def __init__(self):
+        self.nodes = {}
+
+    def add(self, node_id, kind, delete, after=(), label=None, gone=None):
+        """Añade un recurso. `after`: IDs que deben borrarse antes (se ignoran los desconocidos).
+
+        `gone`: códigos de error que significan que el recurso ya no existe
+        (por defecto los de GONE_CODES para `kind`).
+        """
+        if gone is None:
+            gone = GONE_CODES.get(kind.replace('-', '_'), ())
+        self.nodes[node_id] = (kind, delete, list(after), label or f"{kind} {node_id}", tuple(gone))
+
+    def block(self, node_id, before):
+        """Declara que `before` debe borrarse antes que `node_id`."""
+        if node_id in self.nodes and before in self.nodes:
+            self.nodes[node_id][2].append(before)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def run(self, workers=8, timeout=300):
+        """Borra todo. Devuelve {'deleted': [...], 'failed': {id: error}, 'skipped': [...]}."""
+        steps = []
+        for node_id, (kind, delete, after, label, gone) in self.nodes.items():
+            bloqueadores = sorted({a for a in after if a in self.nodes and a != node_id})
+            steps.append(Step(node_id, self._wrap(delete, label, timeout, gone), after=bloqueadores, label=label))
+
+        borrados = []
+        resultado = {'deleted': borrados, 'failed': {}, 'skipped': []}
+        with salida.por_contexto():
+            try:
+                run_steps(steps, max_workers=workers, keep_going=True, name='teardown',
+                          on_done=lambda step, _: borrados.append(step.name))
+            except StepError as e:
+                resultado['failed'] = e.errors
+                resultado['skipped'] = e.skipped
+        return resultado
+
+    @staticmethod
+    def _wrap(delete, label, timeout, gone):
+        def run(_estado):
+            with salida.capturar():
+                try:
+                    retry_dependency(delete, timeout=timeout, gone=gone)
+                except Exception as e:
+                    print(f"  ⚠ {label}: {e}")
+                    raise
+                print(f"  ✓ {label} eliminado")
+            return {}
+        return run
@@ -0,0 +1,274 @@
+"""
+Transit Gateway en estrella (hub-and-spoke).
+
+build_hub() crea (o reutiliza) un Transit Gateway en una región y conecta a
+él N VPCs de esa región:
+
+- los attachments de todas las VPCs se crean a la vez, después de una sola
+  describe que detecta los que ya existían (al retomar no se duplican),
+- se espera a todos con una sola espera multi-ID: el poller consulta todos
+  los attachments con una describe_transit_gateway_vpc_attachments por vuelta,
+- las rutas hacia el TGW se crean a la vez en todas las route tables de
+  todas las VPCs (hacia el resto de VPCs del hub y los destinos extra).
+
+Conectar 20 VPCs cuesta más o menos lo mismo que conectar una.
+
+peer_hubs() une hubs de regiones distintas con TGW peering (solicitud,
+aceptación en la región del peer y rutas estáticas en la route table por
+defecto de cada TGW), todos los pares a la vez.
+
+Ejemplo:
+    spokes = [Spoke('App', vpc_id, [subnet_id], '10.0.0.0/16', [rt_id]), ...]
+    hub = build_hub(ec2, spokes)        # {'tgw_id': ..., 'attachments': {'App': ...}}
+"""
+
+import contextvars
+import itertools
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from comun import clients, salida, waiters
+
+# Llamadas a la vez al crear attachments y rutas
+MAX_WORKERS = 16
+
+# Una VPC conectada al hub: las subnets del attachment (una por AZ) y las
+# route tables que deben llegar al resto por el TGW
+Spoke = namedtuple('Spoke', ['name', 'vpc_id', 'subnet_ids', 'cidr', 'route_tables'])
+
+# Un hub para peer_hubs(): cidrs son los destinos que se alcanzan por él
+Hub = namedtuple('Hub', ['name', 'region', 'tgw_id', 'cidrs', 'profile'])
+Hub.__new__.__defaults__ = (None,)
+
+TGW_OPTIONS = {
+    'AmazonSideAsn': 64512,
+    'DefaultRouteTableAssociation': 'enable',
+    'DefaultRouteTablePropagation': 'enable',
+    'DnsSupport': 'enable',
+    'VpnEcmpSupport': 'enable',
+}
+
+# Estados en los que un attachment existente todavía sirve
+LIVE_STATES = ('initiating', 'initiatingRequest', 'pendingAcceptance', 'pending', 'available', 'modifying')
+
+
+def _sin_estado(paso, entradas, func):
+    return func()
+
+
+def _tags(resource_type, name):
+    return [{'ResourceType': resource_type, 'Tags': [{'Key': 'Name', 'Value': name}]}]
+
+
+def _parallel(func, args_list, workers=MAX_WORKERS):
+    """func(*args) para cada elemento, a la vez. Devuelve los resultados en orden."""
+    if not args_list:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(args_list))) as pool:
+        futuros = [pool.submit(contextvars.copy_context().run, func, *args) for args in args_list]
+        return [f.result() for f in futuros]
+
+
+def create_tgw(ec2, name='Multi-Region-TGW', options=None):
+    """Crea el Transit Gateway (sin esperar). Devuelve su ID."""
+    tgw = ec2.create_transit_gateway(
+        Description=name, Options=dict(TGW_OPTIONS, **(options or {})),
+        TagSpecifications=_tags('transit-gateway', name))
+    return tgw['TransitGateway']['TransitGatewayId']
+
+
+def existing_attachments(ec2, tgw_id):
+    """{vpc_id: attachment_id} de los attachments vivos del TGW (una describe, paginada)."""
+    existentes = {}
+    paginator = ec2.get_paginator('describe_transit_gateway_vpc_attachments')
+    for pagina in paginator.paginate(Filters=[{'Name': 'transit-gateway-id', 'Values': [tgw_id]}]):
+        for att in pagina['TransitGatewayVpcAttachments']:
+            if att.get('VpcId') and att['State'] in LIVE_STATES:
+                existentes[att['VpcId']] = att['TransitGatewayAttachmentId']
+    return existentes
+
+
+def attach(ec2, tgw_id, spokes):
+    """Attachments de todas las VPCs a la vez (salvo las que ya lo tienen). {nombre: attachment_id}."""
+    existentes = existing_attachments(ec2, tgw_id)
+
+    def crear(spoke):
+        att = ec2.create_transit_gateway_vpc_attachment(
+            TransitGatewayId=tgw_id, VpcId=spoke.vpc_id, SubnetIds=list(spoke.subnet_ids),
+            TagSpecifications=_tags('transit-gateway-attachment', f"{spoke.name}-VPC-Attachment"))
+        return att['TransitGatewayVpcAttachment']['TransitGatewayAttachmentId']
+
+    nuevos = [s for s in spokes if s.vpc_id not in existentes]
+    creados = dict(zip((s.name for s in nuevos), _parallel(crear, [(s,) for s in nuevos])))
+    reutilizados = {s.name: existentes[s.vpc_id] for s in spokes if s.vpc_id in existentes}
+    return {s.name: creados.get(s.name) or reutilizados[s.name] for s in spokes}
+
+
+def _route(ec2, route_table_id, destino, tgw_id):
+    """create_route hacia el TGW que reemplaza la ruta si ya existe."""
+    kwargs = {'RouteTableId': route_table_id, 'DestinationCidrBlock': destino, 'TransitGatewayId': tgw_id}
+    try:
+        ec2.create_route(**kwargs)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'RouteAlreadyExists':
+            raise
+        ec2.replace_route(**kwargs)
+
+
+def spoke_routes(spokes, extra=()):
+    """[(route_table_id, destino)]: cada VPC hacia las demás del hub y hacia `extra`."""
+    rutas = []
+    for spoke in spokes:
+        destinos = [s.cidr for s in spokes if s.name != spoke.name] + [c for c in extra if c != spoke.cidr]
+        rutas += [(rt, destino) for rt in spoke.route_tables for destino in dict.fromkeys(destinos)]
+    return rutas
+
+
+def add_routes(ec2, tgw_id, rutas):
+    """Crea todas las rutas [(route_table_id, destino)] hacia el TGW a la vez."""
+    _parallel(_route, [(ec2, rt, destino, tgw_id) for rt, destino in rutas])
+    return len(rutas)
+
+
+def build_hub(ec2, spokes, tgw_id=None, name='Multi-Region-TGW', extra_routes=(), checkpoint=_sin_estado):
+    """TGW con todas las VPCs de `spokes` conectadas. Devuelve {'tgw_id', 'attachments'}.
+
+    tgw_id: un TGW ya creado (si no, se crea). extra_routes: destinos que
+    se alcanzan por el TGW además de las otras VPCs (p. ej. los de otros hubs
+    con peering). checkpoint(paso, entradas, func) ejecuta cada paso y
+    devuelve sus salidas: permite guardarlos y reutilizarlos al retomar. Los
+    pasos son tgw, tgw_ready, tgw_attachments, tgw_attachments_ready y
+    tgw_routes.
+    """
+    rutas_tgw = spoke_routes(spokes, extra_routes)
+    pasos = [('tgw', "Creando Transit Gateway")] if tgw_id is None else []
+    pasos += [('tgw_ready', "Esperando disponibilidad del TGW")]
+    if spokes:
+        pasos += [('tgw_attachments', f"Creando {len(spokes)} VPC attachment{'s' if len(spokes) > 1 else ''}"),
+                  ('tgw_attachments_ready', "Esperando disponibilidad de los attachments")]
+    if spokes and rutas_tgw:
+        pasos += [('tgw_routes', "Rutas hacia el TGW en las route tables")]
+    orden, etiquetas = [p for p, _ in pasos], dict(pasos)
+
+    def paso(nombre, entradas, func):
+        print(f"\n[{orden.index(nombre) + 1}/{len(orden)}] {etiquetas[nombre]}")
+        return checkpoint(nombre, entradas, func)
+
+    def crear():
+        nuevo = create_tgw(ec2, name)
+        print(f"   ✓ TGW creado: {nuevo}")
+        return {'tgw_id': nuevo}
+
+    def esperar(nombre, ids, timeout):
+        def run():
+            que = ', '.join(ids) if len(ids) <= 3 else f"{len(ids)} attachments"
+            print(f"   ⏳ Esperando {que}...")
+            waiters.wait_for(ec2, nombre, ids, timeout=timeout)
+            print(f"   ✓ {que} disponible{'s' if len(ids) > 1 else ''}")
+            return {}
+        return run
+
+    def conectar():
+        attachments = attach(ec2, tgw_id, spokes)
+        for nombre, att_id in attachments.items():
+            print(f"   ✓ Attachment de {nombre}: {att_id}")
+        # Lista de IDs (en el orden de spokes) para que el estado los reconozca
+        return {'attachment_ids': [attachments[s.name] for s in spokes]}
+
+    def rutas():
+        print(f"   ✓ {add_routes(ec2, tgw_id, rutas_tgw)} rutas hacia el TGW")
+        return {}
+
+    if tgw_id is None:
+        tgw_id = paso('tgw', {}, crear)['tgw_id']
+    paso('tgw_ready', {'tgw_id': tgw_id}, esperar('transit_gateway_available', [tgw_id], 900))
+    if not spokes:
+        return {'tgw_id': tgw_id, 'attachments': {}}
+    entradas = {'tgw_id': tgw_id, 'vpcs': {s.name: [s.vpc_id] + list(s.subnet_ids) for s in spokes}}
+    ids = paso('tgw_attachments', entradas, conectar)['attachment_ids']
+    attachments = dict(zip((s.name for s in spokes), ids))
+    paso('tgw_attachments_ready', {'attachment_ids': sorted(ids)},
+         esperar('transit_gateway_attachment_available', ids, 600))
+    if rutas_tgw:
+        paso('tgw_routes', {'tgw_id': tgw_id, 'routes': [list(r) for r in rutas_tgw]}, rutas)
+    return {'tgw_id': tgw_id, 'attachments': attachments}
+
+
+# Peering entre hubs de regiones distintas -----------------------------------
+
+def _ec2(hub):
+    return clients.client('ec2', hub.region, hub.profile)
+
+
+def default_route_table(ec2, tgw_id):
+    tgw = ec2.describe_transit_gateways(TransitGatewayIds=[tgw_id])['TransitGateways'][0]
+    return tgw['Options']['AssociationDefaultRouteTableId']
+
+
+def _static_route(ec2, route_table_id, destino, attachment_id):
+    kwargs = {'TransitGatewayRouteTableId': route_table_id, 'DestinationCidrBlock': destino,
+              'TransitGatewayAttachmentId': attachment_id}
+    try:
+        ec2.create_transit_gateway_route(**kwargs)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'RouteAlreadyExists':
+            raise
+        ec2.replace_transit_gateway_route(**kwargs)
+
+
+def _peer_pair(hub, peer, account_id, checkpoint):
+    ec2, ec2_peer = _ec2(hub), _ec2(peer)
+
+    def solicitar():
+        att = ec2.create_transit_gateway_peering_attachment(
+            TransitGatewayId=hub.tgw_id, PeerTransitGatewayId=peer.tgw_id,
+            PeerAccountId=account_id, PeerRegion=peer.region,
+            TagSpecifications=_tags('transit-gateway-attachment', f"{hub.name}-{peer.name}-TGW-Peering"))
+        att_id = att['TransitGatewayPeeringAttachment']['TransitGatewayAttachmentId']
+        print(f"   ✓ {hub.name} ↔ {peer.name}: solicitud {att_id}")
+        return {'attachment_id': att_id}
+
+    def aceptar():
+        waiters.wait_for(ec2_peer, 'transit_gateway_peering_pending_acceptance', [att_id], timeout=300, delay=1)
+        estado = waiters.WAITERS['transit_gateway_peering_pending_acceptance'].states(ec2_peer, [att_id])
+        if estado.get(att_id) != 'available':
+            ec2_peer.accept_transit_gateway_peering_attachment(TransitGatewayAttachmentId=att_id)
+        waiters.wait_for(ec2, 'transit_gateway_peering_available', [att_id], timeout=600)
+        print(f"   ✓ {hub.name} ↔ {peer.name}: aceptado en {peer.name}")
+        return {}
+
+    def rutas():
+        # Los attachments de peering no propagan rutas: estáticas en los dos lados
+        llamadas = [(ec2, default_route_table(ec2, hub.tgw_id), destino) for destino in peer.cidrs]
+        llamadas += [(ec2_peer, default_route_table(ec2_peer, peer.tgw_id), destino) for destino in hub.cidrs]
+        _parallel(_static_route, [(c, rt, destino, att_id) for c, rt, destino in llamadas])
+        print(f"   ✓ {hub.name} ↔ {peer.name}: {len(llamadas)} rutas estáticas")
+        return {}
+
+    # La salida de cada par se imprime en bloque al terminar
+    with salida.capturar():
+        att_id = checkpoint(hub, peer, 'tgw_peering', {'tgw_id': hub.tgw_id, 'peer_tgw_id': peer.tgw_id},
+                            solicitar)['attachment_id']
+        checkpoint(hub, peer, 'tgw_peering_accept', {'attachment_id': att_id}, aceptar)
+        checkpoint(hub, peer, 'tgw_peering_routes',
+                   {'attachment_id': att_id, 'cidrs': sorted(hub.cidrs), 'peer_cidrs': sorted(peer.cidrs)}, rutas)
+    return att_id
+
+
+def peer_hubs(hubs, pairs=None, checkpoint=None):
+    """TGW peering entre hubs de regiones distintas (por defecto todos con todos), a la vez.
+
+    checkpoint(hub, peer, paso, entradas, func), como en build_hub() pero con
+    el par. Devuelve {(a, b): attachment_id}.
+    """
+    checkpoint = checkpoint or (lambda hub, peer, paso, entradas, func: func())
+    por_nombre = {h.name: h for h in hubs}
+    pares = [tuple(p) for p in (pairs if pairs is not None else itertools.combinations(por_nombre, 2))]
+    if not pares:
+        return {}
+    cuenta = clients.client('sts', hubs[0].region, hubs[0].profile).get_caller_identity()['Account']
+    with salida.por_contexto():
+        ids = _parallel(_peer_pair, [(por_nombre[a], por_nombre[b], cuenta, checkpoint) for a, b in pares])
+    return dict(zip(pares, ids))
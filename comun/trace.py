@@ -0,0 +1,317 @@
+"""
+Instrumentación opcional de las llamadas a AWS.
+
+Con enable() se registran manejadores en los eventos de botocore de todos los
+clientes de comun.clients (los ya creados y los que se creen después). Por
+cada llamada se guarda operación, región, latencia, código HTTP, reintentos,
+errores de throttling y el paso en curso (step()). Al terminar:
+
+    report()          resumen por operación y por paso, el log de pasos con
+                      los IDs que consume y produce cada uno, y el camino
+                      crítico de cada grafo de pasos ejecutado (dict)
+    write(prefijo)    prefijo.json con el informe y prefijo.trace.json con la
+                      línea de tiempo en formato Chrome trace (chrome://tracing,
+                      ui.perfetto.dev)
+
+Desactivada (lo normal) no hay ningún manejador registrado: las llamadas a
+AWS no pasan por aquí, y step() devuelve un contexto vacío.
+
+Ejemplo:
+    trace.enable()
+    with trace.step('us-west-2/nat'):
+        ec2.create_nat_gateway(...)
+    trace.write('traza')
+"""
+
+import contextlib
+import contextvars
+import json
+import threading
+import time
+
+from comun import clients, scheduler
+from comun.inventory import resource_type
+
+# Códigos de error de AWS que indican limitación de ritmo
+THROTTLE_CODES = {
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottled',
+    'RequestThrottledException', 'RequestLimitExceeded', 'TooManyRequestsException',
+    'ProvisionedThroughputExceededException', 'EC2ThrottledException', 'SlowDown',
+    'PriorRequestNotComplete', 'BandwidthLimitExceeded', 'LimitExceededException',
+}
+
+_paso = contextvars.ContextVar('trace_paso', default=None)
+_registro = contextvars.ContextVar('trace_registro', default=None)
+_recorder = None
+
+
+class Recorder:
+    """Acumula llamadas y pasos de forma segura entre hilos."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.origin = clock()
+        self.calls = []
+        self.steps = []
+        self.runs = []
+        self._lock = threading.Lock()
+
+    # Manejadores de eventos de botocore -------------------------------------
+
+    def before_call(self, model, context, **kwargs):
+        hilo = threading.current_thread().name
+        # Fuera de un paso (p. ej. el poller compartido) se atribuye al hilo
+        context['_traza'] = {'start': self.clock(), 'step': _paso.get() or f"({hilo})",
+                             'thread': hilo, 'throttles': 0}
+
+    def needs_retry(self, response, request_dict, **kwargs):
+        traza = request_dict.get('context', {}).get('_traza')
+        if traza is not None and response is not None:
+            if _error_code(response[1]) in THROTTLE_CODES:
+                traza['throttles'] += 1
+
+    def after_call(self, http_response, parsed, model, context, **kwargs):
+        traza = context.get('_traza')
+        if traza is None:
+            return
+        fin = self.clock()
+        llamada = {
+            'operation': model.name,
+            'service': model.service_model.service_name,
+            'region': context.get('client_region'),
+            'step': traza['step'],
+            'thread': traza['thread'],
+            'start': traza['start'] - self.origin,
+            'duration': fin - traza['start'],
+            'status': getattr(http_response, 'status_code', None),
+            'retries': parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0),
+            'throttles': traza['throttles'],
+            'error': _error_code(parsed),
+        }
+        with self._lock:
+            self.calls.append(llamada)
+
+    def attach(self, client):
+        eventos = client.meta.events
+        region = client.meta.region_name
+
+        def before(context, **kwargs):
+            context['client_region'] = region
+            self.before_call(context=context, **kwargs)
+
+        eventos.register('before-call', before, unique_id='comun.trace.before')
+        eventos.register('needs-retry', self.needs_retry, unique_id='comun.trace.retry')
+        eventos.register('after-call', self.after_call, unique_id='comun.trace.after')
+
+    def detach(self, client):
+        eventos = client.meta.events
+        eventos.unregister('before-call', unique_id='comun.trace.before')
+        eventos.unregister('needs-retry', unique_id='comun.trace.retry')
+        eventos.unregister('after-call', unique_id='comun.trace.after')
+
+    # Pasos ------------------------------------------------------------------
+
+    @contextlib.contextmanager
+    def step(self, nombre, inputs=None):
+        """Mide el paso. Lo que el llamador deje en paso['outputs'] cuenta como producido."""
+        paso = {'outputs': None, 'ready': []}
+        token, token_registro = _paso.set(nombre), _registro.set(paso)
+        inicio = self.clock()
+        try:
+            yield paso
+        finally:
+            fin = self.clock()
+            _paso.reset(token)
+            _registro.reset(token_registro)
+            with self._lock:
+                self.steps.append({'step': nombre, 'thread': threading.current_thread().name,
+                                   'start': inicio - self.origin, 'duration': fin - inicio,
+                                   'consumes': _ids_en(inputs), 'produces': _ids_en(paso['outputs']),
+                                   'ready': list(dict.fromkeys(paso['ready']))})
+
+    def record_run(self, nombre, steps, tiempos):
+        """Observador de comun.scheduler: guarda el grafo, los tiempos y su camino crítico."""
+        segundos, camino = scheduler.critical_path(steps, tiempos)
+        deps = scheduler.dependencies(steps)
+        with self._lock:
+            self.runs.append({
+                'name': nombre,
+                'critical_seconds': round(segundos, 3),
+                'critical_path': camino,
+                'steps': {n: {'after': sorted(deps[n]),
+                              'start': round(inicio - self.origin, 4),
+                              'end': round(fin - self.origin, 4) if fin is not None else None}
+                          for n, (inicio, fin) in tiempos.items()},
+            })
+
+    # Informes ---------------------------------------------------------------
+
+    def report(self):
+        with self._lock:
+            llamadas, pasos, runs = list(self.calls), list(self.steps), list(self.runs)
+        por_operacion = {}
+        for llamada in llamadas:
+            clave = f"{llamada['service']}.{llamada['operation']}"
+            por_operacion.setdefault(clave, []).append(llamada)
+        por_paso = {}
+        for llamada in llamadas:
+            por_paso.setdefault(llamada['step'], []).append(llamada)
+
+        return {
+            'wall_seconds': round(self.clock() - self.origin, 3),
+            'calls': len(llamadas),
+            'retries': sum(c['retries'] for c in llamadas),
+            'throttles': sum(c['throttles'] for c in llamadas),
+            'errors': sum(1 for c in llamadas if c['error']),
+            'by_operation': {op: _resumen(cs) for op, cs in sorted(por_operacion.items())},
+            'by_step': {
+                nombre: dict(_resumen(por_paso.get(nombre, [])), **_tiempo_paso(pasos, nombre))
+                for nombre in sorted(set(por_paso) | {p['step'] for p in pasos})
+            },
+            'runs': runs,
+            'step_log': sorted(pasos, key=lambda p: p['start']),
+            'call_log': llamadas,
+        }
+
+    def chrome_trace(self):
+        """Eventos en formato Chrome trace: un proceso por región, un hilo por hilo de Python."""
+        with self._lock:
+            llamadas, pasos = list(self.calls), list(self.steps)
+        procesos, hilos, eventos = {}, {}, []
+
+        def pid(region):
+            if region not in procesos:
+                procesos[region] = len(procesos) + 1
+                eventos.append({'ph': 'M', 'name': 'process_name', 'pid': procesos[region],
+                                'args': {'name': region or 'global'}})
+            return procesos[region]
+
+        def tid(nombre):
+            return hilos.setdefault(nombre, len(hilos) + 1)
+
+        for paso in pasos:
+            eventos.append({'name': paso['step'], 'cat': 'step', 'ph': 'X', 'pid': pid(_region_de(paso['step'])),
+                            'tid': tid(paso['thread']), 'ts': paso['start'] * 1e6, 'dur': paso['duration'] * 1e6})
+        for c in llamadas:
+            eventos.append({'name': c['operation'], 'cat': 'api', 'ph': 'X', 'pid': pid(c['region']),
+                            'tid': tid(c['thread']), 'ts': c['start'] * 1e6, 'dur': c['duration'] * 1e6,
+                            'args': {k: c[k] for k in ('status', 'retries', 'throttles', 'error', 'step')}})
+        for nombre, numero in hilos.items():
+            for proceso in procesos.values():
+                eventos.append({'ph': 'M', 'name': 'thread_name', 'pid': proceso, 'tid': numero,
+                                'args': {'name': nombre}})
+        return {'traceEvents': eventos, 'displayTimeUnit': 'ms'}
+
+
+def _error_code(parsed):
+    return (parsed or {}).get('Error', {}).get('Code')
+
+
+def _ids_en(valores):
+    """IDs de AWS en las entradas o salidas de un paso ({nombre: id o [ids]})."""
+    encontrados = []
+    for valor in (valores or {}).values():
+        for v in valor if isinstance(valor, list) else [valor]:
+            if isinstance(v, str) and resource_type(v) and v not in encontrados:
+                encontrados.append(v)
+    return encontrados
+
+
+def _region_de(paso):
+    # Los pasos se nombran 'región/paso'
+    return paso.split('/', 1)[0] if '/' in paso else None
+
+
+def _resumen(llamadas):
+    latencias = sorted(c['duration'] for c in llamadas)
+
+    def percentil(p):
+        return round(latencias[min(len(latencias) - 1, int(p * len(latencias)))] * 1000, 1) if latencias else 0
+
+    return {
+        'calls': len(llamadas),
+        'api_ms': round(sum(latencias) * 1000, 1),
+        'p50_ms': percentil(0.5),
+        'p95_ms': percentil(0.95),
+        'max_ms': round(latencias[-1] * 1000, 1) if latencias else 0,
+        'retries': sum(c['retries'] for c in llamadas),
+        'throttles': sum(c['throttles'] for c in llamadas),
+        'errors': sum(1 for c in llamadas if c['error']),
+    }
+
+
+def _tiempo_paso(pasos, nombre):
+    propios = [p for p in pasos if p['step'] == nombre]
+    if not propios:
+        return {}
+    return {'wall_ms': round(sum(p['duration'] for p in propios) * 1000, 1)}
+
+
+# API del módulo -------------------------------------------------------------
+
+def enable():
+    """Activa la instrumentación en todos los clientes de comun.clients."""
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder()
+        clients.on_create(_recorder.attach)
+        scheduler.observers.append(_recorder.record_run)
+    return _recorder
+
+
+def disable():
+    """Quita la instrumentación de todos los clientes y olvida lo medido."""
+    global _recorder
+    if _recorder is not None:
+        clients.off_create(_recorder.attach, _recorder.detach)
+        scheduler.observers.remove(_recorder.record_run)
+        _recorder = None
+
+
+def enabled():
+    return _recorder is not None
+
+
+def step(nombre, inputs=None):
+    """Contexto que atribuye a `nombre` las llamadas hechas dentro (y mide su duración).
+
+    inputs/paso['outputs'] ({nombre: id o [ids]}) registran qué recursos
+    consume y produce el paso, para comun.critical.
+    """
+    if _recorder is None:
+        return contextlib.nullcontext({'outputs': None})
+    return _recorder.step(nombre, inputs)
+
+
+def ready(ids):
+    """Anota que el paso en curso ha esperado a que `ids` estén listos (ver comun.critical)."""
+    paso = _registro.get()
+    if paso is not None:
+        paso['ready'].extend(ids)
+
+
+def report():
+    return _recorder.report() if _recorder is not None else None
+
+
+def write(prefijo):
+    """Escribe prefijo.json (informe) y prefijo.trace.json (Chrome trace). Devuelve las rutas."""
+    informe, linea = f"{prefijo}.json", f"{prefijo}.trace.json"
+    with open(informe, 'w', encoding='utf-8') as f:
+        json.dump(_recorder.report(), f, indent=2)
+    with open(linea, 'w', encoding='utf-8') as f:
+        json.dump(_recorder.chrome_trace(), f)
+    return informe, linea
+
+
+def print_summary(top=10):
+    """Resumen legible: operaciones más costosas y tiempo de API por paso."""
+    datos = report()
+    print(f"\n📊 {datos['calls']} llamadas a AWS, {datos['retries']} reintentos, "
+          f"{datos['throttles']} throttles, {datos['errors']} errores en {datos['wall_seconds']}s")
+    operaciones = sorted(datos['by_operation'].items(), key=lambda kv: -kv[1]['api_ms'])[:top]
+    for op, r in operaciones:
+        print(f"   {op:<45} {r['calls']:>4} llamadas  {r['api_ms']:>9.1f} ms  p95 {r['p95_ms']:>7.1f} ms")
+    pasos = sorted(datos['by_step'].items(), key=lambda kv: -kv[1].get('wall_ms', 0))[:top]
+    for nombre, r in pasos:
+        print(f"   paso {nombre:<40} {r.get('wall_ms', 0):>9.1f} ms  ({r['calls']} llamadas, {r['api_ms']:.1f} ms de API)")
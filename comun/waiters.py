@@ -0,0 +1,220 @@
+"""
+Esperas adaptativas con plazo máximo.
+
+Sustituye los bucles `for _ in range(60): ... time.sleep(10)` y los
+`time.sleep(5)` a ciegas. `poll()` consulta con backoff exponencial y jitter,
+acorta el intervalo cuando el recurso está cerca de estar listo (estado
+"casi listo" o tiempo típico de aprovisionamiento alcanzado) y lanza
+WaitTimeout si se supera el plazo en lugar de seguir en silencio.
+
+`wait_for(client, nombre, ids)` conoce los recursos EC2 que usan los scripts
+y registra los IDs en el poller compartido (comun/poller.py), que agrupa en
+una sola llamada describe todos los IDs pendientes del mismo tipo y región,
+vengan del hilo que vengan. Si el nombre no está en WAITERS se recurre al
+waiter de botocore del mismo nombre.
+
+Ejemplo:
+    wait_for(ec2, 'transit_gateway_available', [tgw_id], timeout=900)
+"""
+
+import random
+import time
+
+from botocore.exceptions import ClientError, WaiterError
+
+from comun import trace
+
+
+class WaitTimeout(Exception):
+    """El recurso no llegó al estado esperado antes del plazo."""
+
+
+class WaitFailed(Exception):
+    """El recurso llegó a un estado del que ya no saldrá (failed, deleted...)."""
+
+
+def poll(check, timeout=600, delay=2, max_delay=30, factor=1.5, jitter=0.2,
+         expected=None, sleep=time.sleep, clock=time.monotonic):
+    """Llama a check() hasta que devuelva terminado o venza el plazo.
+
+    check() devuelve (terminado, cerca). Si `cerca` es True el intervalo vuelve
+    a `delay`. `expected` (segundos) es el tiempo típico hasta estar listo: antes
+    de alcanzarlo nunca dormimos más de la mitad de lo que falta, y al
+    alcanzarlo el intervalo también vuelve a `delay`.
+    Devuelve los segundos esperados.
+    """
+    inicio = clock()
+    limite = inicio + timeout
+    intervalo = delay
+    esperado_alcanzado = expected is None
+    while True:
+        terminado, cerca = check()
+        if terminado:
+            return clock() - inicio
+        ahora = clock()
+        restante = limite - ahora
+        if restante <= 0:
+            raise WaitTimeout(f"Plazo de {timeout}s agotado")
+        if not esperado_alcanzado and ahora - inicio >= expected:
+            esperado_alcanzado, cerca = True, True
+        if cerca:
+            intervalo = delay
+        espera = intervalo
+        if not esperado_alcanzado:
+            espera = min(espera, max(delay, (inicio + expected - ahora) / 2))
+        espera *= random.uniform(1 - jitter, 1 + jitter)
+        sleep(max(0, min(espera, restante)))
+        intervalo = min(intervalo * factor, max_delay)
+
+
+def _instances(resp):
+    return {i['InstanceId']: i['State']['Name'] for r in resp['Reservations'] for i in r['Instances']}
+
+
+def _items(list_key, id_key, state_key='State'):
+    def extract(resp):
+        return {item[id_key]: item[state_key] for item in resp[list_key]}
+    return extract
+
+
+def _peerings(resp):
+    return {p['VpcPeeringConnectionId']: p['Status']['Code'] for p in resp['VpcPeeringConnections']}
+
+
+class ResourceWaiter:
+    """Cómo esperar a un tipo de recurso: llamada describe y estados."""
+
+    def __init__(self, operation, id_param, extract, success, failure=(), near=(),
+                 expected=None, not_found=(), filter_name=None):
+        self.operation = operation
+        self.id_param = id_param
+        self.filter_name = filter_name
+        self.extract = extract
+        self.success = set(success)
+        self.failure = set(failure)
+        # Solo estados que preceden justo al objetivo: uno que dura toda la
+        # transición (deleting, shutting-down) anularía el backoff
+        self.near = set(near)
+        self.expected = expected
+        self.not_found = set(not_found)
+
+    def states(self, client, ids):
+        """Devuelve {id: estado} con una sola llamada describe (None = no visible).
+
+        Con filter_name se filtra por ID en vez de pasar la lista de IDs, así
+        un ID que aún no existe no hace fallar la consulta de los demás. Sin
+        filtro, si la describe del lote responde NotFound se consulta cada ID
+        por separado: un solo ID ya purgado no marca a los demás como no visibles.
+        """
+        ids = list(ids)
+        if self.filter_name:
+            kwargs = {'Filters': [{'Name': self.filter_name, 'Values': ids}]}
+        else:
+            kwargs = {self.id_param: ids}
+        try:
+            resp = getattr(client, self.operation)(**kwargs)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in self.not_found:
+                raise
+            if len(ids) == 1:
+                return {ids[0]: None}
+            return {i: estado for id_ in ids for i, estado in self.states(client, [id_]).items()}
+        estados = self.extract(resp)
+        return {i: estados.get(i) for i in ids}
+
+
+WAITERS = {
+    'nat_gateway_available': ResourceWaiter(
+        'describe_nat_gateways', 'NatGatewayIds', _items('NatGateways', 'NatGatewayId'),
+        success=['available'], failure=['failed', 'deleting', 'deleted'], expected=90,
+        not_found=['NatGatewayNotFound']),
+    # Un NAT ya purgado de la describe también cuenta como borrado
+    'nat_gateway_deleted': ResourceWaiter(
+        'describe_nat_gateways', 'NatGatewayIds', _items('NatGateways', 'NatGatewayId'),
+        success=['deleted', None], expected=60, not_found=['NatGatewayNotFound']),
+    'instance_running': ResourceWaiter(
+        'describe_instances', 'InstanceIds', _instances,
+        success=['running'], failure=['shutting-down', 'terminated', 'stopping', 'stopped'],
+        expected=20, filter_name='instance-id'),
+    'instance_terminated': ResourceWaiter(
+        'describe_instances', 'InstanceIds', _instances,
+        success=['terminated'], expected=30, filter_name='instance-id'),
+    'transit_gateway_available': ResourceWaiter(
+        'describe_transit_gateways', 'TransitGatewayIds', _items('TransitGateways', 'TransitGatewayId'),
+        success=['available'], failure=['deleting', 'deleted'], near=['modifying'], expected=90,
+        not_found=['InvalidTransitGatewayID.NotFound']),
+    'transit_gateway_attachment_available': ResourceWaiter(
+        'describe_transit_gateway_vpc_attachments', 'TransitGatewayAttachmentIds',
+        _items('TransitGatewayVpcAttachments', 'TransitGatewayAttachmentId'),
+        success=['available'], failure=['failed', 'rejected', 'deleting', 'deleted'],
+        near=['modifying'], expected=60, not_found=['InvalidTransitGatewayAttachmentID.NotFound']),
+    'transit_gateway_peering_pending_acceptance': ResourceWaiter(
+        'describe_transit_gateway_peering_attachments', 'TransitGatewayAttachmentIds',
+        _items('TransitGatewayPeeringAttachments', 'TransitGatewayAttachmentId'),
+        success=['pendingAcceptance', 'available'], failure=['failed', 'rejected', 'deleting', 'deleted'],
+        near=['initiatingRequest', 'pending'], expected=5),
+    'transit_gateway_peering_available': ResourceWaiter(
+        'describe_transit_gateway_peering_attachments', 'TransitGatewayAttachmentIds',
+        _items('TransitGatewayPeeringAttachments', 'TransitGatewayAttachmentId'),
+        success=['available'], failure=['failed', 'rejected', 'deleting', 'deleted'],
+        near=['modifying'], expected=60),
+    # Un TGW o attachment borrado puede dejar de aparecer en la describe
+    # antes de verse 'deleted': no visible (None) también cuenta como borrado
+    'transit_gateway_deleted': ResourceWaiter(
+        'describe_transit_gateways', 'TransitGatewayIds', _items('TransitGateways', 'TransitGatewayId'),
+        success=['deleted', None], expected=120,
+        not_found=['InvalidTransitGatewayID.NotFound']),
+    'transit_gateway_attachment_deleted': ResourceWaiter(
+        'describe_transit_gateway_vpc_attachments', 'TransitGatewayAttachmentIds',
+        _items('TransitGatewayVpcAttachments', 'TransitGatewayAttachmentId'),
+        success=['deleted', None], expected=60,
+        not_found=['InvalidTransitGatewayAttachmentID.NotFound']),
+    'transit_gateway_peering_deleted': ResourceWaiter(
+        'describe_transit_gateway_peering_attachments', 'TransitGatewayAttachmentIds',
+        _items('TransitGatewayPeeringAttachments', 'TransitGatewayAttachmentId'),
+        success=['deleted', None], expected=60,
+        not_found=['InvalidTransitGatewayAttachmentID.NotFound']),
+    'vpc_peering_connection_pending_acceptance': ResourceWaiter(
+        'describe_vpc_peering_connections', 'VpcPeeringConnectionIds', _peerings,
+        success=['pending-acceptance', 'active'], failure=['failed', 'rejected', 'expired', 'deleted'],
+        near=['initiating-request'], expected=3, not_found=['InvalidVpcPeeringConnectionID.NotFound']),
+}
+
+
+def wait_for(client, name, ids, timeout=600, delay=2, max_delay=30, on_progress=None):
+    """Espera a que todos los ids lleguen al estado `name`.
+
+    Las consultas las hace el poller compartido: cuantos más recursos se
+    esperan a la vez, más IDs van en cada describe, no más llamadas.
+    Lanza WaitFailed si alguno llega a un estado terminal distinto del
+    esperado y WaitTimeout si vence el plazo.
+    on_progress(estados) se llama tras cada consulta.
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    if name not in WAITERS:
+        segundos = wait_botocore(client, name, ids, timeout, delay)
+    else:
+        from comun.poller import default_poller
+        segundos = default_poller().wait(client, name, ids, timeout=timeout, delay=delay,
+                                         max_delay=max_delay, on_progress=on_progress)
+    trace.ready(ids)
+    return segundos
+
+
+def wait_botocore(client, name, ids, timeout=600, delay=5, id_param=None):
+    """Usa el waiter de botocore `name` con un plazo total equivalente.
+
+    id_param se deduce de la operación (DescribeVolumes -> VolumeIds) si no se da.
+    """
+    waiter = client.get_waiter(name)
+    param = id_param or waiter.config.operation.replace('Describe', '', 1)[:-1] + 'Ids'
+    inicio = time.monotonic()
+    try:
+        waiter.wait(**{param: ids}, WaiterConfig={'Delay': delay, 'MaxAttempts': max(1, int(timeout // delay))})
+    except WaiterError as e:
+        if 'Max attempts exceeded' in str(e):
+            raise WaitTimeout(f"{name}: {ids} no listos tras {timeout}s") from e
+        raise WaitFailed(f"{name}: {e}") from e
+    return time.monotonic() - inicio
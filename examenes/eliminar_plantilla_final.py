@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+ELIMINAR LA INFRAESTRUCTURA DE plantilla_final.py
+=================================================
+
+Borra lo que despliega plantilla_final.py en todas las regiones de la
+topología (por defecto Oregon en us-west-2 y Virginia en us-east-1):
+- Instancias EC2, NAT Gateways y sus Elastic IPs
+- Route Tables, Network ACLs, Security Groups, Subnets, IGWs y VPCs
+- VPC Peering entre regiones
+- Transit Gateways, sus attachments y el TGW peering entre hubs
+
+Los recursos se reconocen por su tag Name: `VPC-<región>`, `<región>-*`
+(Oregon-NAT, Virginia-Public-RT, Oregon-Virginia-Peering...) y los TGW
+`Multi-Region-TGW`, más los attachments de esos TGW y VPCs. Cada región se
+escanea una sola vez (comun/inventory.py) y todas a la vez.
+
+El borrado es un único grafo para todas las regiones (comun/teardown.py):
+los NAT Gateways y los attachments del TGW se borran a la vez, las esperas
+a `nat_gateway_deleted` las agrupa el poller compartido en una describe por
+región y vuelta, y cada EIP, subnet o VPC se libera en cuanto no queda nada
+que dependa de ella. La limpieza completa tarda lo que el NAT más lento, no
+la suma de todos.
+
+ADVERTENCIA: borra TODO lo que tenga esos nombres en esas regiones.
+
+Uso: py eliminar_plantilla_final.py [--topologia fichero.json] [--perfil PERFIL] [--si]
+"""
+
+import argparse
+import contextvars
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comun import clients, ratelimit, waiters
+from comun.inventory import Inventory
+from comun.rollback import LABELS
+from comun.teardown import Teardown, ignore_missing
+from plantilla_final import TOPOLOGIA, load_topology
+
+# Nombre con el que plantilla_final etiqueta sus Transit Gateways
+TGW_NAME = 'Multi-Region-TGW'
+
+# Borrados simultáneos como máximo (entre todas las regiones)
+WORKERS = 16
+
+TIPOS = ['instance', 'nat_gateway', 'address', 'route_table', 'network_acl', 'security_group',
+         'internet_gateway', 'subnet', 'vpc', 'vpc_peering_connection', 'transit_gateway',
+         'transit_gateway_attachment', 'transit_gateway_peering']
+
+# Estados de recursos que ya no hay que borrar
+GONE = ('deleted', 'terminated', 'failed', 'rejected')
+
+# ============================================================================
+# DESCUBRIMIENTO
+# ============================================================================
+
+def regions(topologia, profile=None):
+    """{región de AWS: (perfil, [nombres de la topología en esa región])}."""
+    regiones = {}
+    for entrada in topologia['regions']:
+        perfil = entrada.get('profile') or profile
+        regiones.setdefault(entrada['region'], (perfil, []))[1].append(entrada['name'])
+    return regiones
+
+
+def belongs(recurso, nombres):
+    """True si el Name del recurso es de alguna de las regiones `nombres` o del TGW."""
+    nombre = recurso.name or recurso.attrs.get('group_name') or ''
+    return nombre == TGW_NAME or any(nombre == f"VPC-{n}" or nombre.startswith(f"{n}-") for n in nombres)
+
+
+def discover(regiones):
+    """Escanea todas las regiones a la vez. Devuelve {región: (ec2, inventario, recursos)}."""
+    def escanear(region, perfil, nombres):
+        ec2 = clients.client('ec2', region, perfil)
+        inv = Inventory(ec2).scan(types=TIPOS)
+        vivos = [r for r in inv.by_id.values() if r.state not in GONE]
+        recursos = [r for r in vivos if belongs(r, nombres)]
+        # Los attachments de un TGW o una VPC de la plantilla también, aunque
+        # no lleven tag (no siempre lo conservan)
+        ids = {r.id for r in recursos}
+        recursos += [r for r in vivos if r.id not in ids and r.type.startswith('transit_gateway_')
+                     and ids & set(r.uses)]
+        return ec2, inv, sorted(recursos, key=lambda r: (TIPOS.index(r.type), r.id))
+
+    with ThreadPoolExecutor(max_workers=len(regiones)) as pool:
+        futuros = {region: pool.submit(contextvars.copy_context().run, escanear, region, perfil, nombres)
+                   for region, (perfil, nombres) in regiones.items()}
+        return {region: futuro.result() for region, futuro in futuros.items()}
+
+# ============================================================================
+# BORRADO
+# ============================================================================
+
+def terminate_instances(ec2, instance_ids):
+    """Termina las instancias con una llamada y espera a que terminen."""
+    ec2.terminate_instances(InstanceIds=instance_ids)
+    waiters.wait_for(ec2, 'instance_terminated', instance_ids, timeout=600)
+
+
+def delete_nat_gateway(ec2, nat_id):
+    """Borra el NAT y espera a 'deleted' (hasta entonces su EIP sigue asociada)."""
+    ec2.delete_nat_gateway(NatGatewayId=nat_id)
+    waiters.wait_for(ec2, 'nat_gateway_deleted', [nat_id], timeout=600)
+
+
+def delete_route_table(ec2, rt):
+    for assoc_id in rt.attrs['associations']:
+        ignore_missing(ec2.disassociate_route_table, AssociationId=assoc_id)
+    ec2.delete_route_table(RouteTableId=rt.id)
+
+
+def delete_network_acl(ec2, acl, default_id):
+    """Devuelve sus subnets a la NACL por defecto de la VPC y la borra."""
+    for assoc_id in acl.attrs['associations']:
+        ignore_missing(ec2.replace_network_acl_association, AssociationId=assoc_id, NetworkAclId=default_id)
+    ec2.delete_network_acl(NetworkAclId=acl.id)
+
+
+def delete_internet_gateway(ec2, igw):
+    """Desadjunta y borra el IGW. Al repetir una limpieza a medias ya puede estar desadjuntado."""
+    for vpc_id in igw.attrs['vpcs']:
+        ignore_missing(ec2.detach_internet_gateway, 'Gateway.NotAttached', InternetGatewayId=igw.id, VpcId=vpc_id)
+    ec2.delete_internet_gateway(InternetGatewayId=igw.id)
+
+
+def delete_tgw_attachment(ec2, attachment_id, peering=False):
+    if peering:
+        ec2.delete_transit_gateway_peering_attachment(TransitGatewayAttachmentId=attachment_id)
+        waiters.wait_for(ec2, 'transit_gateway_peering_deleted', [attachment_id], timeout=900)
+    else:
+        ec2.delete_transit_gateway_vpc_attachment(TransitGatewayAttachmentId=attachment_id)
+        waiters.wait_for(ec2, 'transit_gateway_attachment_deleted', [attachment_id], timeout=900)
+
+
+def delete_transit_gateway(ec2, tgw_id):
+    ec2.delete_transit_gateway(TransitGatewayId=tgw_id)
+    waiters.wait_for(ec2, 'transit_gateway_deleted', [tgw_id], timeout=900)
+
+
+def _delete(ec2, inv, recurso):
+    """Función de borrado de un recurso (sin las instancias, que van en grupo)."""
+    tipo, rid = recurso.type, recurso.id
+    if tipo == 'nat_gateway':
+        return lambda: delete_nat_gateway(ec2, rid)
+    if tipo == 'address':
+        return lambda: ec2.release_address(AllocationId=rid)
+    if tipo == 'route_table':
+        return lambda: delete_route_table(ec2, recurso)
+    if tipo == 'network_acl':
+        defecto = next(a.id for a in inv.find('network_acl', vpc_id=recurso.vpc_id) if a.attrs['default'])
+        return lambda: delete_network_acl(ec2, recurso, defecto)
+    if tipo == 'security_group':
+        return lambda: ec2.delete_security_group(GroupId=rid)
+    if tipo == 'internet_gateway':
+        return lambda: delete_internet_gateway(ec2, recurso)
+    if tipo == 'subnet':
+        return lambda: ec2.delete_subnet(SubnetId=rid)
+    if tipo == 'vpc':
+        return lambda: ec2.delete_vpc(VpcId=rid)
+    if tipo == 'vpc_peering_connection':
+        return lambda: ec2.delete_vpc_peering_connection(VpcPeeringConnectionId=rid)
+    if tipo == 'transit_gateway':
+        return lambda: delete_transit_gateway(ec2, rid)
+    if tipo == 'transit_gateway_attachment':
+        return lambda: delete_tgw_attachment(ec2, rid)
+    if tipo == 'transit_gateway_peering':
+        return lambda: delete_tgw_attachment(ec2, rid, peering=True)
+    raise ValueError(f"Tipo sin borrado: {tipo}")
+
+
+def build_teardown(descubiertos):
+    """Un solo grafo de borrado para todas las regiones.
+
+    Dependencias (lo de la izquierda se borra antes), sacadas de las aristas
+    de cada inventario:
+        lo que usa un recurso → el recurso (NAT → su EIP y su subnet,
+            attachments → su TGW y sus subnets, peering → las dos VPCs...)
+        instancias y NAT de la VPC → IGW (IPs públicas)
+        route tables y NACLs asociadas → subnet
+        todo lo de la VPC → VPC
+    Las instancias de cada VPC forman un único nodo (una llamada terminate).
+    El VPC peering y el TGW peering aparecen en las dos regiones: se borran
+    una vez, desde la primera en la que se encuentran.
+    """
+    plan = Teardown()
+    nodo = {}        # id de recurso -> id de nodo del plan
+    recursos = []    # (ec2, inv, recurso) de los que tienen nodo propio
+
+    for region, (ec2, inv, seleccion) in descubiertos.items():
+        instancias = {}
+        for recurso in seleccion:
+            if recurso.id in nodo:
+                continue
+            if recurso.type == 'instance':
+                instancias.setdefault(recurso.vpc_id, []).append(recurso.id)
+                continue
+            nodo[recurso.id] = recurso.id
+            recursos.append((ec2, inv, recurso))
+            plan.add(recurso.id, recurso.type, _delete(ec2, inv, recurso),
+                     label=f"{LABELS[recurso.type]} {recurso.name + ' ' if recurso.name else ''}{recurso.id} ({region})")
+        for vpc_id, ids in instancias.items():
+            plan.add(f"instances:{vpc_id}", 'instances', lambda ec2=ec2, ids=ids: terminate_instances(ec2, ids),
+                     label=f"Instancias EC2 {', '.join(ids)} ({region})")
+            nodo.update({i: f"instances:{vpc_id}" for i in ids})
+
+    for ec2, inv, recurso in recursos:
+        antes = {nodo[d.id] for d in inv.dependents(recurso.id) if d.id in nodo}
+        if recurso.type == 'vpc':
+            antes |= {nodo[i] for i in inv.by_vpc.get(recurso.id, ()) if i in nodo}
+        elif recurso.type == 'internet_gateway':
+            antes |= {nodo[i] for v in recurso.attrs['vpcs'] for i in inv.by_vpc.get(v, ())
+                      if i in nodo and inv.get(i).type in ('instance', 'nat_gateway')}
+        elif recurso.type == 'subnet':
+            antes |= {a.id for a in inv.find('route_table', vpc_id=recurso.vpc_id)
+                      if recurso.id in a.attrs['subnets'] and a.id in nodo}
+            antes |= {a.id for a in inv.find('network_acl', vpc_id=recurso.vpc_id)
+                      if recurso.id in a.attrs['subnets'] and a.id in nodo}
+        for bloqueador in antes - {recurso.id}:
+            plan.block(recurso.id, bloqueador)
+    return plan
+
+# ============================================================================
+# MAIN
+# ============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Elimina lo desplegado por plantilla_final.py en todas sus regiones')
+    parser.add_argument('--topologia', metavar='FICHERO',
+                        help='Topología en JSON con la forma de TOPOLOGIA (por defecto la de plantilla_final)')
+    parser.add_argument('--perfil', help='Perfil de AWS para las regiones que no indican el suyo')
+    parser.add_argument('--si', action='store_true', help='No pedir confirmación')
+    args = parser.parse_args(argv)
+
+    topologia = load_topology(args.topologia) if args.topologia else TOPOLOGIA
+    regiones = regions(topologia, args.perfil)
+    print("="*70)
+    print("ELIMINACIÓN DE LA INFRAESTRUCTURA DE plantilla_final.py")
+    print("="*70)
+
+    propio = not ratelimit.enabled()
+    try:
+        clients.configure(workers=WORKERS)
+        ratelimit.enable()
+
+        print(f"\n[1/2] Descubriendo recursos en {', '.join(regiones)}...")
+        descubiertos = discover(regiones)
+        total = 0
+        for region, (_, inv, seleccion) in descubiertos.items():
+            print(f"\n  {region} ({', '.join(regiones[region][1])}): {inv.calls} llamada(s) describe")
+            for tipo in TIPOS:
+                ids = [r.id for r in seleccion if r.type == tipo]
+                if ids:
+                    print(f"    {tipo}: {len(ids)} {' '.join(ids)}")
+            total += len(seleccion)
+        if not total:
+            print("\n✓ No hay nada que eliminar")
+            return 0
+
+        if not args.si:
+            confirmacion = input(f"\n⚠️  Se eliminarán {total} recursos. ¿Continuar? (escribe 'SI' para confirmar): ")
+            if confirmacion.upper() != 'SI':
+                print("\n❌ Operación cancelada por el usuario")
+                return 1
+
+        plan = build_teardown(descubiertos)
+        print(f"\n[2/2] Eliminando {len(plan)} nodo(s) en paralelo en {len(regiones)} región(es)...")
+        resultado = plan.run(workers=WORKERS, timeout=900)
+
+        print("\n" + "="*70)
+        print("ELIMINACIÓN COMPLETADA" if not resultado['failed'] else "ELIMINACIÓN INCOMPLETA")
+        print("="*70)
+        print(f"✓ Eliminados: {len(resultado['deleted'])}")
+        for node_id, error in resultado['failed'].items():
+            print(f"⚠ {node_id}: {error}")
+        if resultado['skipped']:
+            print(f"ℹ No intentados (dependían de un fallo): {', '.join(resultado['skipped'])}")
+        print("="*70)
+        ratelimit.print_summary()
+        return 1 if resultado['failed'] else 0
+
+    except ClientError as e:
+        print(f"\n❌ Error de AWS: {e}")
+        return 1
+    finally:
+        # Sin hooks del limitador en los clientes de llamadas posteriores
+        if propio:
+            ratelimit.disable()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,399 +3,859 @@
 PLANTILLA FINAL UNIFICADA - INFRAESTRUCTURA AWS MULTI-REGIÓN
 ============================================================
 
-Script completo que despliega infraestructura en Oregon y Virginia:
+Script completo que despliega la topología descrita en TOPOLOGIA (por
+defecto Oregon y Virginia):
 - VPCs, Subnets, IGWs, NAT Gateways
 - Instancias EC2 (sin KeyPair en Oregon, con vockey en Virginia)
 - Network ACLs
 - VPC Peering para conectividad entre regiones
+- Transit Gateway
 
-Uso: py plantilla_final.py
+Las regiones se despliegan en paralelo (un hilo por región, hasta
+MAX_REGIONS a la vez); la salida de cada región se acumula aparte y se
+imprime en bloque al terminar. Dentro de cada región los pasos forman un
+grafo de dependencias y se ejecutan en cuanto sus entradas existen (ver
+region_steps()), con hasta REGION_WORKERS pasos a la vez.
+
+Cada paso se guarda en examenes/despliegues.json al terminar. Si algo falla
+a mitad, `--resume <despliegue>` retoma desde el primer paso sin terminar
+reutilizando los IDs ya creados (NAT Gateways incluidos). Con
+`--transaccional`, en cambio, un fallo deshace todo lo creado en la
+ejecución (comun/rollback.py) para no dejar nada facturando.
+
+Antes de crear nada se comprueban en paralelo las cuotas de VPCs, Elastic
+IPs, NAT Gateways y vCPUs de todas las regiones (comun/quotas.py): si el
+plan no cabe, termina en segundos con lo que falta en cada región.
+
+La AMI de cada región se indica por familia ('al2023', 'ubuntu-24.04'...) y se
+resuelve a la última imagen publicada con los parámetros públicos de SSM
+(comun/amis.py), con caché en disco de una hora.
+
+Uso: py plantilla_final.py [--secuencial] [--resume NOMBRE] [--transaccional] [--sin-preflight]
+                           [--amis-sin-conexion] [--topologia fichero.json]
 """
 
-import boto3
-import time
+import argparse
+import contextvars
+import ipaddress
+import json
+import os
 import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comun import amis, cidr, clients, critical, peering, quotas, ratelimit, rollback, salida, sg, tgw, trace, waiters
+from comun.fleet import FleetGroup, launch_fleet, wait_fleet
+from comun.nacl import all_traffic, apply_nacl, associate_nacls, icmp, tcp
+from comun.scheduler import Step, run_steps
+from comun.state import StateStore
 
 # ============================================================================
 # CONFIGURACIÓN
 # ============================================================================
 
-REGION_OREGON = 'us-west-2'
-REGION_VIRGINIA = 'us-east-1'
+# Topología: una entrada por región, los peerings entre ellas y en qué región
+# va el Transit Gateway. Para añadir una región basta con añadir una entrada
+# (o pasar un JSON con la misma forma con --topologia).
+TOPOLOGIA = {
+    'regions': [
+        {
+            'name': 'Oregon', 'region': 'us-west-2',
+            'vpc_cidr': '10.0.0.0/16',
+            'public_subnet_cidr': '10.0.1.0/24', 'private_subnet_cidr': '10.0.2.0/24',
+            'ami': 'al2023',                    # Familia (comun/amis.py) o ID 'ami-...'
+            'key_name': None,                   # Instancias SIN KeyPair
+            'public_instances': 1, 'private_instances': 1,
+        },
+        {
+            'name': 'Virginia', 'region': 'us-east-1',
+            'vpc_cidr': '10.1.0.0/16',
+            'public_subnet_cidr': '10.1.1.0/24', 'private_subnet_cidr': '10.1.2.0/24',
+            'ami': 'al2023',
+            'key_name': 'vockey',               # Instancias CON KeyPair
+            'public_instances': 1, 'private_instances': 1,
+        },
+    ],
+    'peerings': [('Oregon', 'Virginia')],
+    'tgw': 'Oregon',
+}
+
+# Regiones sin 'vpc_cidr' (o sin CIDRs de subnet): se les reparte un bloque
+# libre de SUPERNET que no se solape con las VPCs que ya hay en la cuenta ni
+# con el resto de la topología (ver assign_cidrs). La topología puede
+# cambiarlos con las claves 'supernet', 'vpc_prefix' y 'subnet_prefix'.
+SUPERNET = '10.0.0.0/8'
+VPC_PREFIX = 16
+SUBNET_PREFIX = 24
+CIDR_KEYS = ('vpc_cidr', 'public_subnet_cidr', 'private_subnet_cidr')
 
-OREGON_VPC_CIDR = '10.0.0.0/16'
-OREGON_PUBLIC_SUBNET_CIDR = '10.0.1.0/24'
-OREGON_PRIVATE_SUBNET_CIDR = '10.0.2.0/24'
+# Concurrencia: regiones desplegándose a la vez en la cuenta y pasos a la vez
+# dentro de cada región
+MAX_REGIONS = 10
+REGION_WORKERS = 8
 
-VIRGINIA_VPC_CIDR = '10.1.0.0/16'
-VIRGINIA_PUBLIC_SUBNET_CIDR = '10.1.1.0/24'
-VIRGINIA_PRIVATE_SUBNET_CIDR = '10.1.2.0/24'
+# Estado persistente: los IDs creados se guardan aquí y una segunda ejecución
+# reutiliza lo que siga existiendo en lugar de crearlo de nuevo
+DEPLOYMENT_NAME = 'plantilla-final'
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'despliegues.json')
 
-AMI_OREGON = 'ami-00a8151272c45cd8e'
-AMI_VIRGINIA = 'ami-07ff62358b87c7116'
+# Security Group: SSH, HTTP, HTTPS e ICMP desde cualquier sitio (más todo el
+# tráfico desde las otras regiones, ver peer_rules)
+SG_RULES = [sg.tcp(22), sg.tcp(80), sg.tcp(443), sg.icmp()]
 
-KEY_NAME_VIRGINIA = 'vockey'
+# NACL pública: HTTP, HTTPS, SSH, puertos efímeros e ICMP de entrada; todo de salida
+PUBLIC_NACL_RULES = [
+    tcp(100, 80),
+    tcp(110, 443),
+    tcp(120, 22),
+    tcp(130, (1024, 65535)),
+    icmp(140),
+    all_traffic(100, egress=True),
+]
+
+def private_nacl_rules(public_subnet_cidr):
+    """NACL privada: todo desde la subnet pública, efímeros de entrada, todo de salida"""
+    return [
+        all_traffic(100, cidr=public_subnet_cidr),
+        tcp(110, (1024, 65535)),
+        all_traffic(100, egress=True),
+    ]
 
 # ============================================================================
 # FUNCIONES AUXILIARES
 # ============================================================================
 
-def print_step(step, total, desc):
-    print(f"\n[{step}/{total}] {desc}")
+def tags(resource_type, name):
+    return [{'ResourceType': resource_type, 'Tags': [{'Key': 'Name', 'Value': name}]}]
+
+
+def checkpoint(guardado, nombre, entradas, func, region=None):
+    """Ejecuta func() como paso `nombre` con checkpoint en el estado.
+
+    Si el paso ya se completó con las mismas entradas, reutiliza sus
+    salidas. Sin estado (guardado=None) simplemente ejecuta func(). Con
+    --traza, las llamadas a AWS del paso se atribuyen a 'región/nombre'.
+    """
+    with trace.step(f"{region}/{nombre}", entradas) as paso:
+        paso['outputs'] = _checkpoint(guardado, nombre, entradas, func)
+        return paso['outputs']
+
+
+def _checkpoint(guardado, nombre, entradas, func):
+    if guardado is None:
+        return func()
+    salidas, reutilizado = guardado.checkpoint(nombre, entradas, func)
+    if reutilizado:
+        ids = [i for v in salidas.values() for i in (v if isinstance(v, list) else [v])]
+        print(f"   ↺ Ya existe: {', '.join(ids) or 'sin cambios'}")
+    return salidas
+
+
+def ensure_route(ec2, **kwargs):
+    """create_route que no falla si la ruta ya existe (la reemplaza).
+
+    Al retomar un despliegue, un paso de rutas que falló a medias puede haber
+    dejado algunas creadas.
+    """
+    try:
+        ec2.create_route(**kwargs)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'RouteAlreadyExists':
+            raise
+        ec2.replace_route(**kwargs)
+
+
+def run_regions(builders, workers=None):
+    """Ejecuta cada builder de región en su propio hilo.
+
+    builders: dict {nombre: función sin argumentos}.
+    Devuelve (resultados, errores): dos dicts por nombre de región. La salida
+    de cada región se imprime completa y sin intercalar cuando termina.
+    """
+    def ejecutar(builder):
+        with salida.capturar():
+            try:
+                return builder()
+            except Exception:
+                traceback.print_exc(file=sys.stdout)
+                raise
+
+    resultados, errores = {}, {}
+    with salida.por_contexto(), ThreadPoolExecutor(max_workers=workers or len(builders)) as pool:
+        futuros = {nombre: pool.submit(contextvars.copy_context().run, ejecutar, b)
+                   for nombre, b in builders.items()}
+        for nombre, futuro in futuros.items():
+            try:
+                resultados[nombre] = futuro.result()
+            except Exception as e:
+                errores[nombre] = e
+    return resultados, errores
 
 # ============================================================================
-# OREGON
+# TOPOLOGÍA
 # ============================================================================
 
-def create_oregon():
-    print("\n" + "="*70)
-    print("OREGON (us-west-2)")
-    print("="*70)
-    
-    ec2 = boto3.client('ec2', region_name=REGION_OREGON)
-    r = {}
-    
-    # VPC
-    print_step(1, 8, "VPC")
-    vpc = ec2.create_vpc(CidrBlock=OREGON_VPC_CIDR, TagSpecifications=[{'ResourceType': 'vpc', 'Tags': [{'Key': 'Name', 'Value': 'VPC-Oregon'}]}])
-    r['vpc_id'] = vpc['Vpc']['VpcId']
-    ec2.modify_vpc_attribute(VpcId=r['vpc_id'], EnableDnsHostnames={'Value': True})
-    ec2.modify_vpc_attribute(VpcId=r['vpc_id'], EnableDnsSupport={'Value': True})
-    print(f"   ✓ {r['vpc_id']}")
-    
-    # Subnets
-    print_step(2, 8, "Subnets")
-    pub = ec2.create_subnet(VpcId=r['vpc_id'], CidrBlock=OREGON_PUBLIC_SUBNET_CIDR, AvailabilityZone=f'{REGION_OREGON}a', TagSpecifications=[{'ResourceType': 'subnet', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-Public-Subnet'}]}])
-    r['public_subnet_id'] = pub['Subnet']['SubnetId']
-    ec2.modify_subnet_attribute(SubnetId=r['public_subnet_id'], MapPublicIpOnLaunch={'Value': True})
-    
-    priv = ec2.create_subnet(VpcId=r['vpc_id'], CidrBlock=OREGON_PRIVATE_SUBNET_CIDR, AvailabilityZone=f'{REGION_OREGON}a', TagSpecifications=[{'ResourceType': 'subnet', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-Private-Subnet'}]}])
-    r['private_subnet_id'] = priv['Subnet']['SubnetId']
-    print(f"   ✓ Public: {r['public_subnet_id']}, Private: {r['private_subnet_id']}")
-    
-    # IGW
-    print_step(3, 8, "Internet Gateway")
-    igw = ec2.create_internet_gateway(TagSpecifications=[{'ResourceType': 'internet-gateway', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-IGW'}]}])
-    r['igw_id'] = igw['InternetGateway']['InternetGatewayId']
-    ec2.attach_internet_gateway(InternetGatewayId=r['igw_id'], VpcId=r['vpc_id'])
-    print(f"   ✓ {r['igw_id']}")
-    
-    # NAT
-    print_step(4, 8, "NAT Gateway")
-    eip = ec2.allocate_address(Domain='vpc', TagSpecifications=[{'ResourceType': 'elastic-ip', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-NAT-EIP'}]}])
-    r['eip_id'] = eip['AllocationId']
-    nat = ec2.create_nat_gateway(SubnetId=r['public_subnet_id'], AllocationId=r['eip_id'], TagSpecifications=[{'ResourceType': 'natgateway', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-NAT'}]}])
-    r['nat_id'] = nat['NatGateway']['NatGatewayId']
-    print(f"   ⏳ Esperando NAT Gateway...")
-    ec2.get_waiter('nat_gateway_available').wait(NatGatewayIds=[r['nat_id']])
-    print(f"   ✓ {r['nat_id']}")
-    
-    # Route Tables
-    print_step(5, 8, "Route Tables")
-    pub_rt = ec2.create_route_table(VpcId=r['vpc_id'], TagSpecifications=[{'ResourceType': 'route-table', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-Public-RT'}]}])
-    r['public_rt_id'] = pub_rt['RouteTable']['RouteTableId']
-    ec2.create_route(RouteTableId=r['public_rt_id'], DestinationCidrBlock='0.0.0.0/0', GatewayId=r['igw_id'])
-    ec2.associate_route_table(RouteTableId=r['public_rt_id'], SubnetId=r['public_subnet_id'])
-    
-    priv_rt = ec2.create_route_table(VpcId=r['vpc_id'], TagSpecifications=[{'ResourceType': 'route-table', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-Private-RT'}]}])
-    r['private_rt_id'] = priv_rt['RouteTable']['RouteTableId']
-    ec2.create_route(RouteTableId=r['private_rt_id'], DestinationCidrBlock='0.0.0.0/0', NatGatewayId=r['nat_id'])
-    ec2.associate_route_table(RouteTableId=r['private_rt_id'], SubnetId=r['private_subnet_id'])
-    print(f"   ✓ Configuradas")
-    
-    # Security Group
-    print_step(6, 8, "Security Group")
-    sg = ec2.create_security_group(GroupName='Oregon-SG', Description='SG Oregon', VpcId=r['vpc_id'], TagSpecifications=[{'ResourceType': 'security-group', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-SG'}]}])
-    r['sg_id'] = sg['GroupId']
-    ec2.authorize_security_group_ingress(GroupId=r['sg_id'], IpPermissions=[
-        {'IpProtocol': 'tcp', 'FromPort': 22, 'ToPort': 22, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
-        {'IpProtocol': 'tcp', 'FromPort': 80, 'ToPort': 80, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
-        {'IpProtocol': 'tcp', 'FromPort': 443, 'ToPort': 443, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
-        {'IpProtocol': 'icmp', 'FromPort': -1, 'ToPort': -1, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
-        {'IpProtocol': '-1', 'IpRanges': [{'CidrIp': VIRGINIA_VPC_CIDR}]}
-    ])
-    print(f"   ✓ {r['sg_id']}")
-    
-    # NACLs
-    print_step(7, 8, "Network ACLs")
-    pub_nacl = ec2.create_network_acl(VpcId=r['vpc_id'], TagSpecifications=[{'ResourceType': 'network-acl', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-Public-NACL'}]}])
-    r['public_nacl_id'] = pub_nacl['NetworkAcl']['NetworkAclId']
-    
-    ec2.create_network_acl_entry(NetworkAclId=r['public_nacl_id'], RuleNumber=100, Protocol='6', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', PortRange={'From': 80, 'To': 80})
-    ec2.create_network_acl_entry(NetworkAclId=r['public_nacl_id'], RuleNumber=110, Protocol='6', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', PortRange={'From': 443, 'To': 443})
-    ec2.create_network_acl_entry(NetworkAclId=r['public_nacl_id'], RuleNumber=120, Protocol='6', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', PortRange={'From': 22, 'To': 22})
-    ec2.create_network_acl_entry(NetworkAclId=r['public_nacl_id'], RuleNumber=130, Protocol='6', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', PortRange={'From': 1024, 'To': 65535})
-    ec2.create_network_acl_entry(NetworkAclId=r['public_nacl_id'], RuleNumber=140, Protocol='1', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', IcmpTypeCode={'Type': -1, 'Code': -1})
-    ec2.create_network_acl_entry(NetworkAclId=r['public_nacl_id'], RuleNumber=100, Protocol='-1', RuleAction='allow', Egress=True, CidrBlock='0.0.0.0/0')
-    
-    assocs = ec2.describe_network_acls(Filters=[{'Name': 'association.subnet-id', 'Values': [r['public_subnet_id']]}])
-    if assocs['NetworkAcls']:
-        ec2.replace_network_acl_association(AssociationId=assocs['NetworkAcls'][0]['Associations'][0]['NetworkAclAssociationId'], NetworkAclId=r['public_nacl_id'])
-    
-    priv_nacl = ec2.create_network_acl(VpcId=r['vpc_id'], TagSpecifications=[{'ResourceType': 'network-acl', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-Private-NACL'}]}])
-    r['private_nacl_id'] = priv_nacl['NetworkAcl']['NetworkAclId']
-    
-    ec2.create_network_acl_entry(NetworkAclId=r['private_nacl_id'], RuleNumber=100, Protocol='-1', RuleAction='allow', Egress=False, CidrBlock=OREGON_PUBLIC_SUBNET_CIDR)
-    ec2.create_network_acl_entry(NetworkAclId=r['private_nacl_id'], RuleNumber=110, Protocol='6', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', PortRange={'From': 1024, 'To': 65535})
-    ec2.create_network_acl_entry(NetworkAclId=r['private_nacl_id'], RuleNumber=100, Protocol='-1', RuleAction='allow', Egress=True, CidrBlock='0.0.0.0/0')
-    
-    assocs = ec2.describe_network_acls(Filters=[{'Name': 'association.subnet-id', 'Values': [r['private_subnet_id']]}])
-    if assocs['NetworkAcls']:
-        ec2.replace_network_acl_association(AssociationId=assocs['NetworkAcls'][0]['Associations'][0]['NetworkAclAssociationId'], NetworkAclId=r['private_nacl_id'])
-    print(f"   ✓ Configuradas")
-    
-    # Instancias (SIN KeyPair)
-    print_step(8, 8, "Instancias EC2")
-    pub_inst = ec2.run_instances(ImageId=AMI_OREGON, InstanceType='t2.micro', MinCount=1, MaxCount=1,
-        NetworkInterfaces=[{'DeviceIndex': 0, 'SubnetId': r['public_subnet_id'], 'Groups': [r['sg_id']], 'AssociatePublicIpAddress': True}],
-        TagSpecifications=[{'ResourceType': 'instance', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-Public-Instance'}]}])
-    r['public_instance_id'] = pub_inst['Instances'][0]['InstanceId']
-    
-    priv_inst = ec2.run_instances(ImageId=AMI_OREGON, InstanceType='t2.micro', MinCount=1, MaxCount=1,
-        NetworkInterfaces=[{'DeviceIndex': 0, 'SubnetId': r['private_subnet_id'], 'Groups': [r['sg_id']], 'AssociatePublicIpAddress': False}],
-        TagSpecifications=[{'ResourceType': 'instance', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-Private-Instance'}]}])
-    r['private_instance_id'] = priv_inst['Instances'][0]['InstanceId']
-    print(f"   ✓ {r['public_instance_id']} (Pub), {r['private_instance_id']} (Priv)")
-    
-    return r
+REGION_DEFAULTS = {'key_name': None, 'public_instances': 1, 'private_instances': 1, 'profile': None}
+
+
+def load_topology(path):
+    """Lee una topología en JSON con la misma forma que TOPOLOGIA."""
+    with open(path, encoding='utf-8') as f:
+        topologia = json.load(f)
+    if topologia.get('peerings') != 'mesh':
+        topologia['peerings'] = [tuple(par) for par in topologia.get('peerings', [])]
+    return topologia
+
+
+def assign_cidrs(topologia, estado=None, profile=None):
+    """Topología con CIDRs para las regiones que no los indican.
+
+    Las VPCs nuevas salen de un único pool (comun.cidr.CidrPool) para que no
+    se solapen entre sí ni con las VPCs que ya existen en ninguna de las
+    regiones (una describe_vpcs por región, en paralelo) ni con los CIDRs
+    fijos de la topología. Al volver a ejecutar un despliegue guardado se
+    reutiliza el CIDR con el que se creó su VPC. Las subnets pública y
+    privada se reparten dentro de la VPC (siempre igual para la misma VPC).
+    Devuelve una copia.
+    """
+    entradas = [dict(e) for e in topologia['regions']]
+    if all(all(k in e for k in CIDR_KEYS) for e in entradas):
+        return topologia
+    if estado:
+        for entrada in entradas:
+            previo = estado.steps(entrada['region']).get('vpc', {}).get('inputs', {}).get('vpc_cidr')
+            if 'vpc_cidr' not in entrada and previo:
+                entrada['vpc_cidr'] = previo
+
+    pool = cidr.CidrPool(topologia.get('supernet', SUPERNET))
+    for entrada in entradas:
+        if 'vpc_cidr' in entrada:
+            pool.reserve(entrada['vpc_cidr'])
+    if any('vpc_cidr' not in e for e in entradas):
+        def en_uso(entrada):
+            return cidr.in_use(clients.client('ec2', entrada['region'], entrada.get('profile') or profile))
+        with ThreadPoolExecutor(max_workers=min(MAX_REGIONS, len(entradas))) as ejecutor:
+            futuros = [ejecutor.submit(contextvars.copy_context().run, en_uso, e) for e in entradas]
+            for futuro in futuros:
+                for bloque in futuro.result():
+                    pool.reserve(bloque)
+
+    prefijo = topologia.get('subnet_prefix', SUBNET_PREFIX)
+    for entrada, original in zip(entradas, topologia['regions']):
+        if 'vpc_cidr' not in entrada:
+            entrada['vpc_cidr'] = pool.allocate(topologia.get('vpc_prefix', VPC_PREFIX))
+        capas = [clave for clave in CIDR_KEYS[1:] if clave not in entrada]
+        if capas:
+            # Dentro de la VPC, sin pisar la subnet que sí se haya fijado
+            subred = cidr.CidrPool(entrada['vpc_cidr'], [entrada[k] for k in CIDR_KEYS[1:] if k in entrada])
+            for clave in capas:
+                entrada[clave] = subred.allocate(prefijo)
+        nuevos = [f"{clave[:-5]} {entrada[clave]}" for clave in CIDR_KEYS if clave not in original]
+        if nuevos:
+            print(f"   ✓ CIDRs de {entrada['name']}: {', '.join(nuevos)}")
+    return dict(topologia, regions=entradas)
+
+
+def expand_peerings(topologia):
+    """'peerings': 'mesh' conecta todas las regiones entre sí (una malla completa)."""
+    if topologia.get('peerings') != 'mesh':
+        return topologia
+    return dict(topologia, peerings=peering.full_mesh([e['name'] for e in topologia['regions']]))
+
+
+def validate_topology(topologia):
+    """Comprueba la topología antes de crear nada. Lanza ValueError si no es válida."""
+    nombres, regiones = set(), set()
+    for entrada in topologia['regions']:
+        faltan = {'name', 'region', 'vpc_cidr', 'public_subnet_cidr', 'private_subnet_cidr', 'ami'} - set(entrada)
+        if faltan:
+            raise ValueError(f"{entrada.get('name', entrada)}: faltan {', '.join(sorted(faltan))}")
+        if entrada['name'] in nombres:
+            raise ValueError(f"Nombre de región repetido: {entrada['name']}")
+        # El estado se guarda por región de AWS: una VPC de esta plantilla por región
+        if entrada['region'] in regiones:
+            raise ValueError(f"Región repetida: {entrada['region']}")
+        try:
+            amis.check_family(entrada['ami'])
+        except ValueError as e:
+            raise ValueError(f"{entrada['name']}: {e}") from None
+        nombres.add(entrada['name'])
+        regiones.add(entrada['region'])
+        vpc = ipaddress.ip_network(entrada['vpc_cidr'])
+        for clave in ('public_subnet_cidr', 'private_subnet_cidr'):
+            if not ipaddress.ip_network(entrada[clave]).subnet_of(vpc):
+                raise ValueError(f"{entrada['name']}: {entrada[clave]} no está dentro de {vpc}")
+
+    cidrs = {e['name']: ipaddress.ip_network(e['vpc_cidr']) for e in topologia['regions']}
+    for a, b in topologia.get('peerings', []):
+        if a not in cidrs or b not in cidrs:
+            raise ValueError(f"Peering con una región desconocida: {a}-{b}")
+        if cidrs[a].overlaps(cidrs[b]):
+            raise ValueError(f"Peering {a}-{b}: los CIDR {cidrs[a]} y {cidrs[b]} se solapan")
+    for hub in tgw_hubs(topologia):
+        if hub not in cidrs:
+            raise ValueError(f"Transit Gateway en una región desconocida: {hub}")
+
+
+def region_configs(topologia, profile=None):
+    """cfg de build_region() para cada región, con los CIDR de sus peers.
+
+    `profile` es el perfil de AWS de las entradas que no indican el suyo.
+    """
+    cidrs = {e['name']: e['vpc_cidr'] for e in topologia['regions']}
+    configs = []
+    for entrada in topologia['regions']:
+        cfg = dict(REGION_DEFAULTS, **entrada)
+        cfg['profile'] = cfg['profile'] or profile
+        cfg['peer_cidrs'] = sorted({cidrs[b if a == cfg['name'] else a]
+                                    for a, b in topologia.get('peerings', []) if cfg['name'] in (a, b)})
+        configs.append(cfg)
+    return configs
 
 # ============================================================================
-# VIRGINIA
+# CONSTRUCCIÓN DE UNA REGIÓN (GRAFO DE PASOS)
 # ============================================================================
+#
+# Cada región se describe como un grafo de pasos con entradas y salidas.
+# Solo la ruta privada hacia el NAT y la instancia privada esperan al NAT
+# Gateway; el resto (SG, NACLs, route tables...) avanza mientras tanto.
+#
+#   vpc ─┬─ public_subnet ─┬─ nat ── nat_ready ── private_route ── private_instance
+#        ├─ igw ───────────┘
+#        ├─ private_subnet ── private_rt
+#        ├─ security_group ── peer_rules
+#        ├─ public_nacl, private_nacl, public_rt ── public_instance
+#   eip ─┘ (no depende de nada)
+#
+#   public_instance + private_instance ── instances_running (una espera para todas)
+#
+# La creación del NAT y la espera son pasos distintos: si la espera falla,
+# al retomar se vuelve a esperar al mismo NAT en lugar de crear otro.
+
+def region_steps(ec2, cfg):
+    """Devuelve la lista de Step que construye la región descrita por cfg."""
+    name, region = cfg['name'], cfg['region']
+    az = f"{region}a"
+
+    def vpc(r):
+        vpc = ec2.create_vpc(CidrBlock=cfg['vpc_cidr'], TagSpecifications=tags('vpc', f"VPC-{name}"))
+        vpc_id = vpc['Vpc']['VpcId']
+        ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
+        ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsSupport={'Value': True})
+        print(f"   ✓ {vpc_id}")
+        return {'vpc_id': vpc_id}
+
+    def public_subnet(r):
+        pub = ec2.create_subnet(VpcId=r['vpc_id'], CidrBlock=cfg['public_subnet_cidr'], AvailabilityZone=az, TagSpecifications=tags('subnet', f"{name}-Public-Subnet"))
+        subnet_id = pub['Subnet']['SubnetId']
+        ec2.modify_subnet_attribute(SubnetId=subnet_id, MapPublicIpOnLaunch={'Value': True})
+        print(f"   ✓ Public: {subnet_id}")
+        return {'public_subnet_id': subnet_id}
+
+    def private_subnet(r):
+        priv = ec2.create_subnet(VpcId=r['vpc_id'], CidrBlock=cfg['private_subnet_cidr'], AvailabilityZone=az, TagSpecifications=tags('subnet', f"{name}-Private-Subnet"))
+        print(f"   ✓ Private: {priv['Subnet']['SubnetId']}")
+        return {'private_subnet_id': priv['Subnet']['SubnetId']}
 
-def create_virginia():
+    def igw(r):
+        igw = ec2.create_internet_gateway(TagSpecifications=tags('internet-gateway', f"{name}-IGW"))
+        igw_id = igw['InternetGateway']['InternetGatewayId']
+        ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=r['vpc_id'])
+        print(f"   ✓ {igw_id}")
+        return {'igw_id': igw_id}
+
+    def eip(r):
+        eip = ec2.allocate_address(Domain='vpc', TagSpecifications=tags('elastic-ip', f"{name}-NAT-EIP"))
+        print(f"   ✓ {eip['AllocationId']}")
+        return {'eip_id': eip['AllocationId']}
+
+    def nat(r):
+        nat = ec2.create_nat_gateway(SubnetId=r['public_subnet_id'], AllocationId=r['eip_id'], TagSpecifications=tags('natgateway', f"{name}-NAT"))
+        nat_id = nat['NatGateway']['NatGatewayId']
+        print(f"   ✓ {nat_id} creado")
+        return {'nat_id': nat_id}
+
+    def nat_ready(r):
+        print(f"   ⏳ Esperando NAT Gateway {r['nat_id']}...")
+        waiters.wait_for(ec2, 'nat_gateway_available', [r['nat_id']])
+        print(f"   ✓ {r['nat_id']} disponible")
+        return {}
+
+    def public_rt(r):
+        pub_rt = ec2.create_route_table(VpcId=r['vpc_id'], TagSpecifications=tags('route-table', f"{name}-Public-RT"))
+        rt_id = pub_rt['RouteTable']['RouteTableId']
+        ensure_route(ec2, RouteTableId=rt_id, DestinationCidrBlock='0.0.0.0/0', GatewayId=r['igw_id'])
+        ec2.associate_route_table(RouteTableId=rt_id, SubnetId=r['public_subnet_id'])
+        print(f"   ✓ {rt_id} → IGW")
+        return {'public_rt_id': rt_id}
+
+    def private_rt(r):
+        priv_rt = ec2.create_route_table(VpcId=r['vpc_id'], TagSpecifications=tags('route-table', f"{name}-Private-RT"))
+        rt_id = priv_rt['RouteTable']['RouteTableId']
+        ec2.associate_route_table(RouteTableId=rt_id, SubnetId=r['private_subnet_id'])
+        print(f"   ✓ {rt_id}")
+        return {'private_rt_id': rt_id}
+
+    def private_route(r):
+        ensure_route(ec2, RouteTableId=r['private_rt_id'], DestinationCidrBlock='0.0.0.0/0', NatGatewayId=r['nat_id'])
+        print(f"   ✓ {r['private_rt_id']} → {r['nat_id']}")
+        return {}
+
+    # SGs creados en esta ejecución: aún sin reglas de entrada que leer
+    sgs_nuevos = set()
+
+    def security_group(r):
+        grupo = ec2.create_security_group(GroupName=f"{name}-SG", Description=f"SG {name}", VpcId=r['vpc_id'], TagSpecifications=tags('security-group', f"{name}-SG"))
+        sg_id = grupo['GroupId']
+        sgs_nuevos.add(sg_id)
+        print(f"   ✓ {sg_id}")
+        return {'sg_id': sg_id}
+
+    def peer_rules(r):
+        # Todas las reglas del SG en un solo authorize. Es un paso aparte del SG:
+        # añadir o quitar una región de la topología solo sincroniza las reglas
+        # (una describe y como mucho un authorize y un revoke), no recrea el SG
+        reglas = SG_RULES + [sg.all_traffic(cidr) for cidr in cfg['peer_cidrs']]
+        cambios = sg.apply_group(ec2, r['sg_id'], reglas, new=r['sg_id'] in sgs_nuevos)
+        print(f"   ✓ Todo el tráfico desde: {', '.join(cfg['peer_cidrs']) or 'ninguna región'}"
+              f" (+{cambios['authorized']} / -{cambios['revoked']} reglas)")
+        return {}
+
+    def nacl(subnet_key, label, reglas):
+        def run(r):
+            acl = ec2.create_network_acl(VpcId=r['vpc_id'], TagSpecifications=tags('network-acl', f"{name}-{label}-NACL"))
+            nacl_id = acl['NetworkAcl']['NetworkAclId']
+            apply_nacl(ec2, nacl_id, reglas)
+            associate_nacls(ec2, {r[subnet_key]: nacl_id})
+            print(f"   ✓ {nacl_id} ({len(reglas)} reglas)")
+            return {f"{label.lower()}_nacl_id": nacl_id}
+        return run
+
+    def instance(subnet_key, public, label, count):
+        # Un solo run_instances para todas las instancias de la subnet; la
+        # espera a running se hace después para todas a la vez (instances_running)
+        def run(r):
+            grupo = FleetGroup(f"{name}-{label}-Instance", r[subnet_key], count, [r['sg_id']], public)
+            instance_ids = launch_fleet(ec2, [grupo], cfg.get('image_id', cfg['ami']), key_name=cfg.get('key_name'),
+                                        token_seed=region, wait=False)[grupo.name]
+            print(f"   ✓ {', '.join(instance_ids)} ({label})")
+            return {f"{label.lower()}_instance_ids": instance_ids}
+        return run
+
+    def instances_running(r):
+        ids = [i for clave in ('public_instance_ids', 'private_instance_ids') for i in r.get(clave, [])]
+        print(f"   ⏳ Esperando {len(ids)} instancias...")
+        wait_fleet(ec2, ids)
+        print(f"   ✓ {len(ids)} instancias running")
+        return {}
+
+    steps = [
+        Step('vpc', vpc, outputs=('vpc_id',), label="VPC"),
+        Step('eip', eip, outputs=('eip_id',), label="Elastic IP (NAT)"),
+        Step('public_subnet', public_subnet, inputs=('vpc_id',), outputs=('public_subnet_id',), label="Subnet pública"),
+        Step('private_subnet', private_subnet, inputs=('vpc_id',), outputs=('private_subnet_id',), label="Subnet privada"),
+        Step('igw', igw, inputs=('vpc_id',), outputs=('igw_id',), label="Internet Gateway"),
+        Step('nat', nat, inputs=('public_subnet_id', 'eip_id', 'igw_id'), outputs=('nat_id',), label="NAT Gateway"),
+        Step('nat_ready', nat_ready, inputs=('nat_id',), label="NAT Gateway disponible"),
+        Step('public_rt', public_rt, inputs=('vpc_id', 'igw_id', 'public_subnet_id'), outputs=('public_rt_id',), label="Route Table pública"),
+        Step('private_rt', private_rt, inputs=('vpc_id', 'private_subnet_id'), outputs=('private_rt_id',), label="Route Table privada"),
+        Step('private_route', private_route, inputs=('private_rt_id', 'nat_id'), after=('nat_ready',), label="Ruta privada → NAT"),
+        Step('security_group', security_group, inputs=('vpc_id',), outputs=('sg_id',), label="Security Group"),
+        Step('peer_rules', peer_rules, inputs=('sg_id',), label="Reglas SG entre regiones"),
+        Step('public_nacl', nacl('public_subnet_id', 'Public', PUBLIC_NACL_RULES), inputs=('vpc_id', 'public_subnet_id'), outputs=('public_nacl_id',), label="Network ACL pública"),
+        Step('private_nacl', nacl('private_subnet_id', 'Private', private_nacl_rules(cfg['public_subnet_cidr'])), inputs=('vpc_id', 'private_subnet_id'), outputs=('private_nacl_id',), label="Network ACL privada"),
+    ]
+    if cfg['public_instances']:
+        steps.append(Step('public_instance', instance('public_subnet_id', True, 'Public', cfg['public_instances']),
+                          inputs=('public_subnet_id', 'sg_id', 'public_rt_id'), outputs=('public_instance_ids',),
+                          label="Instancias EC2 públicas"))
+    if cfg['private_instances']:
+        steps.append(Step('private_instance', instance('private_subnet_id', False, 'Private', cfg['private_instances']),
+                          inputs=('private_subnet_id', 'sg_id'), outputs=('private_instance_ids',),
+                          after=('private_route',), label="Instancias EC2 privadas"))
+    lanzadas = tuple(o for step in steps if step.name.endswith('_instance') for o in step.outputs)
+    if lanzadas:
+        steps.append(Step('instances_running', instances_running, inputs=lanzadas, label="Instancias EC2 running"))
+    return steps
+
+
+# Parámetros de cfg de los que depende cada paso (además de sus entradas).
+# Si cambian, el paso se rehace aunque haya estado guardado.
+STEP_PARAMS = {
+    'vpc': ('vpc_cidr',),
+    'public_subnet': ('public_subnet_cidr',),
+    'private_subnet': ('private_subnet_cidr',),
+    'peer_rules': ('peer_cidrs',),
+    'private_nacl': ('public_subnet_cidr',),
+    'public_instance': ('ami', 'key_name', 'public_instances'),
+    'private_instance': ('ami', 'key_name', 'private_instances'),
+}
+
+
+def build_region(cfg, estado=None, workers=REGION_WORKERS):
+    """Construye una región completa ejecutando su grafo de pasos.
+
+    La salida de cada paso se imprime en bloque al terminar, numerada por
+    orden de finalización. Con `estado` (StateStore) cada paso se guarda al
+    terminar, y los que ya se completaron en una ejecución anterior (y cuyos
+    recursos siguen existiendo) no se repiten.
+    """
     print("\n" + "="*70)
-    print("VIRGINIA (us-east-1)")
+    print(f"{cfg['name'].upper()} ({cfg['region']})")
     print("="*70)
-    
-    ec2 = boto3.client('ec2', region_name=REGION_VIRGINIA)
-    r = {}
-    
-    # VPC
-    print_step(1, 8, "VPC")
-    vpc = ec2.create_vpc(CidrBlock=VIRGINIA_VPC_CIDR, TagSpecifications=[{'ResourceType': 'vpc', 'Tags': [{'Key': 'Name', 'Value': 'VPC-Virginia'}]}])
-    r['vpc_id'] = vpc['Vpc']['VpcId']
-    ec2.modify_vpc_attribute(VpcId=r['vpc_id'], EnableDnsHostnames={'Value': True})
-    ec2.modify_vpc_attribute(VpcId=r['vpc_id'], EnableDnsSupport={'Value': True})
-    print(f"   ✓ {r['vpc_id']}")
-    
-    # Subnets
-    print_step(2, 8, "Subnets")
-    pub = ec2.create_subnet(VpcId=r['vpc_id'], CidrBlock=VIRGINIA_PUBLIC_SUBNET_CIDR, AvailabilityZone=f'{REGION_VIRGINIA}a', TagSpecifications=[{'ResourceType': 'subnet', 'Tags': [{'Key': 'Name', 'Value': 'Virginia-Public-Subnet'}]}])
-    r['public_subnet_id'] = pub['Subnet']['SubnetId']
-    ec2.modify_subnet_attribute(SubnetId=r['public_subnet_id'], MapPublicIpOnLaunch={'Value': True})
-    
-    priv = ec2.create_subnet(VpcId=r['vpc_id'], CidrBlock=VIRGINIA_PRIVATE_SUBNET_CIDR, AvailabilityZone=f'{REGION_VIRGINIA}a', TagSpecifications=[{'ResourceType': 'subnet', 'Tags': [{'Key': 'Name', 'Value': 'Virginia-Private-Subnet'}]}])
-    r['private_subnet_id'] = priv['Subnet']['SubnetId']
-    print(f"   ✓ Public: {r['public_subnet_id']}, Private: {r['private_subnet_id']}")
-    
-    # IGW
-    print_step(3, 8, "Internet Gateway")
-    igw = ec2.create_internet_gateway(TagSpecifications=[{'ResourceType': 'internet-gateway', 'Tags': [{'Key': 'Name', 'Value': 'Virginia-IGW'}]}])
-    r['igw_id'] = igw['InternetGateway']['InternetGatewayId']
-    ec2.attach_internet_gateway(InternetGatewayId=r['igw_id'], VpcId=r['vpc_id'])
-    print(f"   ✓ {r['igw_id']}")
-    
-    # NAT
-    print_step(4, 8, "NAT Gateway")
-    eip = ec2.allocate_address(Domain='vpc', TagSpecifications=[{'ResourceType': 'elastic-ip', 'Tags': [{'Key': 'Name', 'Value': 'Virginia-NAT-EIP'}]}])
-    r['eip_id'] = eip['AllocationId']
-    nat = ec2.create_nat_gateway(SubnetId=r['public_subnet_id'], AllocationId=r['eip_id'], TagSpecifications=[{'ResourceType': 'natgateway', 'Tags': [{'Key': 'Name', 'Value': 'Virginia-NAT'}]}])
-    r['nat_id'] = nat['NatGateway']['NatGatewayId']
-    print(f"   ⏳ Esperando NAT Gateway...")
-    ec2.get_waiter('nat_gateway_available').wait(NatGatewayIds=[r['nat_id']])
-    print(f"   ✓ {r['nat_id']}")
-    
-    # Route Tables
-    print_step(5, 8, "Route Tables")
-    pub_rt = ec2.create_route_table(VpcId=r['vpc_id'], TagSpecifications=[{'ResourceType': 'route-table', 'Tags': [{'Key': 'Name', 'Value': 'Virginia-Public-RT'}]}])
-    r['public_rt_id'] = pub_rt['RouteTable']['RouteTableId']
-    ec2.create_route(RouteTableId=r['public_rt_id'], DestinationCidrBlock='0.0.0.0/0', GatewayId=r['igw_id'])
-    ec2.associate_route_table(RouteTableId=r['public_rt_id'], SubnetId=r['public_subnet_id'])
-    
-    priv_rt = ec2.create_route_table(VpcId=r['vpc_id'], TagSpecifications=[{'ResourceType': 'route-table', 'Tags': [{'Key': 'Name', 'Value': 'Virginia-Private-RT'}]}])
-    r['private_rt_id'] = priv_rt['RouteTable']['RouteTableId']
-    ec2.create_route(RouteTableId=r['private_rt_id'], DestinationCidrBlock='0.0.0.0/0', NatGatewayId=r['nat_id'])
-    ec2.associate_route_table(RouteTableId=r['private_rt_id'], SubnetId=r['private_subnet_id'])
-    print(f"   ✓ Configuradas")
-    
-    # Security Group
-    print_step(6, 8, "Security Group")
-    sg = ec2.create_security_group(GroupName='Virginia-SG', Description='SG Virginia', VpcId=r['vpc_id'], TagSpecifications=[{'ResourceType': 'security-group', 'Tags': [{'Key': 'Name', 'Value': 'Virginia-SG'}]}])
-    r['sg_id'] = sg['GroupId']
-    ec2.authorize_security_group_ingress(GroupId=r['sg_id'], IpPermissions=[
-        {'IpProtocol': 'tcp', 'FromPort': 22, 'ToPort': 22, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
-        {'IpProtocol': 'tcp', 'FromPort': 80, 'ToPort': 80, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
-        {'IpProtocol': 'tcp', 'FromPort': 443, 'ToPort': 443, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
-        {'IpProtocol': 'icmp', 'FromPort': -1, 'ToPort': -1, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
-        {'IpProtocol': '-1', 'IpRanges': [{'CidrIp': OREGON_VPC_CIDR}]}
-    ])
-    print(f"   ✓ {r['sg_id']}")
-    
-    # NACLs
-    print_step(7, 8, "Network ACLs")
-    pub_nacl = ec2.create_network_acl(VpcId=r['vpc_id'], TagSpecifications=[{'ResourceType': 'network-acl', 'Tags': [{'Key': 'Name', 'Value': 'Virginia-Public-NACL'}]}])
-    r['public_nacl_id'] = pub_nacl['NetworkAcl']['NetworkAclId']
-    
-    ec2.create_network_acl_entry(NetworkAclId=r['public_nacl_id'], RuleNumber=100, Protocol='6', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', PortRange={'From': 80, 'To': 80})
-    ec2.create_network_acl_entry(NetworkAclId=r['public_nacl_id'], RuleNumber=110, Protocol='6', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', PortRange={'From': 443, 'To': 443})
-    ec2.create_network_acl_entry(NetworkAclId=r['public_nacl_id'], RuleNumber=120, Protocol='6', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', PortRange={'From': 22, 'To': 22})
-    ec2.create_network_acl_entry(NetworkAclId=r['public_nacl_id'], RuleNumber=130, Protocol='6', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', PortRange={'From': 1024, 'To': 65535})
-    ec2.create_network_acl_entry(NetworkAclId=r['public_nacl_id'], RuleNumber=140, Protocol='1', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', IcmpTypeCode={'Type': -1, 'Code': -1})
-    ec2.create_network_acl_entry(NetworkAclId=r['public_nacl_id'], RuleNumber=100, Protocol='-1', RuleAction='allow', Egress=True, CidrBlock='0.0.0.0/0')
-    
-    assocs = ec2.describe_network_acls(Filters=[{'Name': 'association.subnet-id', 'Values': [r['public_subnet_id']]}])
-    if assocs['NetworkAcls']:
-        ec2.replace_network_acl_association(AssociationId=assocs['NetworkAcls'][0]['Associations'][0]['NetworkAclAssociationId'], NetworkAclId=r['public_nacl_id'])
-    
-    priv_nacl = ec2.create_network_acl(VpcId=r['vpc_id'], TagSpecifications=[{'ResourceType': 'network-acl', 'Tags': [{'Key': 'Name', 'Value': 'Virginia-Private-NACL'}]}])
-    r['private_nacl_id'] = priv_nacl['NetworkAcl']['NetworkAclId']
-    
-    ec2.create_network_acl_entry(NetworkAclId=r['private_nacl_id'], RuleNumber=100, Protocol='-1', RuleAction='allow', Egress=False, CidrBlock=VIRGINIA_PUBLIC_SUBNET_CIDR)
-    ec2.create_network_acl_entry(NetworkAclId=r['private_nacl_id'], RuleNumber=110, Protocol='6', RuleAction='allow', Egress=False, CidrBlock='0.0.0.0/0', PortRange={'From': 1024, 'To': 65535})
-    ec2.create_network_acl_entry(NetworkAclId=r['private_nacl_id'], RuleNumber=100, Protocol='-1', RuleAction='allow', Egress=True, CidrBlock='0.0.0.0/0')
-    
-    assocs = ec2.describe_network_acls(Filters=[{'Name': 'association.subnet-id', 'Values': [r['private_subnet_id']]}])
-    if assocs['NetworkAcls']:
-        ec2.replace_network_acl_association(AssociationId=assocs['NetworkAcls'][0]['Associations'][0]['NetworkAclAssociationId'], NetworkAclId=r['private_nacl_id'])
-    print(f"   ✓ Configuradas")
-    
-    # Instancias (CON KeyPair)
-    print_step(8, 8, "Instancias EC2")
-    pub_inst = ec2.run_instances(ImageId=AMI_VIRGINIA, InstanceType='t2.micro', KeyName=KEY_NAME_VIRGINIA, MinCount=1, MaxCount=1,
-        NetworkInterfaces=[{'DeviceIndex': 0, 'SubnetId': r['public_subnet_id'], 'Groups': [r['sg_id']], 'AssociatePublicIpAddress': True}],
-        TagSpecifications=[{'ResourceType': 'instance', 'Tags': [{'Key': 'Name', 'Value': 'Virginia-Public-Instance'}]}])
-    r['public_instance_id'] = pub_inst['Instances'][0]['InstanceId']
-    
-    priv_inst = ec2.run_instances(ImageId=AMI_VIRGINIA, InstanceType='t2.micro', KeyName=KEY_NAME_VIRGINIA, MinCount=1, MaxCount=1,
-        NetworkInterfaces=[{'DeviceIndex': 0, 'SubnetId': r['private_subnet_id'], 'Groups': [r['sg_id']], 'AssociatePublicIpAddress': False}],
-        TagSpecifications=[{'ResourceType': 'instance', 'Tags': [{'Key': 'Name', 'Value': 'Virginia-Private-Instance'}]}])
-    r['private_instance_id'] = priv_inst['Instances'][0]['InstanceId']
-    print(f"   ✓ {r['public_instance_id']} (Pub), {r['private_instance_id']} (Priv)")
-    
-    return r
+
+    ec2 = clients.client('ec2', cfg['region'], cfg['profile'])
+    steps = region_steps(ec2, cfg)
+    hechos = []
+    guardado = estado.region(cfg['region']) if estado else None
+    if guardado:
+        perdidos = guardado.verify(ec2)
+        if perdidos:
+            print(f"   ⚠ Ya no existen y se recrearán: {', '.join(perdidos)}")
+
+    def con_log(step):
+        func = step.func
+
+        def cabecera():
+            hechos.append(step.name)
+            return f"\n[{len(hechos)}/{len(steps)}] {step.label}\n"
+
+        def run(r):
+            entradas = {k: r[k] for k in step.inputs}
+            entradas.update({k: cfg.get(k) for k in STEP_PARAMS.get(step.name, ())})
+            with salida.capturar(cabecera):
+                return checkpoint(guardado, step.name, entradas, lambda: func(r), cfg['region'])
+        return run
+
+    for step in steps:
+        step.func = con_log(step)
+    with salida.por_contexto():
+        return run_steps(steps, max_workers=workers, name=cfg['region'])
 
 # ============================================================================
 # VPC PEERING
 # ============================================================================
 
-def create_peering(oregon, virginia):
+def create_peerings(topologia, configs, regiones, estado=None):
+    """Todos los peerings de la topología a la vez (comun.peering.build_mesh).
+
+    Para cada par (A, B), A solicita y B acepta. Los pasos se guardan en la
+    región que solicita, con el nombre del peer (una región puede tener
+    peering con varias). Devuelve {(a, b): peering_id}.
+    """
+    pares = topologia.get('peerings', [])
+    if not pares:
+        return {}
     print("\n" + "="*70)
-    print("VPC PEERING")
+    print(f"VPC PEERING ({len(pares)} {'conexión' if len(pares) == 1 else 'conexiones'})")
     print("="*70)
-    
-    ec2_or = boto3.client('ec2', region_name=REGION_OREGON)
-    ec2_va = boto3.client('ec2', region_name=REGION_VIRGINIA)
-    
-    print_step(1, 2, "Creando conexión de peering")
-    peer = ec2_or.create_vpc_peering_connection(
-        VpcId=oregon['vpc_id'],
-        PeerVpcId=virginia['vpc_id'],
-        PeerRegion=REGION_VIRGINIA,
-        TagSpecifications=[{'ResourceType': 'vpc-peering-connection', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-Virginia-Peering'}]}]
-    )
-    peering_id = peer['VpcPeeringConnection']['VpcPeeringConnectionId']
-    print(f"   ✓ Solicitud: {peering_id}")
-    
-    time.sleep(5)
-    ec2_va.accept_vpc_peering_connection(VpcPeeringConnectionId=peering_id)
-    print(f"   ✓ Aceptado en Virginia")
-    
-    print_step(2, 2, "Configurando rutas")
-    ec2_or.create_route(RouteTableId=oregon['public_rt_id'], DestinationCidrBlock=VIRGINIA_VPC_CIDR, VpcPeeringConnectionId=peering_id)
-    ec2_or.create_route(RouteTableId=oregon['private_rt_id'], DestinationCidrBlock=VIRGINIA_VPC_CIDR, VpcPeeringConnectionId=peering_id)
-    ec2_va.create_route(RouteTableId=virginia['public_rt_id'], DestinationCidrBlock=OREGON_VPC_CIDR, VpcPeeringConnectionId=peering_id)
-    ec2_va.create_route(RouteTableId=virginia['private_rt_id'], DestinationCidrBlock=OREGON_VPC_CIDR, VpcPeeringConnectionId=peering_id)
-    print(f"   ✓ Rutas configuradas")
-    
-    return peering_id
+
+    vpcs = [peering.MeshVpc(nombre, cfg['region'], regiones[nombre]['vpc_id'], cfg['vpc_cidr'],
+                            [regiones[nombre]['public_rt_id'], regiones[nombre]['private_rt_id']], cfg['profile'])
+            for nombre, cfg in configs.items()]
+
+    def con_estado(vpc, peer, paso, entradas, func):
+        guardado = estado.region(vpc.region) if estado else None
+        return checkpoint(guardado, f"{paso}:{peer.name}", entradas, func, vpc.region)
+
+    return peering.build_mesh(vpcs, pares, checkpoint=con_estado)
 
 # ============================================================================
 # TRANSIT GATEWAY
 # ============================================================================
 
-def create_tgw(oregon):
-    print("\n" + "="*70)
-    print("TRANSIT GATEWAY")
-    print("="*70)
-    
-    ec2 = boto3.client('ec2', region_name=REGION_OREGON)
-    
-    print_step(1, 2, "Creando Transit Gateway en Oregon")
-    tgw = ec2.create_transit_gateway(
-        Description='Multi-Region TGW',
-        Options={
-            'AmazonSideAsn': 64512,
-            'DefaultRouteTableAssociation': 'enable',
-            'DefaultRouteTablePropagation': 'enable',
-            'DnsSupport': 'enable',
-            'VpnEcmpSupport': 'enable'
-        },
-        TagSpecifications=[{'ResourceType': 'transit-gateway', 'Tags': [{'Key': 'Name', 'Value': 'Multi-Region-TGW'}]}]
-    )
-    tgw_id = tgw['TransitGateway']['TransitGatewayId']
-    print(f"   ✓ TGW creado: {tgw_id}")
-    
-    print(f"   ⏳ Esperando disponibilidad del TGW...")
-    for _ in range(60):
-        resp = ec2.describe_transit_gateways(TransitGatewayIds=[tgw_id])
-        state = resp['TransitGateways'][0]['State']
-        if state == 'available':
-            break
-        time.sleep(10)
-    print(f"   ✓ TGW disponible")
-    
-    print_step(2, 2, "Creando VPC Attachment")
-    att = ec2.create_transit_gateway_vpc_attachment(
-        TransitGatewayId=tgw_id,
-        VpcId=oregon['vpc_id'],
-        SubnetIds=[oregon['private_subnet_id']],
-        TagSpecifications=[{'ResourceType': 'transit-gateway-attachment', 'Tags': [{'Key': 'Name', 'Value': 'Oregon-VPC-Attachment'}]}]
-    )
-    att_id = att['TransitGatewayVpcAttachment']['TransitGatewayAttachmentId']
-    print(f"   ✓ Attachment creado: {att_id}")
-    
-    print(f"   ⏳ Esperando disponibilidad del attachment...")
-    for _ in range(60):
-        resp = ec2.describe_transit_gateway_vpc_attachments(TransitGatewayAttachmentIds=[att_id])
-        state = resp['TransitGatewayVpcAttachments'][0]['State']
-        if state == 'available':
-            break
-        time.sleep(5)
-    print(f"   ✓ Attachment disponible")
-    
-    return tgw_id
+def tgw_hubs(topologia):
+    """Regiones con Transit Gateway: 'tgw' puede ser una región o una lista."""
+    hubs = topologia.get('tgw')
+    return [hubs] if isinstance(hubs, str) else list(hubs or [])
+
+
+def create_tgws(topologia, configs, regiones, estado=None):
+    """Un Transit Gateway por región hub (comun.tgw), con la VPC de la región conectada.
+
+    Los hubs se construyen en paralelo. Con varios hubs se unen con TGW
+    peering, y cada VPC recibe rutas por su TGW hacia las VPCs de los otros
+    hubs con las que no tiene VPC peering directo. Devuelve {región: tgw_id}.
+    """
+    hubs = tgw_hubs(topologia)
+    if not hubs:
+        return {}
+    directos = {frozenset(par) for par in topologia.get('peerings', [])}
+
+    def construir(nombre):
+        cfg, red = configs[nombre], regiones[nombre]
+        print("\n" + "="*70)
+        print(f"TRANSIT GATEWAY {nombre.upper()} ({cfg['region']})")
+        print("="*70)
+        ec2 = clients.client('ec2', cfg['region'], cfg['profile'])
+        guardado = estado.region(cfg['region']) if estado else None
+        spoke = tgw.Spoke(nombre, red['vpc_id'], [red['private_subnet_id']], cfg['vpc_cidr'],
+                          [red['public_rt_id'], red['private_rt_id']])
+        remotos = [configs[h]['vpc_cidr'] for h in hubs if h != nombre and frozenset((h, nombre)) not in directos]
+
+        def paso(p, entradas, func):
+            return checkpoint(guardado, p, entradas, func, cfg['region'])
+        return tgw.build_hub(ec2, [spoke], extra_routes=remotos, checkpoint=paso)['tgw_id']
+
+    ids, errores = run_regions({h: (lambda h=h: construir(h)) for h in hubs})
+    if errores:
+        raise next(iter(errores.values()))
+    if len(hubs) > 1:
+        print("\n" + "="*70)
+        print(f"TGW PEERING ({', '.join(hubs)})")
+        print("="*70)
+
+        def con_estado(hub, peer, p, entradas, func):
+            guardado = estado.region(hub.region) if estado else None
+            return checkpoint(guardado, f"{p}:{peer.name}", entradas, func, hub.region)
+        tgw.peer_hubs([tgw.Hub(h, configs[h]['region'], ids[h], [configs[h]['vpc_cidr']], configs[h]['profile'])
+                       for h in hubs], checkpoint=con_estado)
+    return ids
 
 # ============================================================================
 # MAIN
 # ============================================================================
 
-def main():
+def resume_summary(estado):
+    """Muestra qué quedó hecho en el despliegue a retomar. False si no hay nada guardado."""
+    if not estado.exists():
+        print(f"❌ No hay estado guardado para el despliegue '{estado.deployment}' en {estado.path}")
+        return False
+    info = estado.status()
+    print(f"\n↺ Retomando '{estado.deployment}' (último estado: {info.get('status', 'desconocido')}, {info.get('updated', '-')})")
+    for region in estado.regions():
+        print(f"   {region}: {len(estado.steps(region))} pasos completados")
+    for paso, error in info.get('failed', {}).items():
+        print(f"   ⚠ Falló {paso}: {error}")
+    return True
+
+
+def print_resume_hint(estado):
+    if estado:
+        print(f"\n💾 Progreso guardado en {estado.path}")
+        print(f"   Para continuar: py plantilla_final.py --resume {estado.deployment}")
+
+
+def roll_back(log, estado):
+    """Deshace lo creado en esta ejecución (modo --transaccional).
+
+    Los borrados independientes van a la vez en todas las regiones (ver
+    comun/rollback.py). Devuelve True si no ha quedado nada sin borrar.
+    """
+    print("\n" + "="*70)
+    print(f"↩ DESHACIENDO EL DESPLIEGUE ({len(log)} recursos creados)")
+    print("="*70)
+    resultado = log.unwind()
+    for node_id, error in resultado['failed'].items():
+        print(f"⚠ {node_id}: {error}")
+    if resultado['skipped']:
+        print(f"ℹ No intentados (dependían de un fallo): {', '.join(resultado['skipped'])}")
+    limpio = not resultado['failed'] and not resultado['skipped']
+    print(f"\n{'✓' if limpio else '❌'} Eliminados {len(resultado['deleted'])} de {len(log)}"
+          + ("" if limpio else ": revisa la cuenta, quedan recursos facturando"))
+    log.clear()
+    if estado:
+        estado.mark('rolled_back' if limpio else 'failed')
+    return limpio
+
+
+def on_failure(estado, log):
+    """Tras un fallo: deshace lo creado (con --transaccional) o explica cómo retomar."""
+    if log is None:
+        print_resume_hint(estado)
+    elif not roll_back(log, estado):
+        print_resume_hint(estado)
+
+
+def resolve_amis(configs, offline=False):
+    """Pone en cada cfg['image_id'] la AMI de su familia (todas las regiones a la vez).
+
+    cfg['ami'] (la familia) sigue siendo la entrada de los pasos de
+    instancias: una imagen nueva de la misma familia no las recrea al retomar.
+    Devuelve False si alguna no se puede resolver.
+    """
+    try:
+        resueltas = amis.resolve([(cfg['region'], cfg['ami']) for cfg in configs.values()],
+                                 profiles={cfg['region']: cfg['profile'] for cfg in configs.values()},
+                                 offline=offline)
+    except amis.AmiNotFound as e:
+        print(f"❌ No se pudo resolver la AMI: {e}")
+        return False
+    for cfg in configs.values():
+        cfg['image_id'] = resueltas[(cfg['region'], cfg['ami'])]
+    return True
+
+
+def quota_needs(configs, estado=None):
+    """{región: (perfil, quotas.Need)} con lo que el despliegue va a crear.
+
+    Los pasos ya guardados en `estado` (al retomar) no cuentan.
+    """
+    needs = {}
+    for cfg in configs.values():
+        hechos = estado.steps(cfg['region']) if estado else {}
+        falta = {paso: int(paso not in hechos) for paso in ('vpc', 'eip', 'nat')}
+        instancias = sum(cfg[f'{tipo}_instances'] for tipo in ('public', 'private')
+                         if f'{tipo}_instance' not in hechos)
+        needs[cfg['region']] = (cfg['profile'], quotas.Need(falta['vpc'], falta['eip'], falta['nat'],
+                                                            instancias, az=f"{cfg['region']}a"))
+    return needs
+
+
+def check_quotas(configs, estado=None):
+    """Comprueba las cuotas de todas las regiones antes de crear nada. True si el plan cabe."""
+    print("\n" + "="*70)
+    print("🔎 COMPROBANDO CUOTAS")
+    print("="*70)
+    try:
+        filas = quotas.preflight(quota_needs(configs, estado))
+    except ClientError as e:
+        print(f"❌ No se pudieron comprobar las cuotas: {e}")
+        print("   Para desplegar sin comprobarlas: --sin-preflight")
+        return False
+    if quotas.print_report(filas):
+        return True
+    print("\n❌ El despliegue no cabe en las cuotas actuales: no se ha creado nada.")
+    print("   Libera recursos o pide un aumento en Service Quotas (o usa --sin-preflight).")
+    return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Despliegue multi-región (por defecto Oregon + Virginia)')
+    parser.add_argument('--secuencial', action='store_true',
+                        help='Crear las regiones una detrás de otra (sin hilos)')
+    parser.add_argument('--topologia', metavar='FICHERO',
+                        help='Topología en JSON con la forma de TOPOLOGIA (por defecto la del script)')
+    parser.add_argument('--perfil', help='Perfil de AWS para las regiones que no indican el suyo')
+    parser.add_argument('--traza', metavar='PREFIJO',
+                        help='Medir cada llamada a AWS y escribir PREFIJO.json y PREFIJO.trace.json (Chrome trace)')
+    parser.add_argument('--max-regiones', type=int, default=MAX_REGIONS,
+                        help=f'Regiones desplegándose a la vez (por defecto {MAX_REGIONS})')
+    parser.add_argument('--deployment', default=DEPLOYMENT_NAME,
+                        help=f'Nombre del despliegue en el fichero de estado (por defecto {DEPLOYMENT_NAME})')
+    parser.add_argument('--state', default=STATE_FILE, help='Fichero JSON de estado')
+    parser.add_argument('--sin-estado', action='store_true',
+                        help='No leer ni guardar estado: crear todo desde cero')
+    parser.add_argument('--resume', metavar='NOMBRE',
+                        help='Retomar un despliegue guardado desde el primer paso sin terminar')
+    parser.add_argument('--transaccional', action='store_true',
+                        help='Si algo falla, borrar todo lo creado en esta ejecución en vez de dejarlo para --resume')
+    parser.add_argument('--sin-preflight', action='store_true',
+                        help='No comprobar las cuotas (VPCs, EIPs, NAT, vCPUs) antes de desplegar')
+    parser.add_argument('--amis-sin-conexion', action='store_true',
+                        help='No consultar SSM: usar las últimas AMIs guardadas en caché aunque hayan caducado')
+    args = parser.parse_args(argv)
+    if args.resume and args.sin_estado:
+        parser.error('--resume necesita el fichero de estado (no se puede usar con --sin-estado)')
+    estado = None if args.sin_estado else StateStore(args.state, args.resume or args.deployment)
+    if args.resume and not resume_summary(estado):
+        return 2
+    # Un cliente por región y perfil, compartido por todos sus hilos
+    clients.configure(workers=REGION_WORKERS)
+    # Lo que se active aquí se desactiva al salir: varias llamadas a main() en
+    # un proceso (benchmarks, tests) no acumulan hooks en los clientes
+    propios = [m for m in (ratelimit, trace, rollback) if not m.enabled()]
+    try:
+        return run_deployment(args, estado)
+    finally:
+        for modulo in propios:
+            modulo.disable()
+
+
+def run_deployment(args, estado):
+    """Resuelve topología, AMIs y cuotas y despliega. Devuelve el código de salida."""
+    # Un límite de ritmo común para todas las regiones y sus hilos
+    ratelimit.enable()
+    topologia = load_topology(args.topologia) if args.topologia else TOPOLOGIA
+    try:
+        topologia = assign_cidrs(expand_peerings(topologia), estado, args.perfil)
+        validate_topology(topologia)
+    except ValueError as e:
+        print(f"❌ Topología no válida: {e}")
+        return 2
+    configs = {cfg['name']: cfg for cfg in region_configs(topologia, args.perfil)}
+    if not resolve_amis(configs, args.amis_sin_conexion):
+        return 2
+    if not args.sin_preflight and not check_quotas(configs, estado):
+        return 2
+    if args.traza:
+        trace.enable()
+    # Cada creación registra su borrado compensatorio desde aquí
+    log = rollback.enable() if args.transaccional else None
+    try:
+        return deploy(args, topologia, configs, estado, log)
+    finally:
+        ratelimit.print_summary()
+        if args.traza:
+            trace.print_summary()
+            critical.print_report(critical.analyze(trace.report()))
+            print("   Traza: {} / {}".format(*trace.write(args.traza)))
+
+
+def deploy(args, topologia, configs, estado, log=None):
+    """Despliega la topología: regiones, peerings y TGW. Devuelve el código de salida.
+
+    Con `log` (comun.rollback) un fallo, o Ctrl+C, deshace lo creado.
+    """
     print("\n" + "="*70)
     print("🚀 DESPLIEGUE COMPLETO AWS MULTI-REGIÓN")
     print("="*70)
     
+    if estado:
+        estado.mark('running')
     try:
-        oregon = create_oregon()
-        virginia = create_virginia()
-        peering = create_peering(oregon, virginia)
-        tgw = create_tgw(oregon)
+        if args.secuencial:
+            regiones = {nombre: build_region(cfg, estado) for nombre, cfg in configs.items()}
+        else:
+            regiones, errores = run_regions({nombre: (lambda cfg=cfg: build_region(cfg, estado))
+                                             for nombre, cfg in configs.items()},
+                                            workers=min(args.max_regiones, len(configs)))
+            if errores:
+                print("\n" + "="*70)
+                print("❌ FALLO EN EL DESPLIEGUE REGIONAL")
+                print("="*70)
+                for nombre in configs:
+                    if nombre in errores:
+                        print(f"{nombre}: ERROR - {errores[nombre]}")
+                        for clave, valor in getattr(errores[nombre], 'state', {}).items():
+                            print(f"   {clave}: {valor} (creado antes del fallo)")
+                    else:
+                        print(f"{nombre}: OK - VPC {regiones[nombre]['vpc_id']}")
+                        for clave, valor in regiones[nombre].items():
+                            print(f"   {clave}: {valor}")
+                print("\nNo se crea el peering ni el Transit Gateway.")
+                on_failure(estado, log)
+                return 1
+        peerings = create_peerings(topologia, configs, regiones, estado)
+        tgws = create_tgws(topologia, configs, regiones, estado)
         
         print("\n" + "="*70)
         print("✅ DESPLIEGUE COMPLETADO EXITOSAMENTE")
         print("="*70)
-        print(f"\nOregon VPC:    {oregon['vpc_id']}")
-        print(f"Virginia VPC:  {virginia['vpc_id']}")
-        print(f"VPC Peering:   {peering}")
-        print(f"Transit GW:    {tgw}")
+        print()
+        for nombre in configs:
+            print(f"{nombre + ' VPC:':<15}{regiones[nombre]['vpc_id']}")
+        for (a, b), peering_id in peerings.items():
+            print(f"VPC Peering:   {peering_id} ({a} ↔ {b})")
+        for nombre, tgw_id in tgws.items():
+            print(f"Transit GW:    {tgw_id} ({nombre})")
         print("\n" + "="*70)
         
+        if estado:
+            estado.mark('complete')
         return 0
     except Exception as e:
         print(f"\n❌ ERROR: {e}")
-        import traceback
         traceback.print_exc()
+        on_failure(estado, log)
         return 1
+    except KeyboardInterrupt:
+        print("\n❌ Interrumpido")
+        on_failure(estado, log)
+        return 130
 
 if __name__ == '__main__':
     sys.exit(main())
@@ -27,7 +27,7 @@ def main():
         ec2 = boto3.client('ec2')
         
         # 1. Crear VPC
-        print("\n[1/13] Creando VPC...")
+        print("\n[1/12] Creando VPC...")
         vpc_response = ec2.create_vpc(
             CidrBlock='192.168.0.0/24',
             TagSpecifications=[
@@ -38,12 +38,12 @@ def main():
         print(f"✓ VPC creada: {vpc_id}")
         
         # 2. Habilitar DNS
-        print("\n[2/13] Habilitando DNS en la VPC...")
+        print("\n[2/12] Habilitando DNS en la VPC...")
         ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
         print("✓ DNS habilitado")
         
         # 3. Crear Subnet
-        print("\n[3/13] Creando Subnet...")
+        print("\n[3/12] Creando Subnet...")
         subnet_response = ec2.create_subnet(
             VpcId=vpc_id,
             CidrBlock='192.168.0.0/28',
@@ -55,12 +55,12 @@ def main():
         print(f"✓ Subnet creada: {subnet_id}")
         
         # 4. Habilitar IP pública automática
-        print("\n[4/13] Habilitando asignación automática de IP pública...")
+        print("\n[4/12] Habilitando asignación automática de IP pública...")
         ec2.modify_subnet_attribute(SubnetId=subnet_id, MapPublicIpOnLaunch={'Value': True})
         print("✓ IP pública automática habilitada")
         
         # 5. Crear Internet Gateway
-        print("\n[5/13] Creando Internet Gateway...")
+        print("\n[5/12] Creando Internet Gateway...")
         igw_response = ec2.create_internet_gateway(
             TagSpecifications=[
                 {'ResourceType': 'internet-gateway', 'Tags': [{'Key': 'Name', 'Value': 'MiIg'}]}
@@ -70,12 +70,12 @@ def main():
         print(f"✓ Internet Gateway creado: {igw_id}")
         
         # 6. Adjuntar IGW a VPC
-        print("\n[6/13] Adjuntando Internet Gateway a la VPC...")
+        print("\n[6/12] Adjuntando Internet Gateway a la VPC...")
         ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
         print("✓ Internet Gateway adjuntado")
         
         # 7. Crear Route Table
-        print("\n[7/13] Creando Route Table...")
+        print("\n[7/12] Creando Route Table...")
         route_table_response = ec2.create_route_table(
             VpcId=vpc_id,
             TagSpecifications=[
@@ -86,17 +86,17 @@ def main():
         print(f"✓ Route Table creada: {route_table_id}")
         
         # 8. Agregar ruta a Internet
-        print("\n[8/13] Agregando ruta hacia Internet (0.0.0.0/0)...")
+        print("\n[8/12] Agregando ruta hacia Internet (0.0.0.0/0)...")
         ec2.create_route(RouteTableId=route_table_id, DestinationCidrBlock='0.0.0.0/0', GatewayId=igw_id)
         print("✓ Ruta 0.0.0.0/0 añadida al IGW")
         
         # 9. Asociar Route Table a Subnet
-        print("\n[9/13] Asociando Route Table a la Subnet...")
+        print("\n[9/12] Asociando Route Table a la Subnet...")
         ec2.associate_route_table(RouteTableId=route_table_id, SubnetId=subnet_id)
         print("✓ Route Table asociada")
         
         # 10. Crear Security Group
-        print("\n[10/13] Creando Security Group...")
+        print("\n[10/12] Creando Security Group...")
         sg_response = ec2.create_security_group(
             VpcId=vpc_id,
             GroupName='gsmio',
@@ -105,8 +105,8 @@ def main():
         sg_id = sg_response['GroupId']
         print(f"✓ Security Group creado: {sg_id}")
         
-        # 11. Autorizar SSH
-        print("\n[11/13] Autorizando tráfico SSH (puerto 22)...")
+        # 11. Autorizar SSH e ICMP (ambas reglas en una sola llamada)
+        print("\n[11/12] Autorizando tráfico SSH (puerto 22) e ICMP (ping)...")
         ec2.authorize_security_group_ingress(
             GroupId=sg_id,
             IpPermissions=[
@@ -115,16 +115,7 @@ def main():
                     'FromPort': 22,
                     'ToPort': 22,
                     'IpRanges': [{'CidrIp': '0.0.0.0/0', 'Description': 'SSH access'}]
-                }
-            ]
-        )
-        print("✓ Regla SSH autorizada")
-        
-        # 12. Autorizar ICMP
-        print("\n[12/13] Autorizando tráfico ICMP (ping)...")
-        ec2.authorize_security_group_ingress(
-            GroupId=sg_id,
-            IpPermissions=[
+                },
                 {
                     'IpProtocol': 'icmp',
                     'FromPort': -1,
@@ -133,10 +124,10 @@ def main():
                 }
             ]
         )
-        print("✓ Regla ICMP autorizada")
+        print("✓ Reglas SSH e ICMP autorizadas")
         
-        # 13. Crear EC2 Instance
-        print("\n[13/13] Creando instancia EC2...")
+        # 12. Crear EC2 Instance
+        print("\n[12/12] Creando instancia EC2...")
         instance_response = ec2.run_instances(
             ImageId='ami-0360c520857e3138f',
             InstanceType='t2.micro',
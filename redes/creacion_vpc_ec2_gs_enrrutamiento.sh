@@ -65,13 +65,13 @@ SG_ID=$(aws ec2 create-security-group --vpc-id $VPC_ID \
 
 echo $SG_ID
 
+# SSH e ICMP en una sola llamada
 aws ec2 authorize-security-group-ingress \
     --group-id $SG_ID \
-    --ip-permissions '[{"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0", "Description": "SSH access"}]}]' 
-
-aws ec2 authorize-security-group-ingress \
-    --group-id $SG_ID \
-    --ip-permissions '[{"IpProtocol": "icmp", "FromPort": -1, "ToPort": -1, "IpRanges": [{"CidrIp": "0.0.0.0/0", "Description": "ICMP access"}]}]'
+    --ip-permissions '[
+        {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0", "Description": "SSH access"}]},
+        {"IpProtocol": "icmp", "FromPort": -1, "ToPort": -1, "IpRanges": [{"CidrIp": "0.0.0.0/0", "Description": "ICMP access"}]}
+    ]'
 
 
 #creo un ec2 
@@ -2,13 +2,16 @@
 """
 Script para ELIMINAR toda la infraestructura AWS creada
 
-Este script elimina en el orden correcto:
-1. Instancias EC2 (y espera a que terminen)
-2. Security Groups
-3. Desasocia y elimina Route Tables
-4. Desadjunta y elimina Internet Gateways
-5. Elimina Subnets
-6. Elimina VPCs
+Este script descubre los recursos y los elimina respetando sus dependencias:
+- Instancias EC2 (y espera a que terminen)
+- Security Groups, Subnets e Internet Gateways cuando ya no tienen instancias
+- Route Tables (desasociándolas antes)
+- VPCs cuando ya no les queda nada
+
+Los recursos se descubren con un único escaneo paginado de la región
+(comun/inventory.py) y se buscan en ese índice por nombre. Cada recurso se
+borra en cuanto no queda nada que dependa de él, en paralelo
+(comun/teardown.py). Las VPCs sin relación entre sí se borran a la vez.
 
 ADVERTENCIA: Este script eliminará TODOS los recursos que coincidan con los nombres
 especificados. Úsalo con precaución.
@@ -20,170 +23,117 @@ Uso:
     py eliminar_infraestructura.py
 """
 
-import boto3
-import time
+import os
+import sys
+
 from botocore.exceptions import ClientError
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comun import clients, ratelimit, waiters
+from comun.inventory import Inventory
+from comun.teardown import Teardown, ignore_missing
+
+# Borrados simultáneos como máximo
+WORKERS = 8
+
 def wait_for_instance_termination(ec2, instance_ids):
-    """Espera a que las instancias EC2 terminen completamente"""
+    """Espera a que las instancias EC2 terminen completamente.
+
+    WaitFailed/WaitTimeout se propagan: el nodo de las instancias falla y no
+    se intenta borrar lo que depende de ellas (SG, subnet, VPC).
+    """
     if not instance_ids:
         return
-    
+
     print(f"  Esperando a que las instancias terminen: {', '.join(instance_ids)}")
-    waiter = ec2.get_waiter('instance_terminated')
-    try:
-        waiter.wait(InstanceIds=instance_ids)
-        print("  ✓ Instancias terminadas")
-    except Exception as e:
-        print(f"  ⚠ Error esperando terminación: {e}")
+    waiters.wait_for(ec2, 'instance_terminated', instance_ids, timeout=600)
+    print("  ✓ Instancias terminadas")
 
-def delete_instances(ec2):
-    """Elimina todas las instancias EC2 con el tag Name=miec2"""
-    print("\n[1/6] Eliminando instancias EC2...")
-    try:
-        # Buscar instancias con el tag Name=miec2
-        response = ec2.describe_instances(
-            Filters=[
-                {'Name': 'tag:Name', 'Values': ['miec2']},
-                {'Name': 'instance-state-name', 'Values': ['running', 'stopped', 'pending', 'stopping']}
-            ]
-        )
-        
-        instance_ids = []
-        for reservation in response['Reservations']:
-            for instance in reservation['Instances']:
-                instance_ids.append(instance['InstanceId'])
-        
-        if instance_ids:
-            print(f"  Encontradas {len(instance_ids)} instancia(s): {', '.join(instance_ids)}")
-            ec2.terminate_instances(InstanceIds=instance_ids)
-            print(f"  ✓ Solicitud de terminación enviada")
-            wait_for_instance_termination(ec2, instance_ids)
-        else:
-            print("  ℹ No se encontraron instancias EC2 para eliminar")
-    except ClientError as e:
-        print(f"  ⚠ Error: {e}")
+# Nombres con los que los scripts de redes/ etiquetan sus recursos
+NOMBRES = {
+    'instance': 'miec2',
+    'security_group': 'gsmio',  # GroupName, no tag
+    'route_table': 'MiTablaEnrutadora',
+    'internet_gateway': 'MiIg',
+    'subnet': 'mi-subred-lucas1',
+    'vpc': 'MyVpc',
+}
 
-def delete_security_groups(ec2):
-    """Elimina Security Groups con el nombre gsmio"""
-    print("\n[2/6] Eliminando Security Groups...")
-    try:
-        # Buscar security groups con el nombre gsmio
-        response = ec2.describe_security_groups(
-            Filters=[{'Name': 'group-name', 'Values': ['gsmio']}]
-        )
-        
-        for sg in response['SecurityGroups']:
-            sg_id = sg['GroupId']
-            print(f"  Eliminando Security Group: {sg_id}")
-            ec2.delete_security_group(GroupId=sg_id)
-            print(f"  ✓ Security Group {sg_id} eliminado")
-    except ClientError as e:
-        if 'does not exist' in str(e):
-            print("  ℹ No se encontraron Security Groups para eliminar")
-        else:
-            print(f"  ⚠ Error: {e}")
-
-def delete_route_tables(ec2):
-    """Elimina Route Tables con el tag Name=MiTablaEnrutadora"""
-    print("\n[3/6] Eliminando Route Tables...")
-    try:
-        # Buscar route tables con el tag Name=MiTablaEnrutadora
-        response = ec2.describe_route_tables(
-            Filters=[{'Name': 'tag:Name', 'Values': ['MiTablaEnrutadora']}]
-        )
-        
-        for rt in response['RouteTables']:
-            rt_id = rt['RouteTableId']
-            print(f"  Procesando Route Table: {rt_id}")
-            
-            # Desasociar de subnets
-            for association in rt['Associations']:
-                if not association.get('Main', False):  # No desasociar la ruta principal
-                    assoc_id = association['RouteTableAssociationId']
-                    print(f"    Desasociando: {assoc_id}")
-                    ec2.disassociate_route_table(AssociationId=assoc_id)
-                    print(f"    ✓ Desasociado")
-            
-            # Eliminar la route table
-            print(f"  Eliminando Route Table: {rt_id}")
-            ec2.delete_route_table(RouteTableId=rt_id)
-            print(f"  ✓ Route Table {rt_id} eliminada")
-    except ClientError as e:
-        if 'does not exist' in str(e):
-            print("  ℹ No se encontraron Route Tables para eliminar")
-        else:
-            print(f"  ⚠ Error: {e}")
-
-def delete_internet_gateways(ec2):
-    """Elimina Internet Gateways con el tag Name=MiIg"""
-    print("\n[4/6] Eliminando Internet Gateways...")
-    try:
-        # Buscar internet gateways con el tag Name=MiIg
-        response = ec2.describe_internet_gateways(
-            Filters=[{'Name': 'tag:Name', 'Values': ['MiIg']}]
-        )
-        
-        for igw in response['InternetGateways']:
-            igw_id = igw['InternetGatewayId']
-            print(f"  Procesando Internet Gateway: {igw_id}")
-            
-            # Desadjuntar de VPCs
-            for attachment in igw['Attachments']:
-                vpc_id = attachment['VpcId']
-                print(f"    Desadjuntando de VPC: {vpc_id}")
-                ec2.detach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
-                print(f"    ✓ Desadjuntado")
-            
-            # Eliminar el internet gateway
-            print(f"  Eliminando Internet Gateway: {igw_id}")
-            ec2.delete_internet_gateway(InternetGatewayId=igw_id)
-            print(f"  ✓ Internet Gateway {igw_id} eliminado")
-    except ClientError as e:
-        if 'does not exist' in str(e):
-            print("  ℹ No se encontraron Internet Gateways para eliminar")
-        else:
-            print(f"  ⚠ Error: {e}")
-
-def delete_subnets(ec2):
-    """Elimina Subnets con el tag Name=mi-subred-lucas1"""
-    print("\n[5/6] Eliminando Subnets...")
-    try:
-        # Buscar subnets con el tag Name=mi-subred-lucas1
-        response = ec2.describe_subnets(
-            Filters=[{'Name': 'tag:Name', 'Values': ['mi-subred-lucas1']}]
-        )
-        
-        for subnet in response['Subnets']:
-            subnet_id = subnet['SubnetId']
-            print(f"  Eliminando Subnet: {subnet_id}")
-            ec2.delete_subnet(SubnetId=subnet_id)
-            print(f"  ✓ Subnet {subnet_id} eliminada")
-    except ClientError as e:
-        if 'does not exist' in str(e):
-            print("  ℹ No se encontraron Subnets para eliminar")
-        else:
-            print(f"  ⚠ Error: {e}")
-
-def delete_vpcs(ec2):
-    """Elimina VPCs con el tag Name=MyVpc"""
-    print("\n[6/6] Eliminando VPCs...")
-    try:
-        # Buscar VPCs con el tag Name=MyVpc
-        response = ec2.describe_vpcs(
-            Filters=[{'Name': 'tag:Name', 'Values': ['MyVpc']}]
-        )
-        
-        for vpc in response['Vpcs']:
-            vpc_id = vpc['VpcId']
-            print(f"  Eliminando VPC: {vpc_id}")
-            ec2.delete_vpc(VpcId=vpc_id)
-            print(f"  ✓ VPC {vpc_id} eliminada")
-    except ClientError as e:
-        if 'does not exist' in str(e):
-            print("  ℹ No se encontraron VPCs para eliminar")
-        else:
-            print(f"  ⚠ Error: {e}")
+def discover(ec2):
+    """Escanea la región una vez (paginado, un hilo por tipo) y devuelve el inventario"""
+    return Inventory(ec2).scan(types=list(NOMBRES), filters={
+        'instance': [{'Name': 'instance-state-name', 'Values': ['running', 'stopped', 'pending', 'stopping']}],
+    })
+
+def select(inv):
+    """Recursos del laboratorio dentro del inventario, por tipo"""
+    seleccion = {tipo: inv.find(tipo, tags={'Name': nombre}) for tipo, nombre in NOMBRES.items()}
+    seleccion['security_group'] = [g for g in inv.find('security_group')
+                                   if g.attrs['group_name'] == NOMBRES['security_group']]
+    return seleccion
+
+def terminate_instances(ec2, instance_ids):
+    """Termina un grupo de instancias con una llamada y espera a que terminen"""
+    ec2.terminate_instances(InstanceIds=instance_ids)
+    wait_for_instance_termination(ec2, instance_ids)
+
+def delete_route_table(ec2, rt):
+    """Desasocia la Route Table de sus subnets y la elimina"""
+    for assoc_id in rt.attrs['associations']:
+        ignore_missing(ec2.disassociate_route_table, AssociationId=assoc_id)
+    ec2.delete_route_table(RouteTableId=rt.id)
+
+def delete_internet_gateway(ec2, igw):
+    """Desadjunta el Internet Gateway de sus VPCs y lo elimina (si ya no lo está, sigue)"""
+    for vpc_id in igw.attrs['vpcs']:
+        ignore_missing(ec2.detach_internet_gateway, 'Gateway.NotAttached', InternetGatewayId=igw.id, VpcId=vpc_id)
+    ec2.delete_internet_gateway(InternetGatewayId=igw.id)
+
+def build_teardown(ec2, inv, seleccion):
+    """Construye el grafo de borrado a partir del inventario.
+
+    Dependencias (lo de la izquierda se borra antes), sacadas de las aristas
+    del inventario:
+        instancias → su SG y su subnet; instancias de la VPC → IGW (IPs públicas)
+        route tables asociadas → subnet
+        todo lo de la VPC → VPC
+    Las instancias de cada VPC forman un único nodo (una llamada terminate).
+    """
+    plan = Teardown()
+    nodo = {}  # id de recurso -> id de nodo del plan
+
+    instancias = {}
+    for instance in seleccion['instance']:
+        instancias.setdefault(instance.vpc_id, []).append(instance.id)
+    for vpc_id, ids in instancias.items():
+        plan.add(f"instances:{vpc_id}", 'instances', lambda ids=ids: terminate_instances(ec2, ids),
+                 label=f"Instancias EC2 {', '.join(ids)}")
+        nodo.update({i: f"instances:{vpc_id}" for i in ids})
+
+    def bloqueadores(recurso):
+        return [nodo[d.id] for d in inv.dependents(recurso.id) if d.id in nodo]
+
+    for sg in seleccion['security_group']:
+        plan.add(sg.id, 'security-group', lambda g=sg.id: ec2.delete_security_group(GroupId=g),
+                 after=bloqueadores(sg), label=f"Security Group {sg.id}")
+    for rt in seleccion['route_table']:
+        plan.add(rt.id, 'route-table', lambda rt=rt: delete_route_table(ec2, rt), label=f"Route Table {rt.id}")
+    for igw in seleccion['internet_gateway']:
+        plan.add(igw.id, 'internet-gateway', lambda igw=igw: delete_internet_gateway(ec2, igw),
+                 after=[f"instances:{v}" for v in igw.attrs['vpcs']], label=f"Internet Gateway {igw.id}")
+    for subnet in seleccion['subnet']:
+        asociadas = [rt.id for rt in seleccion['route_table'] if subnet.id in rt.attrs['subnets']]
+        plan.add(subnet.id, 'subnet', lambda s=subnet.id: ec2.delete_subnet(SubnetId=s),
+                 after=bloqueadores(subnet) + asociadas, label=f"Subnet {subnet.id}")
+    nodo.update({n: n for n in plan.nodes if not n.startswith('instances:')})
+
+    for vpc in seleccion['vpc']:
+        en_vpc = [nodo[i] for i in inv.by_vpc.get(vpc.id, ()) if i in nodo and i != vpc.id]
+        en_vpc += [f"instances:{vpc.id}"]
+        en_vpc += [igw.id for igw in seleccion['internet_gateway'] if vpc.id in igw.attrs['vpcs']]
+        plan.add(vpc.id, 'vpc', lambda v=vpc.id: ec2.delete_vpc(VpcId=v), after=en_vpc, label=f"VPC {vpc.id}")
+
+    return plan
 
 def main():
     print("="*60)
@@ -205,27 +155,39 @@ def main():
         print("\n❌ Operación cancelada por el usuario")
         return 1
     
+    propio = not ratelimit.enabled()
     try:
         # Inicializar cliente EC2
         print("\nInicializando cliente EC2...")
-        ec2 = boto3.client('ec2')
+        clients.configure(workers=WORKERS)
+        ratelimit.enable()
+        ec2 = clients.client('ec2')
         
-        # Eliminar recursos en el orden correcto
-        delete_instances(ec2)
-        time.sleep(2)  # Pequeña pausa para asegurar que las instancias estén terminando
+        print("\n[1/2] Descubriendo recursos...")
+        inv = discover(ec2)
+        seleccion = select(inv)
+        print(f"  Inventario: {inv.calls} llamada(s) describe")
+        for tipo, lista in seleccion.items():
+            print(f"  {tipo}: {len(lista)} {' '.join(r.id for r in lista)}")
+        plan = build_teardown(ec2, inv, seleccion)
         
-        delete_security_groups(ec2)
-        delete_route_tables(ec2)
-        delete_internet_gateways(ec2)
-        delete_subnets(ec2)
-        delete_vpcs(ec2)
+        # Cada recurso se borra en cuanto no queda nada que dependa de él
+        print(f"\n[2/2] Eliminando {len(plan)} nodo(s) en paralelo...")
+        resultado = plan.run(workers=WORKERS)
         
         # Resumen final
         print("\n" + "="*60)
-        print("ELIMINACIÓN COMPLETADA")
+        print("ELIMINACIÓN COMPLETADA" if not resultado['failed'] else "ELIMINACIÓN INCOMPLETA")
         print("="*60)
-        print("✓ Todos los recursos han sido eliminados exitosamente")
+        print(f"✓ Eliminados: {len(resultado['deleted'])}")
+        for node_id, error in resultado['failed'].items():
+            print(f"⚠ {node_id}: {error}")
+        if resultado['skipped']:
+            print(f"ℹ No intentados (dependían de un fallo): {', '.join(resultado['skipped'])}")
         print("="*60)
+        ratelimit.print_summary()
+        if resultado['failed']:
+            return 1
         
     except ClientError as e:
         print(f"\n❌ Error de AWS: {e}")
@@ -233,6 +195,10 @@ def main():
     except Exception as e:
         print(f"\n❌ Error inesperado: {e}")
         return 1
+    finally:
+        # Sin hooks del limitador en los clientes de llamadas posteriores
+        if propio:
+            ratelimit.disable()
     
     return 0
 
@@ -10,13 +10,12 @@ ALB_SG_ID=$(aws ec2 create-security-group \
   --vpc-id $VPC_ID \
   --query 'GroupId' --output text)
 
-# Permitir HTTP (80) desde internet
+# Permitir HTTP (80) y HTTPS (443) desde internet, en una sola llamada
 aws ec2 authorize-security-group-ingress --group-id $ALB_SG_ID \
-  --protocol tcp --port 80 --cidr 0.0.0.0/0
-
-# (Opcional) Permitir HTTPS (443)
-aws ec2 authorize-security-group-ingress --group-id $ALB_SG_ID \
-  --protocol tcp --port 443 --cidr 0.0.0.0/0
+  --ip-permissions '[
+    {"IpProtocol": "tcp", "FromPort": 80, "ToPort": 80, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]},
+    {"IpProtocol": "tcp", "FromPort": 443, "ToPort": 443, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+  ]'
 
 echo "ALB Security Group: $ALB_SG_ID"
 
@@ -10,24 +10,14 @@ SG_ID=$(aws ec2 create-security-group \
   --description "grupo de seguridad con http y https" \
   --query 'GroupId' --output text)
 
-# editar las reglas de entrada
+# editar las reglas de entrada (SSH, HTTP y HTTPS en una sola llamada)
 aws ec2 authorize-security-group-ingress \
     --group-id $SG_ID \
-    --protocol tcp \
-    --port 22 \
-    --cidr 0.0.0.0/0
-
-aws ec2 authorize-security-group-ingress \
-    --group-id $SG_ID \
-    --protocol tcp \
-    --port 80 \
-    --cidr 0.0.0.0/0
-
-aws ec2 authorize-security-group-ingress \
-    --group-id $SG_ID \
-    --protocol tcp \
-    --port 443 \
-    --cidr 0.0.0.0/0
+    --ip-permissions '[
+        {"IpProtocol": "tcp", "FromPort": 22, "ToPort": 22, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]},
+        {"IpProtocol": "tcp", "FromPort": 80, "ToPort": 80, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]},
+        {"IpProtocol": "tcp", "FromPort": 443, "ToPort": 443, "IpRanges": [{"CidrIp": "0.0.0.0/0"}]}
+    ]'
 
 # creacion del grupo de destino
 TG_ARN=$(aws elbv2 create-target-group \
@@ -15,20 +15,42 @@ Este script crea:
 - Security Group
 - Reglas de ingreso para SSH (puerto 22)
 - Reglas de ingreso para ICMP (ping)
-- Instancia EC2 (t2.micro)
+- Instancias EC2 (t2.micro), NUM_INSTANCIAS con un solo run_instances, con
+  la última AMI de la familia AMI (comun/amis.py)
 """
 
-import boto3
+import os
+import sys
+
 from botocore.exceptions import ClientError
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comun import amis, clients, sg
+from comun.fleet import FleetGroup, launch_fleet
+
+# Instancias a lanzar en la subnet (todas en una llamada; la /28 admite 11)
+NUM_INSTANCIAS = 1
+
+# Familia de la AMI (se resuelve a la última imagen de la región) o un ID 'ami-...'
+AMI = 'ubuntu-24.04'
+
+# Reglas de entrada del Security Group
+SG_RULES = [
+    sg.tcp(22, description='SSH access'),
+    sg.icmp(description='ICMP access'),
+]
+
 def main():
     try:
         # Inicializar cliente EC2
         print("Inicializando cliente EC2...")
-        ec2 = boto3.client('ec2')
+        ec2 = clients.client('ec2')
+        # La AMI se resuelve antes de crear nada (caché de una hora, ver comun/amis.py)
+        ami = amis.resolve_one(AMI, ec2.meta.region_name)
+        print(f"✓ AMI {AMI}: {ami}")
         
         # 1. Crear VPC
-        print("\n[1/13] Creando VPC...")
+        print("\n[1/12] Creando VPC...")
         vpc_response = ec2.create_vpc(
             CidrBlock='192.168.0.0/24',
             TagSpecifications=[
@@ -39,12 +61,12 @@ def main():
         print(f"✓ VPC creada: {vpc_id}")
         
         # 2. Habilitar DNS
-        print("\n[2/13] Habilitando DNS en la VPC...")
+        print("\n[2/12] Habilitando DNS en la VPC...")
         ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
         print("✓ DNS habilitado")
         
         # 3. Crear Subnet
-        print("\n[3/13] Creando Subnet...")
+        print("\n[3/12] Creando Subnet...")
         subnet_response = ec2.create_subnet(
             VpcId=vpc_id,
             CidrBlock='192.168.0.0/28',
@@ -56,12 +78,12 @@ def main():
         print(f"✓ Subnet creada: {subnet_id}")
         
         # 4. Habilitar IP pública automática
-        print("\n[4/13] Habilitando asignación automática de IP pública...")
+        print("\n[4/12] Habilitando asignación automática de IP pública...")
         ec2.modify_subnet_attribute(SubnetId=subnet_id, MapPublicIpOnLaunch={'Value': True})
         print("✓ IP pública automática habilitada")
         
         # 5. Crear Internet Gateway
-        print("\n[5/13] Creando Internet Gateway...")
+        print("\n[5/12] Creando Internet Gateway...")
         igw_response = ec2.create_internet_gateway(
             TagSpecifications=[
                 {'ResourceType': 'internet-gateway', 'Tags': [{'Key': 'Name', 'Value': 'MiIg'}]}
@@ -71,12 +93,12 @@ def main():
         print(f"✓ Internet Gateway creado: {igw_id}")
         
         # 6. Adjuntar IGW a VPC
-        print("\n[6/13] Adjuntando Internet Gateway a la VPC...")
+        print("\n[6/12] Adjuntando Internet Gateway a la VPC...")
         ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
         print("✓ Internet Gateway adjuntado")
         
         # 7. Crear Route Table
-        print("\n[7/13] Creando Route Table...")
+        print("\n[7/12] Creando Route Table...")
         route_table_response = ec2.create_route_table(
             VpcId=vpc_id,
             TagSpecifications=[
@@ -87,17 +109,17 @@ def main():
         print(f"✓ Route Table creada: {route_table_id}")
         
         # 8. Agregar ruta a Internet
-        print("\n[8/13] Agregando ruta hacia Internet (0.0.0.0/0)...")
+        print("\n[8/12] Agregando ruta hacia Internet (0.0.0.0/0)...")
         ec2.create_route(RouteTableId=route_table_id, DestinationCidrBlock='0.0.0.0/0', GatewayId=igw_id)
         print("✓ Ruta 0.0.0.0/0 añadida al IGW")
         
         # 9. Asociar Route Table a Subnet
-        print("\n[9/13] Asociando Route Table a la Subnet...")
+        print("\n[9/12] Asociando Route Table a la Subnet...")
         ec2.associate_route_table(RouteTableId=route_table_id, SubnetId=subnet_id)
         print("✓ Route Table asociada")
         
         # 10. Crear Security Group
-        print("\n[10/13] Creando Security Group...")
+        print("\n[10/12] Creando Security Group...")
         sg_response = ec2.create_security_group(
             VpcId=vpc_id,
             GroupName='gsmio',
@@ -106,58 +128,23 @@ def main():
         sg_id = sg_response['GroupId']
         print(f"✓ Security Group creado: {sg_id}")
         
-        # 11. Autorizar SSH
-        print("\n[11/13] Autorizando tráfico SSH (puerto 22)...")
-        ec2.authorize_security_group_ingress(
-            GroupId=sg_id,
-            IpPermissions=[
-                {
-                    'IpProtocol': 'tcp',
-                    'FromPort': 22,
-                    'ToPort': 22,
-                    'IpRanges': [{'CidrIp': '0.0.0.0/0', 'Description': 'SSH access'}]
-                }
-            ]
-        )
-        print("✓ Regla SSH autorizada")
-        
-        # 12. Autorizar ICMP
-        print("\n[12/13] Autorizando tráfico ICMP (ping)...")
-        ec2.authorize_security_group_ingress(
-            GroupId=sg_id,
-            IpPermissions=[
-                {
-                    'IpProtocol': 'icmp',
-                    'FromPort': -1,
-                    'ToPort': -1,
-                    'IpRanges': [{'CidrIp': '0.0.0.0/0', 'Description': 'ICMP access'}]
-                }
-            ]
-        )
-        print("✓ Regla ICMP autorizada")
+        # 11. Autorizar SSH e ICMP (una sola llamada)
+        print("\n[11/12] Autorizando tráfico SSH (puerto 22) e ICMP (ping)...")
+        cambios = sg.apply_group(ec2, sg_id, SG_RULES, new=True)
+        print(f"✓ {cambios['authorized']} regla(s) autorizada(s)")
         
-        # 13. Crear EC2 Instance
-        print("\n[13/13] Creando instancia EC2...")
-        instance_response = ec2.run_instances(
-            ImageId='ami-0360c520857e3138f',
-            InstanceType='t2.micro',
-            KeyName='vockey',
-            MinCount=1,
-            MaxCount=1,
-            NetworkInterfaces=[
-                {
-                    'DeviceIndex': 0,
-                    'SubnetId': subnet_id,
-                    'Groups': [sg_id],
-                    'AssociatePublicIpAddress': True
-                }
-            ],
-            TagSpecifications=[
-                {'ResourceType': 'instance', 'Tags': [{'Key': 'Name', 'Value': 'miec2'}]}
-            ]
+        # 12. Crear instancias EC2 (un run_instances y una espera para todas)
+        print(f"\n[12/12] Creando {NUM_INSTANCIAS} instancia(s) EC2...")
+        fleet = launch_fleet(
+            ec2,
+            [FleetGroup('miec2', subnet_id, NUM_INSTANCIAS, [sg_id], public=True)],
+            ami=ami,
+            instance_type='t2.micro',
+            key_name='vockey',
+            token_seed=vpc_id
         )
-        instance_id = instance_response['Instances'][0]['InstanceId']
-        print(f"✓ Instancia EC2 creada: {instance_id}")
+        instance_ids = fleet['miec2']
+        print(f"✓ Instancias EC2 en ejecución: {', '.join(instance_ids)}")
         
         # Resumen final
         print("\n" + "="*60)
@@ -168,7 +155,7 @@ def main():
         print(f"Internet Gateway:    {igw_id}")
         print(f"Route Table ID:      {route_table_id}")
         print(f"Security Group ID:   {sg_id}")
-        print(f"EC2 Instance ID:     {instance_id}")
+        print(f"EC2 Instance IDs:    {', '.join(instance_ids)}")
         print("="*60)
         
     except ClientError as e:
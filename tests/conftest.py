@@ -0,0 +1,23 @@
+"""
+Los tests corren sin cuenta de AWS. Los que usan el sustituto local de EC2
+(comun/standin.py) necesitan moto (pip install "moto[ec2]") y se saltan sin él.
+"""
+
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [RAIZ, os.path.join(RAIZ, 'examenes'), os.path.join(RAIZ, 'redes')]
+
+
+@pytest.fixture(autouse=True)
+def aws_falso(monkeypatch, tmp_path):
+    """Credenciales falsas y caché de AMIs propia de cada test."""
+    from comun import amis
+    for clave, valor in {'AWS_ACCESS_KEY_ID': 'testing', 'AWS_SECRET_ACCESS_KEY': 'testing',
+                         'AWS_DEFAULT_REGION': 'us-east-1'}.items():
+        monkeypatch.setenv(clave, valor)
+    monkeypatch.delenv('AWS_PROFILE', raising=False)
+    monkeypatch.setattr(amis, 'CACHE_FILE', str(tmp_path / 'amis.json'))
@@ -0,0 +1,94 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from comun import amis
+
+AL2023 = amis.FAMILIES['al2023']
+
+
+class SsmFalso:
+    """get_parameters con el valor de cada parámetro; error=True simula que SSM falla."""
+
+    def __init__(self, valores):
+        self.valores = valores
+        self.calls = 0
+        self.error = False
+
+    def get_parameters(self, Names):
+        self.calls += 1
+        if self.error:
+            raise ClientError({'Error': {'Code': 'AccessDeniedException'}}, 'GetParameters')
+        return {'Parameters': [{'Name': n, 'Value': self.valores[n]} for n in Names if n in self.valores]}
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def ssm(monkeypatch):
+    ssm = SsmFalso({AL2023: 'ami-0000000000000001a'})
+    monkeypatch.setattr(amis.clients, 'client', lambda service, region, profile=None: ssm)
+    return ssm
+
+
+@pytest.fixture
+def cache(tmp_path):
+    reloj = Reloj()
+    return lambda: amis.AmiCache(str(tmp_path / 'amis.json'), ttl=3600, clock=reloj), reloj
+
+
+def test_la_cache_evita_consultas_hasta_que_caduca(ssm, cache):
+    nueva, reloj = cache
+    assert amis.resolve_one('al2023', 'us-west-2', cache=nueva()) == 'ami-0000000000000001a'
+    assert amis.resolve_one('al2023', 'us-west-2', cache=nueva()) == 'ami-0000000000000001a'
+    assert ssm.calls == 1
+
+    # Pasada la hora se vuelve a consultar y se guarda la AMI nueva
+    reloj.ahora += 3601
+    ssm.valores[AL2023] = 'ami-0000000000000002b'
+    assert amis.resolve_one('al2023', 'us-west-2', cache=nueva()) == 'ami-0000000000000002b'
+    assert ssm.calls == 2
+    assert nueva().get('al2023', 'us-west-2') == 'ami-0000000000000002b'
+
+
+def test_sin_conexion_usa_la_caducada(ssm, cache):
+    nueva, reloj = cache
+    amis.resolve_one('al2023', 'us-west-2', cache=nueva())
+    reloj.ahora += 10 * 3600
+
+    assert amis.resolve_one('al2023', 'us-west-2', cache=nueva(), offline=True) == 'ami-0000000000000001a'
+    with pytest.raises(amis.AmiNotFound, match='caché'):
+        amis.resolve_one('al2023', 'us-east-1', cache=nueva(), offline=True)
+    assert ssm.calls == 1
+
+
+def test_si_ssm_falla_la_ultima_conocida(ssm, cache, capsys):
+    nueva, reloj = cache
+    amis.resolve_one('al2023', 'us-west-2', cache=nueva())
+    reloj.ahora += 3601
+    ssm.error = True
+
+    assert amis.resolve_one('al2023', 'us-west-2', cache=nueva()) == 'ami-0000000000000001a'
+    assert 'última AMI conocida' in capsys.readouterr().out
+    with pytest.raises(amis.AmiNotFound, match='AccessDenied'):
+        amis.resolve_one('al2023', 'us-east-1', cache=nueva())
+
+
+def test_familia_sin_parametro_en_la_region(ssm, cache):
+    nueva, _ = cache
+    with pytest.raises(amis.AmiNotFound, match='no disponible'):
+        amis.resolve_one('debian-12', 'us-west-2', cache=nueva())
+
+
+def test_ids_y_familias_desconocidas(ssm, cache):
+    nueva, _ = cache
+    assert amis.resolve([('us-west-2', 'ami-0123456789abcdef0')], cache=nueva()) == {
+        ('us-west-2', 'ami-0123456789abcdef0'): 'ami-0123456789abcdef0'}
+    with pytest.raises(ValueError, match='desconocida'):
+        amis.resolve_one('centos-7', 'us-west-2', cache=nueva())
+    assert ssm.calls == 0
@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip('moto')
+
+from comun import clients
+from comun.cassette import Record, Replay
+from comun.standin import StandIn
+
+
+def test_grabar_y_reproducir(tmp_path):
+    cassette = str(tmp_path / 'despliegue.json.gz')
+    antes = list(clients._hooks)
+    with StandIn(latency=0):
+        with Record(cassette):
+            ec2 = clients.client('ec2', 'us-west-2')
+            vpc_id = ec2.create_vpc(CidrBlock='10.5.0.0/16')['Vpc']['VpcId']
+            ec2.create_subnet(VpcId=vpc_id, CidrBlock='10.5.1.0/24')
+
+    with Replay(cassette) as replay:
+        ec2 = clients.client('ec2', 'us-west-2')
+        vpc_id = ec2.create_vpc(CidrBlock='10.5.0.0/16')['Vpc']['VpcId']
+        subnet = ec2.create_subnet(VpcId=vpc_id, CidrBlock='10.5.1.0/24')['Subnet']
+
+    # Los IDs redactados son coherentes dentro del cassette
+    assert vpc_id.startswith('vpc-')
+    assert subnet['VpcId'] == vpc_id
+    assert replay.served == 2
+    # Ni el stand-in, ni la grabación, ni la reproducción siguen enganchados
+    assert clients._hooks == antes
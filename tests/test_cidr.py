@@ -0,0 +1,60 @@
+import ipaddress
+
+import pytest
+
+from comun.cidr import CidrPool, PoolExhausted, carve_subnets
+
+
+def test_primer_hueco_libre_sin_solapar():
+    pool = CidrPool('10.0.0.0/8', reserved=['10.0.0.0/16', '10.2.0.0/16', '192.168.0.0/16'])
+
+    assert pool.allocate(16) == '10.1.0.0/16'
+    assert pool.allocate(16) == '10.3.0.0/16'
+    assert pool.allocate(15) == '10.4.0.0/15'
+    assert pool.allocate(24) == '10.6.0.0/24'
+    redes = [ipaddress.ip_network(c) for c in pool.allocated]
+    assert not any(a.overlaps(b) for n, a in enumerate(redes) for b in redes[n + 1:])
+
+
+def test_reservar_lo_ya_ocupado():
+    pool = CidrPool('10.0.0.0/16')
+    assert pool.reserve('10.0.1.0/24')
+    assert not pool.reserve('10.0.1.128/25')
+    assert not pool.reserve('10.0.0.0/23')
+    # Fuera del supernet no cuenta
+    assert pool.reserve('172.16.0.0/12')
+    assert not pool.is_free('10.0.0.0/23') and pool.is_free('10.0.2.0/23')
+
+
+def test_liberar_vuelve_a_unir_las_mitades():
+    pool = CidrPool('10.0.0.0/16')
+    bloques = [pool.allocate(17), pool.allocate(17)]
+    assert pool.largest_free() is None
+    with pytest.raises(PoolExhausted):
+        pool.allocate(24)
+
+    for cidr in bloques:
+        pool.release(cidr)
+    assert pool.largest_free() == 16 and pool.allocated == []
+    assert pool.allocate(16) == '10.0.0.0/16'
+
+
+def test_liberar_parte_de_un_bloque_ocupado():
+    pool = CidrPool('10.0.0.0/16', reserved=['10.0.0.0/16'])
+    pool.release('10.0.128.0/17')
+    assert pool.allocate(18) == '10.0.128.0/18'
+    assert not pool.is_free('10.0.0.0/17')
+
+
+def test_prefijo_fuera_de_rango():
+    with pytest.raises(ValueError):
+        CidrPool('10.0.0.0/16').allocate(8)
+
+
+def test_subnets_por_capa_y_zona():
+    assert carve_subnets('10.0.0.0/16', {'public': 24, 'private': 22}, ['a', 'b']) == {
+        'public': {'a': '10.0.8.0/24', 'b': '10.0.9.0/24'},
+        'private': {'a': '10.0.0.0/22', 'b': '10.0.4.0/22'},
+    }
+    with pytest.raises(PoolExhausted):
+        carve_subnets('10.0.0.0/24', {'public': 25}, ['a', 'b', 'c'])
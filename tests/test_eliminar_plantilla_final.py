@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+pytest.importorskip('moto')
+
+import eliminar_plantilla_final
+import plantilla_final
+from comun import clients
+from comun.standin import StandIn
+
+TOPOLOGIA = {
+    'regions': [{'name': 'Oregon', 'region': 'us-west-2', 'vpc_cidr': '10.0.0.0/16',
+                 'public_subnet_cidr': '10.0.1.0/24', 'private_subnet_cidr': '10.0.2.0/24',
+                 'ami': 'al2023'}],
+    'peerings': [],
+    'tgw': [],
+}
+
+
+def vpcs(ec2):
+    return ec2.describe_vpcs(Filters=[{'Name': 'tag:Name', 'Values': ['VPC-Oregon']}])['Vpcs']
+
+
+def test_repetir_una_limpieza_a_medias(tmp_path):
+    fichero = str(tmp_path / 'topologia.json')
+    with open(fichero, 'w', encoding='utf-8') as f:
+        json.dump(TOPOLOGIA, f)
+
+    with StandIn(latency=0, scale=0):
+        antes = list(clients._hooks)
+        assert plantilla_final.main(['--sin-estado', '--sin-preflight', '--topologia', fichero]) == 0
+        # main() quita al salir los hooks que ha puesto (limitador de ritmo)
+        assert clients._hooks == antes
+        ec2 = clients.client('ec2', 'us-west-2')
+        vpc_id = vpcs(ec2)[0]['VpcId']
+
+        # Limpieza interrumpida: el IGW ya no está adjunto y la route table
+        # pública ya no está asociada, pero ambos siguen existiendo
+        igw = ec2.describe_internet_gateways(Filters=[{'Name': 'attachment.vpc-id', 'Values': [vpc_id]}])
+        igw_id = igw['InternetGateways'][0]['InternetGatewayId']
+        tablas = ec2.describe_route_tables(Filters=[{'Name': 'tag:Name', 'Values': ['Oregon-Public-RT']}])
+        asociacion = tablas['RouteTables'][0]['Associations'][0]['RouteTableAssociationId']
+        descubiertos = eliminar_plantilla_final.discover(eliminar_plantilla_final.regions(TOPOLOGIA))
+        ec2.terminate_instances(InstanceIds=[i['InstanceId'] for r in ec2.describe_instances()['Reservations']
+                                             for i in r['Instances']])
+        for nat in ec2.describe_nat_gateways()['NatGateways']:
+            ec2.delete_nat_gateway(NatGatewayId=nat['NatGatewayId'])
+        ec2.detach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
+        ec2.disassociate_route_table(AssociationId=asociacion)
+
+        # El inventario se tomó antes del corte: aún cree que el IGW está
+        # adjunto y la route table asociada
+        resultado = eliminar_plantilla_final.build_teardown(descubiertos).run(workers=8, timeout=60)
+        assert not resultado['failed'] and not resultado['skipped']
+        assert not vpcs(ec2)
+
+        # Otra pasada no encuentra nada
+        assert eliminar_plantilla_final.main(['--si', '--topologia', fichero]) == 0
+        assert clients._hooks == antes
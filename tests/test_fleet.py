@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip('moto')
+
+from comun import clients
+from comun.fleet import FleetGroup, launch_fleet
+from comun.standin import StandIn
+
+AMI = 'ami-12c6146b'
+
+
+def vivas(ec2):
+    filtro = [{'Name': 'instance-state-name', 'Values': ['pending', 'running']}]
+    return {i['InstanceId'] for r in ec2.describe_instances(Filters=filtro)['Reservations'] for i in r['Instances']}
+
+
+def lanzar(ec2, subnet_id):
+    grupo = FleetGroup('Oregon-Private-Instance', subnet_id, 3)
+    return launch_fleet(ec2, [grupo], AMI, token_seed='us-west-2', wait=False)[grupo.name]
+
+
+def test_relanzar_conserva_las_vivas_y_repone_las_que_faltan():
+    with StandIn(latency=0, scale=0):
+        ec2 = clients.client('ec2', 'us-west-2')
+        vpc_id = ec2.create_vpc(CidrBlock='10.0.0.0/16')['Vpc']['VpcId']
+        subnet_id = ec2.create_subnet(VpcId=vpc_id, CidrBlock='10.0.1.0/24')['Subnet']['SubnetId']
+
+        primeras = lanzar(ec2, subnet_id)
+        # Un reintento con el mismo token no lanza nada
+        assert lanzar(ec2, subnet_id) == primeras
+
+        ec2.terminate_instances(InstanceIds=primeras[-1:])
+        repuestas = lanzar(ec2, subnet_id)
+        assert repuestas[:2] == primeras[:2]
+        assert len(repuestas) == 3 and repuestas[2] not in primeras
+        assert vivas(ec2) == set(repuestas)
+        # Repetir el --resume devuelve la misma de reemplazo
+        assert lanzar(ec2, subnet_id) == repuestas
+
+        ec2.terminate_instances(InstanceIds=repuestas)
+        nuevas = lanzar(ec2, subnet_id)
+        assert len(nuevas) == 3 and not set(nuevas) & set(repuestas)
+        assert vivas(ec2) == set(nuevas)
@@ -0,0 +1,57 @@
+import pytest
+
+from comun import nacl
+
+
+def test_diff_crea_reemplaza_y_borra():
+    actuales = {
+        (False, 100): nacl.tcp(100, 80),
+        (False, 110): nacl.tcp(110, 22, cidr='10.0.0.0/8'),
+        (True, 100): nacl.all_traffic(100, egress=True),
+    }
+    deseadas = [nacl.tcp(100, 80), nacl.tcp(110, 22, cidr='192.168.0.0/16'), nacl.icmp(140)]
+    crear, reemplazar, borrar = nacl.diff(actuales, deseadas)
+
+    assert crear == [nacl.icmp(140)]
+    assert reemplazar == [nacl.tcp(110, 22, cidr='192.168.0.0/16')]
+    assert borrar == [(True, 100)]
+
+
+def test_sin_cambios_no_hay_diff():
+    reglas = [nacl.tcp(100, 80), nacl.udp(120, (1024, 65535)), nacl.icmp(140)]
+    assert nacl.diff({(e.egress, e.rule_number): e for e in reglas}, reglas) == ([], [], [])
+
+
+def test_regla_duplicada():
+    with pytest.raises(ValueError, match='ingress 100'):
+        nacl.diff({}, [nacl.tcp(100, 80), nacl.tcp(100, 443)])
+
+
+def test_ida_y_vuelta_por_la_api():
+    for regla in [nacl.tcp(100, (1024, 65535)), nacl.icmp(140, type_code=(8, 0)),
+                  nacl.all_traffic(100, egress=True, action='deny')]:
+        kwargs = nacl.to_api('acl-1', regla)
+        entrada = {k: v for k, v in kwargs.items() if k != 'NetworkAclId'}
+        assert nacl.from_api(entrada) == regla
+    # La API devuelve el protocolo por nombre o número y PortRange también en reglas de todo el tráfico
+    assert nacl.from_api({'RuleNumber': 100, 'Protocol': 'all', 'CidrBlock': '0.0.0.0/0', 'Egress': False,
+                          'RuleAction': 'allow', 'PortRange': {'From': 0, 'To': 0}}) == nacl.all_traffic(100)
+
+
+def test_volver_a_aplicar_no_escribe():
+    pytest.importorskip('moto')
+    from comun import clients
+    from comun.standin import StandIn
+
+    with StandIn(latency=0):
+        ec2 = clients.client('ec2', 'us-west-2')
+        vpc_id = ec2.create_vpc(CidrBlock='10.0.0.0/16')['Vpc']['VpcId']
+        acl_id = ec2.create_network_acl(VpcId=vpc_id)['NetworkAcl']['NetworkAclId']
+        reglas = [nacl.tcp(100, 22), nacl.tcp(110, (1024, 65535)), nacl.all_traffic(100, egress=True)]
+
+        assert nacl.apply_nacl(ec2, acl_id, reglas) == {'created': 3, 'replaced': 0, 'deleted': 0}
+        assert nacl.apply_nacl(ec2, acl_id, reglas) == {'created': 0, 'replaced': 0, 'deleted': 0}
+        assert nacl.apply_nacl(ec2, acl_id, [nacl.tcp(100, 443), nacl.all_traffic(100, egress=True)]) == \
+            {'created': 0, 'replaced': 1, 'deleted': 1}
+        assert nacl.read_entries(ec2, [acl_id])[acl_id] == {
+            (False, 100): nacl.tcp(100, 443), (True, 100): nacl.all_traffic(100, egress=True)}
@@ -0,0 +1,40 @@
+import json
+from collections import Counter
+
+import pytest
+
+pytest.importorskip('moto')
+
+import plantilla_final
+from comun import clients
+from comun.standin import StandIn
+
+
+def region(nombre, region, n):
+    return {'name': nombre, 'region': region, 'vpc_cidr': f"10.{n}.0.0/16",
+            'public_subnet_cidr': f"10.{n}.1.0/24", 'private_subnet_cidr': f"10.{n}.2.0/24", 'ami': 'al2023'}
+
+
+def test_cada_sg_nuevo_con_un_solo_authorize(tmp_path):
+    fichero = str(tmp_path / 'topologia.json')
+    with open(fichero, 'w', encoding='utf-8') as f:
+        json.dump({'regions': [region('Oregon', 'us-west-2', 0), region('Virginia', 'us-east-1', 1)],
+                   'peerings': [], 'tgw': []}, f)
+
+    llamadas = Counter()
+
+    def contar(cliente):
+        cliente.meta.events.register('before-call.ec2', lambda model, **kwargs: llamadas.update([model.name]),
+                                     unique_id='test.contar')
+
+    with StandIn(latency=0, scale=0):
+        clients.on_create(contar)
+        try:
+            assert plantilla_final.main(['--sin-estado', '--sin-preflight', '--topologia', fichero]) == 0
+        finally:
+            clients.off_create(contar)
+
+    # Reglas base y de las otras regiones en la misma llamada, sin leer el SG recién creado
+    assert llamadas['AuthorizeSecurityGroupIngress'] == 2
+    assert llamadas['DescribeSecurityGroups'] == 0
+    assert llamadas['RevokeSecurityGroupIngress'] == 0
@@ -0,0 +1,67 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from comun.poller import Poller
+from comun.waiters import WaitTimeout
+
+
+class NatFalso:
+    """describe_nat_gateways que ya no conoce nat-borrado."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def describe_nat_gateways(self, NatGatewayIds):
+        self.calls += 1
+        if 'nat-borrado' in NatGatewayIds:
+            raise ClientError({'Error': {'Code': 'NatGatewayNotFound'}}, 'DescribeNatGateways')
+        return {'NatGateways': [{'NatGatewayId': i, 'State': 'available'} for i in NatGatewayIds]}
+
+
+def test_waiters_de_la_misma_describe_no_comparten_lote():
+    poller, ec2 = Poller(time_scale=0), NatFalso()
+    disponible = poller.register(ec2, 'nat_gateway_available', ['nat-vivo'], timeout=5)
+    borrado = poller.register(ec2, 'nat_gateway_deleted', ['nat-borrado'], timeout=5)
+
+    # El NotFound del NAT ya purgado cuenta como borrado y no afecta al disponible
+    assert disponible.result() >= 0
+    assert borrado.result() >= 0
+
+
+def test_un_on_progress_que_falla_no_para_el_poller():
+    def roto(estados):
+        raise RuntimeError('callback roto')
+
+    poller, ec2 = Poller(time_scale=0), NatFalso()
+    with pytest.raises(RuntimeError):
+        poller.register(ec2, 'nat_gateway_available', ['nat-a'], timeout=5, on_progress=roto).result()
+    # El hilo sigue vivo para las esperas siguientes
+    assert poller.register(ec2, 'nat_gateway_available', ['nat-b'], timeout=5).result() >= 0
+
+
+class NatConThrottling(NatFalso):
+    """La primera describe falla tras agotar los reintentos de botocore."""
+
+    def describe_nat_gateways(self, NatGatewayIds):
+        self.calls += 1
+        if self.calls == 1:
+            raise ClientError({'Error': {'Code': 'RequestLimitExceeded'}}, 'DescribeNatGateways')
+        return {'NatGateways': [{'NatGatewayId': i, 'State': 'available'} for i in NatGatewayIds]}
+
+
+def test_un_error_pasajero_no_termina_las_esperas():
+    poller, ec2 = Poller(time_scale=0), NatConThrottling()
+    esperas = [poller.register(ec2, 'nat_gateway_available', [f"nat-{n}"], timeout=5) for n in range(3)]
+
+    assert all(espera.result() >= 0 for espera in esperas)
+    assert ec2.calls >= 2
+
+
+def test_un_error_que_no_cesa_agota_el_plazo():
+    class SiempreThrottling(NatFalso):
+        def describe_nat_gateways(self, NatGatewayIds):
+            raise ClientError({'Error': {'Code': 'Throttling'}}, 'DescribeNatGateways')
+
+    poller = Poller(time_scale=0)
+    with pytest.raises(WaitTimeout, match='Throttling'):
+        poller.register(SiempreThrottling(), 'nat_gateway_available', ['nat-a'], timeout=0.2).result()
@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip('moto')
+
+from comun import clients, quotas
+from comun.standin import StandIn
+
+
+def necesita(vpcs=1, instancias=2):
+    return {'us-west-2': (None, quotas.Need(vpcs, 1, 1, instancias, az='us-west-2a'))}
+
+
+def test_falta_cuota_de_vpcs_y_vcpus():
+    # moto ya tiene la VPC por defecto: con límite 1 no cabe otra
+    with StandIn(latency=0, quotas={'L-F678F1CE': 1, 'L-1216C47A': 2}):
+        clients.client('ec2', 'us-west-2').run_instances(ImageId='ami-12c6146b', MinCount=1, MaxCount=1,
+                                                          InstanceType='t2.micro')
+        filas = {f.key: f for f in quotas.preflight(necesita())}
+
+    assert quotas.shortfall(filas['vpcs']) == 1
+    assert quotas.shortfall(filas['vcpus']) == 1
+    assert quotas.shortfall(filas['elastic_ips']) == 0
+    assert filas['elastic_ips'].source == 'por defecto'
+    assert not quotas.print_report(filas.values())
+
+
+def test_el_plan_cabe():
+    # Otro StandIn en el mismo proceso no hereda las cuotas del anterior
+    with StandIn(latency=0, quotas={'L-F678F1CE': 50}):
+        filas = quotas.preflight(necesita())
+
+    assert {f.key: f.limit for f in filas}['vpcs'] == 50
+    assert quotas.print_report(filas)
@@ -0,0 +1,21 @@
+from comun import clients, ratelimit
+
+
+def test_un_bucket_por_perfil():
+    limiter = ratelimit.Limiter()
+    mia = limiter.bucket('ec2', 'us-west-2', 'DescribeVpcs')
+    otra_cuenta = limiter.bucket('ec2', 'us-west-2', 'DescribeVpcs', profile='otra-cuenta')
+
+    assert mia is not otra_cuenta
+    assert limiter.bucket('ec2', 'us-west-2', 'DescribeSubnets') is mia
+    assert set(limiter.stats()) == {'ec2/us-west-2/describe', 'ec2/us-west-2/otra-cuenta/describe'}
+
+
+def test_el_limitador_usa_el_perfil_del_cliente(monkeypatch):
+    ec2 = clients.session().client('ec2', region_name='us-west-2')
+    monkeypatch.setitem(clients._profiles, ec2, 'otra-cuenta')
+
+    limiter = ratelimit.Limiter()
+    limiter.attach(ec2)
+    ec2.meta.events.emit('before-send.ec2.DescribeVpcs', request=None)
+    assert {k: s['calls'] for k, s in limiter.stats().items()} == {'ec2/us-west-2/otra-cuenta/describe': 1}
@@ -0,0 +1,81 @@
+import pytest
+
+from comun import clients, rollback
+from comun.rollback import RollbackLog
+
+
+class ClienteFalso:
+    class meta:
+        region_name = 'us-west-2'
+
+
+def registrar(log, *llamadas):
+    for operacion, params, respuesta in llamadas:
+        log.record(ClienteFalso, operacion, params, respuesta)
+
+
+def test_cada_recurso_se_borra_antes_que_aquello_de_lo_que_depende():
+    log = RollbackLog()
+    registrar(
+        log,
+        ('CreateVpc', {}, {'Vpc': {'VpcId': 'vpc-1'}}),
+        ('CreateSubnet', {'VpcId': 'vpc-1'}, {'Subnet': {'SubnetId': 'subnet-1'}}),
+        ('CreateInternetGateway', {}, {'InternetGateway': {'InternetGatewayId': 'igw-1'}}),
+        ('AttachInternetGateway', {'InternetGatewayId': 'igw-1', 'VpcId': 'vpc-1'}, {}),
+        ('AllocateAddress', {}, {'AllocationId': 'eipalloc-1'}),
+        ('CreateNatGateway', {'SubnetId': 'subnet-1', 'AllocationId': 'eipalloc-1'},
+         {'NatGateway': {'NatGatewayId': 'nat-1'}}),
+        ('RunInstances', {'SubnetId': 'subnet-1'}, {'Instances': [{'InstanceId': 'i-1'}, {'InstanceId': 'i-2'}]}),
+    )
+    # Repetir una llamada (p. ej. un reintento que ya había creado) no duplica
+    registrar(log, ('CreateVpc', {}, {'Vpc': {'VpcId': 'vpc-1'}}))
+    antes = {nodo: sorted(after) for nodo, (_, _, after, _, _) in log.plan().nodes.items()}
+
+    assert len(log) == 7
+    assert log.entries[-1].vpc_id == 'vpc-1'
+    assert antes == {
+        'vpc-1': ['igw_attachment:igw-1:vpc-1', 'subnet-1'],
+        'subnet-1': ['i-1', 'nat-1'],
+        'igw-1': ['igw_attachment:igw-1:vpc-1'],
+        'igw_attachment:igw-1:vpc-1': ['i-1', 'nat-1'],
+        'eipalloc-1': ['nat-1'],
+        'nat-1': [],
+        'i-1': [],
+    }
+
+
+def test_deshacer_un_despliegue_a_medias():
+    pytest.importorskip('moto')
+    from comun.standin import StandIn
+
+    with StandIn(latency=0, scale=0):
+        log = rollback.enable()
+        try:
+            ec2 = clients.client('ec2', 'us-west-2')
+            vpc_id = ec2.create_vpc(CidrBlock='10.0.0.0/16')['Vpc']['VpcId']
+            subnet_id = ec2.create_subnet(VpcId=vpc_id, CidrBlock='10.0.1.0/24')['Subnet']['SubnetId']
+            igw_id = ec2.create_internet_gateway()['InternetGateway']['InternetGatewayId']
+            ec2.attach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id)
+            eip = ec2.allocate_address(Domain='vpc')['AllocationId']
+            ec2.create_nat_gateway(SubnetId=subnet_id, AllocationId=eip)
+            sg_id = ec2.create_security_group(GroupName='web', Description='web', VpcId=vpc_id)['GroupId']
+            ec2.run_instances(ImageId='ami-12c6146b', MinCount=2, MaxCount=2, InstanceType='t2.micro',
+                              SubnetId=subnet_id, SecurityGroupIds=[sg_id])
+
+            llamadas = []
+            ec2.meta.events.register('before-call.ec2', lambda model, **kwargs: llamadas.append(model.name))
+            resultado = log.unwind()
+        finally:
+            rollback.disable()
+
+        assert not resultado['failed'] and not resultado['skipped']
+        # Lo que se hace al deshacer no se registra como creado
+        assert len(resultado['deleted']) == len(log) == 8
+        assert not ec2.describe_vpcs(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}])['Vpcs']
+
+    orden = {op: llamadas.index(op) for op in llamadas}
+    assert orden['TerminateInstances'] < orden['DeleteSecurityGroup'] < orden['DeleteVpc']
+    assert orden['DeleteNatGateway'] < orden['ReleaseAddress']
+    assert max(orden['TerminateInstances'], orden['DeleteNatGateway']) < orden['DetachInternetGateway']
+    assert orden['DetachInternetGateway'] < orden['DeleteInternetGateway']
+    assert orden['DeleteSubnet'] < orden['DeleteVpc']
@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+from comun.scheduler import Step, StepError, critical_path, run_steps
+
+
+def paso(nombre, orden, salidas=(), **kwargs):
+    """Step que anota cuándo corre y produce `salidas` con su propio nombre."""
+    def func(estado):
+        orden.append(nombre)
+        return {k: f"{nombre}:{k}" for k in salidas}
+    return Step(nombre, func, outputs=salidas, **kwargs)
+
+
+def falla(estado):
+    raise RuntimeError('sin capacidad')
+
+
+def test_cada_paso_corre_tras_sus_entradas():
+    orden = []
+    pasos = [
+        paso('subnet', orden, ('subnet_id',), inputs=('vpc_id',)),
+        paso('ruta', orden, after=('igw', 'subnet')),
+        paso('vpc', orden, ('vpc_id',)),
+        paso('igw', orden, ('igw_id',), inputs=('vpc_id',)),
+    ]
+    estado = run_steps(pasos, {'region': 'us-west-2'})
+
+    assert orden[0] == 'vpc' and orden[-1] == 'ruta'
+    assert estado == {'region': 'us-west-2', 'vpc_id': 'vpc:vpc_id',
+                      'subnet_id': 'subnet:subnet_id', 'igw_id': 'igw:igw_id'}
+
+
+def test_pasos_independientes_en_paralelo():
+    barrera = threading.Barrier(3, timeout=5)
+
+    def nat(estado):
+        # Solo pasa si los tres pasos están en marcha a la vez
+        barrera.wait()
+
+    run_steps([Step(f"nat-{n}", nat) for n in range(3)], max_workers=3)
+
+
+def test_un_fallo_para_lo_que_falta():
+    orden = []
+    pasos = [Step('vpc', falla, outputs=('vpc_id',)),
+             paso('subnet', orden, ('subnet_id',), inputs=('vpc_id',))]
+    with pytest.raises(StepError) as e:
+        run_steps(pasos)
+
+    assert e.value.step.name == 'vpc'
+    assert isinstance(e.value.error, RuntimeError)
+    assert e.value.skipped == ['subnet'] and not orden
+
+
+def test_keep_going_salta_solo_los_dependientes():
+    orden = []
+    pasos = [
+        Step('instancias', falla, outputs=('instancias',)),
+        paso('sg', orden, inputs=('instancias',)),
+        paso('route-table', orden, ('rt',)),
+        paso('igw', orden, after=('route-table',)),
+    ]
+    with pytest.raises(StepError) as e:
+        run_steps(pasos, keep_going=True)
+
+    assert sorted(orden) == ['igw', 'route-table']
+    assert list(e.value.errors) == ['instancias']
+    assert e.value.skipped == ['sg']
+    assert e.value.state == {'rt': 'route-table:rt'}
+
+
+def test_salida_que_falta_es_un_fallo():
+    with pytest.raises(StepError, match='no devolvió'):
+        run_steps([Step('vpc', lambda estado: {}, outputs=('vpc_id',))])
+
+
+def test_ciclos_y_dependencias_desconocidas():
+    orden = []
+    with pytest.raises(ValueError, match='circulares'):
+        run_steps([paso('a', orden, after=('b',)), paso('b', orden, after=('a',))])
+    with pytest.raises(ValueError, match='desconocidas'):
+        run_steps([paso('subnet', orden, inputs=('vpc_id',))])
+    with pytest.raises(ValueError, match='duplicado'):
+        run_steps([paso('vpc', orden), paso('vpc', orden)])
+    assert not orden
+
+
+def test_camino_critico():
+    orden = []
+    pasos = [paso('vpc', orden, ('vpc_id',)),
+             paso('nat', orden, ('nat_id',), inputs=('vpc_id',)),
+             paso('sg', orden, ('sg_id',), inputs=('vpc_id',)),
+             paso('ec2', orden, inputs=('sg_id',), after=('nat',))]
+    tiempos = {'vpc': (0, 1), 'nat': (1, 90), 'sg': (1, 2), 'ec2': (90, 110)}
+
+    assert critical_path(pasos, tiempos) == (110, ['vpc', 'nat', 'ec2'])
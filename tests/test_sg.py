@@ -0,0 +1,70 @@
+from comun import sg
+
+
+def test_compilar_une_puertos_y_cidrs():
+    reglas = [sg.tcp(22, '10.0.0.0/24'), sg.tcp((23, 80), '10.0.0.0/24'), sg.tcp(22, '10.0.1.0/24'),
+              sg.tcp(443, '10.1.0.5/16'), sg.SgRule('6', (443, 443), '10.1.0.0/16')]
+    assert sg.compile_rules(reglas) == [
+        sg.SgRule('tcp', (22, 22), '10.0.1.0/24'),
+        sg.SgRule('tcp', (22, 80), '10.0.0.0/24'),
+        sg.SgRule('tcp', (443, 443), '10.1.0.0/16'),
+    ]
+
+
+def test_todo_el_trafico_cubre_lo_demas():
+    reglas = [sg.all_traffic('10.0.0.0/8'), sg.tcp(22, '10.2.0.0/16'), sg.tcp(22, '0.0.0.0/0')]
+    assert sg.compile_rules(reglas) == [sg.SgRule('-1', None, '10.0.0.0/8'),
+                                        sg.SgRule('tcp', (22, 22), '0.0.0.0/0')]
+
+
+def test_from_api_acepta_protocolos_sin_puertos():
+    permisos = [{'IpProtocol': '50', 'IpRanges': [{'CidrIp': '10.0.0.0/8'}]},
+                {'IpProtocol': '47', 'UserIdGroupPairs': [{'GroupId': 'sg-123'}]},
+                {'IpProtocol': '-1', 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}]
+    assert sg.from_api(permisos) == [sg.SgRule('50', None, '10.0.0.0/8'),
+                                     sg.SgRule('47', None, 'sg-123'),
+                                     sg.SgRule('-1', None, '0.0.0.0/0')]
+
+
+def test_ida_y_vuelta_por_la_api_sin_diff():
+    reglas = sg.compile_rules([sg.tcp(22), sg.udp((1000, 2000), '10.0.0.0/16'), sg.icmp('10.0.0.0/8'),
+                               sg.SgRule('50', None, '172.16.0.0/12'), sg.tcp(80, 'sg-abc'),
+                               sg.tcp(443, '2001:db8::/32')])
+    actuales = sg.from_api(sg.to_api(reglas))
+    assert sorted(actuales) == sorted(reglas)
+    assert sg.diff(actuales, reglas) == ([], [])
+
+
+def test_diff_ignora_descripciones():
+    actuales = [sg.tcp(22, description='antes'), sg.tcp(80)]
+    autorizar, revocar = sg.diff(actuales, sg.compile_rules([sg.tcp(22, description='ahora'), sg.tcp(443, '10.0.0.0/8')]))
+    assert autorizar == [sg.SgRule('tcp', (443, 443), '10.0.0.0/8')]
+    assert revocar == [sg.tcp(80)]
+
+
+class SgFalso:
+    """Anota el orden de las llamadas de escritura."""
+
+    def __init__(self):
+        self.llamadas = []
+
+    def authorize_security_group_ingress(self, GroupId, IpPermissions):
+        self.llamadas.append(('authorize', GroupId))
+
+    def revoke_security_group_ingress(self, GroupId, IpPermissions):
+        self.llamadas.append(('revoke', GroupId))
+
+
+def test_al_unir_reglas_se_autoriza_antes_de_revocar():
+    ec2 = SgFalso()
+    actuales = {'sg-1': [sg.normalize(sg.tcp(22)), sg.normalize(sg.tcp((23, 80)))]}
+    resumen = sg.apply_rules(ec2, {'sg-1': [sg.tcp((22, 80))]}, current=actuales)
+
+    assert resumen == {'authorized': 1, 'revoked': 2}
+    assert ec2.llamadas == [('authorize', 'sg-1'), ('revoke', 'sg-1')]
+
+
+def test_grupo_nuevo_un_solo_authorize():
+    ec2 = SgFalso()
+    sg.apply_group(ec2, 'sg-1', [sg.tcp(22), sg.all_traffic('10.1.0.0/16')], new=True)
+    assert ec2.llamadas == [('authorize', 'sg-1')]
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from comun.state import StateStore
+
+
+def throttling():
+    raise RuntimeError('Throttling')
+
+
+def test_retomar_tras_un_fallo(tmp_path):
+    fichero = str(tmp_path / 'estado.json')
+    oregon = StateStore(fichero, 'plantilla-final').region('us-west-2')
+    oregon.checkpoint('vpc', {'cidr': '10.0.0.0/16'}, lambda: {'listo': True})
+    oregon.checkpoint('rutas', {}, lambda: {'rutas': 2})
+    with pytest.raises(RuntimeError):
+        oregon.checkpoint('nat', {}, throttling)
+
+    # Otra ejecución (--resume) lee el fichero y solo repite lo que falta
+    estado = StateStore(fichero, 'plantilla-final')
+    assert estado.status()['status'] == 'failed'
+    assert estado.status()['failed'] == {'us-west-2/nat': 'Throttling'}
+    ejecutados = []
+
+    def paso(nombre, salidas):
+        def func():
+            ejecutados.append(nombre)
+            return salidas
+        return func
+
+    oregon = estado.region('us-west-2')
+    assert oregon.checkpoint('vpc', {'cidr': '10.0.0.0/16'}, paso('vpc', {})) == ({'listo': True}, True)
+    assert oregon.checkpoint('rutas', {}, paso('rutas', {})) == ({'rutas': 2}, True)
+    assert oregon.checkpoint('nat', {}, paso('nat', {'nat': 1})) == ({'nat': 1}, False)
+    assert ejecutados == ['nat']
+
+    estado.mark('running')
+    assert estado.status()['failed'] == {}
+
+
+def test_entradas_distintas_repiten_el_paso(tmp_path):
+    estado = StateStore(str(tmp_path / 'estado.json'), 'plantilla-final')
+    oregon = estado.region('us-west-2')
+    oregon.checkpoint('vpc', {'cidr': '10.0.0.0/16'}, lambda: {'listo': 1})
+
+    salidas, reutilizado = oregon.checkpoint('vpc', {'cidr': '10.1.0.0/16'}, lambda: {'listo': 2})
+    assert (salidas, reutilizado) == ({'listo': 2}, False)
+    with open(estado.path, encoding='utf-8') as f:
+        assert json.load(f)['plantilla-final']['us-west-2']['vpc']['inputs'] == {'cidr': '10.1.0.0/16'}
+
+
+def test_pasos_con_recursos_borrados_se_olvidan(tmp_path):
+    pytest.importorskip('moto')
+    from comun import clients
+    from comun.standin import StandIn
+
+    fichero = str(tmp_path / 'estado.json')
+    with StandIn(latency=0):
+        ec2 = clients.client('ec2', 'us-west-2')
+        vpc_id = ec2.create_vpc(CidrBlock='10.0.0.0/16')['Vpc']['VpcId']
+        oregon = StateStore(fichero, 'plantilla-final').region('us-west-2')
+        oregon.checkpoint('vpc', {}, lambda: {'vpc_id': vpc_id})
+        oregon.checkpoint('igw', {}, lambda: {'igw_id': 'igw-0123456789abcdef0'})
+
+        oregon = StateStore(fichero, 'plantilla-final').region('us-west-2')
+        # Sin verify() no se sabe si los IDs guardados siguen vivos
+        assert oregon.cached('vpc', {}) is None
+        assert oregon.verify(ec2) == ['igw-0123456789abcdef0']
+
+    assert oregon.cached('vpc', {}) == {'vpc_id': vpc_id}
+    assert set(oregon.store.steps('us-west-2')) == {'vpc'}
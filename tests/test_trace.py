@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip('moto')
+
+from comun import clients, trace
+from comun.standin import StandIn
+
+
+def test_desactivar_y_volver_a_activar():
+    with StandIn(latency=0):
+        antes = list(clients._hooks)
+        trace.enable()
+        ec2 = clients.client('ec2', 'us-west-2')
+        ec2.describe_vpcs()
+        assert trace.report()['calls'] == 1
+
+        trace.disable()
+        assert clients._hooks == antes and not trace.enabled()
+        ec2.describe_vpcs()
+
+        # Un Recorder nuevo se engancha también al cliente que ya existía
+        trace.enable()
+        ec2.describe_vpcs()
+        assert trace.report()['calls'] == 1
+        trace.disable()
@@ -0,0 +1,25 @@
+from botocore.exceptions import ClientError
+
+from comun.waiters import WAITERS
+
+
+class TgwRecienCreado:
+    """describe_transit_gateways que aún no ve el TGW (consistencia eventual)."""
+
+    def describe_transit_gateways(self, TransitGatewayIds):
+        raise ClientError({'Error': {'Code': 'InvalidTransitGatewayID.NotFound'}}, 'DescribeTransitGateways')
+
+
+def test_recien_creado_aun_no_visible():
+    spec = WAITERS['transit_gateway_available']
+    estados = spec.states(TgwRecienCreado(), ['tgw-1'])
+    # No visible: ni éxito ni fallo, se sigue esperando
+    assert estados == {'tgw-1': None}
+    assert None not in spec.success | spec.failure
+
+
+def test_borrados_sin_estados_de_toda_la_transicion_como_cerca():
+    for nombre, spec in WAITERS.items():
+        if nombre.endswith(('_deleted', '_terminated')):
+            assert not spec.near & {'deleting', 'shutting-down'}, nombre
+            assert None in spec.success or spec.filter_name, nombre